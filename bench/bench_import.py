@@ -0,0 +1,94 @@
+# bench/bench_import.py
+"""
+Время импорта main.py (python -X importtime).
+
+Запуск из корня проекта:
+    python -m bench.bench_import                 # текущее дерево
+    python -m bench.bench_import --rev baseline  # сравнить с коммитом/веткой
+
+Для --rev создаётся временный git worktree, замер идёт в нём.
+"""
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+from typing import Dict, List, Tuple
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HEAVY = ("twitchAPI", "openai", "aiogram", "aiohttp")
+
+
+def measure(cwd: str, runs: int) -> Tuple[float, List[Tuple[str, float]], Dict[str, bool]]:
+    """Возвращает (лучшее время, топ модулей верхнего уровня, какие SDK загружены)."""
+    best_total = None
+    best_top: List[Tuple[str, float]] = []
+    loaded: Dict[str, bool] = {}
+
+    for _ in range(runs):
+        proc = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", "import main"],
+            cwd=cwd,
+            capture_output=True,
+            text=True,
+        )
+        top: List[Tuple[str, float]] = []
+        names = set()
+        for line in proc.stderr.splitlines():
+            if not line.startswith("import time:") or "cumulative" in line:
+                continue
+            _, _, rest = line.partition(":")
+            _self_us, cumulative_us, name = rest.split("|", 2)
+            names.add(name.strip())
+            # модули верхнего уровня идут без отступа после "| "
+            if not name.startswith("  "):
+                top.append((name.strip(), int(cumulative_us) / 1000.0))
+
+        total = sum(ms for _, ms in top)
+        if best_total is None or total < best_total:
+            best_total = total
+            best_top = sorted(top, key=lambda t: -t[1])[:8]
+            loaded = {
+                sdk: any(n == sdk or n.startswith(sdk + ".") for n in names)
+                for sdk in HEAVY
+            }
+
+    return best_total or 0.0, best_top, loaded
+
+
+def report(label: str, result) -> None:
+    total, top, loaded = result
+    print(f"== {label}: {total:.1f} мс")
+    for name, ms in top:
+        print(f"   {name:30} {ms:8.1f} мс")
+    print("   загружено при импорте: " + ", ".join(
+        f"{sdk}={'да' if v else 'нет'}" for sdk, v in loaded.items()
+    ))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rev", help="git-ревизия для сравнения")
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    report("текущее дерево", measure(ROOT, args.runs))
+
+    if args.rev:
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "tree")
+            subprocess.run(
+                ["git", "worktree", "add", "--detach", path, args.rev],
+                cwd=ROOT, check=True, capture_output=True,
+            )
+            try:
+                report(args.rev, measure(path, args.runs))
+            finally:
+                subprocess.run(
+                    ["git", "worktree", "remove", "--force", path],
+                    cwd=ROOT, capture_output=True,
+                )
+
+
+if __name__ == "__main__":
+    main()
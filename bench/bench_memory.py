@@ -0,0 +1,50 @@
+# bench/bench_memory.py
+"""
+Память на один канал: ChannelState с полной историей,
+учётом нагрузки и фильтром истории.
+
+Запуск из корня проекта:
+    python -m bench.bench_memory
+"""
+import os
+import sys
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.app_state import AppState, HISTORY_SIZE  # noqa: E402
+from services.ingest import IngestFilter  # noqa: E402
+from services.overload import ChannelLoad  # noqa: E402
+
+CHANNELS = 1000
+CHATTERS = 50
+
+
+def fill_channel(app: AppState, i: int) -> None:
+    ch = app.get_channel(f"channel_{i}")
+    ch.load = ChannelLoad(ch.name)
+    ch.ingest = IngestFilter(ch)
+    for n in range(CHATTERS):
+        ch.ingest.process(f"viewer_{n}", f"сообщение {n} про игру в канале")
+    ch.triggers = HISTORY_SIZE
+
+
+def main():
+    app = AppState()
+
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    for i in range(CHANNELS):
+        fill_channel(app, i)
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+
+    total = sum(s.size_diff for s in after.compare_to(before, "filename"))
+    print(
+        f"{CHANNELS} каналов × {CHATTERS} зрителей: "
+        f"{total / 1024:.0f} КиБ, ~{total / CHANNELS:.0f} байт на канал"
+    )
+
+
+if __name__ == "__main__":
+    main()
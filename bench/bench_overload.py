@@ -0,0 +1,112 @@
+# bench/bench_overload.py
+"""
+Бенчмарк режима перегрузки: стоимость on_message на одно сообщение
+при обычной скорости чата и при 10-кратном наплыве.
+
+Время виртуальное, поэтому и отправитель моста в Telegram работает
+в нём же: за каждый тик чата он успевает отправить столько, сколько
+позволяет BRIDGE_SEND_INTERVAL. Так при обычной скорости очередь
+успевает разбираться, а отбрасывание видно только при настоящем наплыве.
+
+Запуск из корня проекта:
+    python -m bench.bench_overload
+"""
+import asyncio
+import contextlib
+import os
+import statistics
+import sys
+from time import perf_counter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench.fakes import FakeAIEndpoint, FakeChat, FakeTelegramBot, make_msg  # noqa: E402
+from services.app_state import state  # noqa: E402
+import services.ai_service as ai_service  # noqa: E402
+import services.overload as overload  # noqa: E402
+import services.telegram_bridge as bridge  # noqa: E402
+from services.telegram_bridge import telegram_bridge  # noqa: E402
+from services.twitch_service import on_message  # noqa: E402
+
+
+# темп отправки в Telegram — как в проде (в самом мосте пауза обнулена,
+# её заменяет бюджет отправок на виртуальный тик)
+SEND_INTERVAL = bridge.BRIDGE_SEND_INTERVAL
+
+
+async def let_bridge_send(bot: FakeTelegramBot, budget: float) -> float:
+    """Отдаёт loop отправителю моста, пока есть бюджет и очередь. Возвращает остаток бюджета."""
+    while budget >= 1.0 and telegram_bridge.queued():
+        done = bot.sent + telegram_bridge.failed
+        for _ in range(1000):
+            await asyncio.sleep(0)
+            if bot.sent + telegram_bridge.failed != done:
+                break
+        budget -= 1.0
+    # простаивающий отправитель не копит отправки впрок
+    return budget if telegram_bridge.queued() else min(budget, 1.0)
+
+
+def make_bench_msg(i: int, channel: str):
+    return make_msg(f"user{i % 50}", f"сообщение номер {i} про игру", channel)
+
+
+async def run(rate: float, count: int, channel: str):
+    clock = [0.0]
+    overload.monotonic = lambda: clock[0]
+    state.channels.clear()
+    state.bind_channel(state.owner_ctx(1), channel)
+
+    bot = FakeTelegramBot()
+    state.telegram_bot = bot
+    state.TELEGRAM_LOOP = asyncio.get_running_loop()
+    telegram_bridge.sent = telegram_bridge.dropped = telegram_bridge.failed = 0
+    telegram_bridge.start()
+
+    costs = []
+    budget = 0.0
+    for i in range(count):
+        clock[0] += 1.0 / rate
+        msg = make_bench_msg(i, channel)
+        t0 = perf_counter()
+        await on_message(msg)
+        costs.append(perf_counter() - t0)
+        budget = await let_bridge_send(bot, budget + (1.0 / rate) / SEND_INTERVAL)
+
+    # даём отработать пересылкам в Telegram
+    await telegram_bridge.stop()
+    costs.sort()
+    return {
+        "mean_us": statistics.fmean(costs) * 1e6,
+        "p99_us": costs[int(len(costs) * 0.99)] * 1e6,
+        "telegram": bot.sent,
+        "dropped": telegram_bridge.dropped,
+        "overloaded": state.get_channel(channel).load.overloaded,
+    }
+
+
+async def main():
+    state.set_admins([{"telegram_id": 1, "username": "bench", "role": "owner"}])
+    ctx = state.owner_ctx(1)
+    ctx.BOT_ENABLED = True
+    ctx.DEEPSEEK_KEYS = ["bench-key"]
+    ai_service._clients["bench-key"] = FakeAIEndpoint().client("bench-key")
+    ctx.client = ai_service._clients["bench-key"]
+    ctx.chat = FakeChat()
+    bridge.BRIDGE_SEND_INTERVAL = 0.0
+
+    results = []
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        for label, rate in (("обычная (2/сек)", 2.0), ("наплыв ×10 (20/сек)", 20.0)):
+            results.append((label, await run(rate, 5000, "bench")))
+
+    for label, r in results:
+        print(
+            f"{label:22} mean={r['mean_us']:8.1f} мкс  p99={r['p99_us']:8.1f} мкс  "
+            f"telegram={r['telegram']:5} (отброшено {r['dropped']})  "
+            f"overload={r['overloaded']}"
+        )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,124 @@
+# bench/bench_stop_words.py
+"""
+Стоимость проверки стоп-слов на одно сообщение при большом наборе правил.
+
+Сравниваются:
+  - старый цикл `word in text` (только подстроки);
+  - цикл по отдельным regex на каждое правило;
+  - общий матчер services.stop_words (один проход).
+
+Запуск из корня проекта:
+    python -m bench.bench_stop_words --rules 1000 --messages 20000
+"""
+import argparse
+import os
+import random
+import re
+import statistics
+import sys
+from time import perf_counter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench.replay import generate_chat  # noqa: E402
+from services.stop_words import (  # noqa: E402
+    RULE_LITERAL,
+    RULE_PREFIX,
+    RULE_WORD,
+    StopWordMatcher,
+    parse_rule,
+)
+
+_SYLLABLES = ["ка", "ро", "ми", "ст", "ре", "ан", "во", "ту", "ле", "бо", "зи", "пу"]
+
+
+def make_rules(count: int, seed: int = 7):
+    """~80% подстрок, по ~8% слов и префиксов, остальное — regex."""
+    rng = random.Random(seed)
+    rules = set()
+    while len(rules) < count:
+        word = "".join(rng.choice(_SYLLABLES) for _ in range(rng.randint(2, 4)))
+        r = rng.random()
+        if r < 0.80:
+            rules.add(word)
+        elif r < 0.88:
+            rules.add("w:" + word)
+        elif r < 0.96:
+            rules.add("p:" + word)
+        else:
+            rules.add(f"re:{word}\\d+")
+    # одно правило, которое реально встречается в чате
+    rules.add("w:стример")
+    return sorted(rules)
+
+
+def naive(rules):
+    words = [parse_rule(r)[1] for r in rules if parse_rule(r)[0] == RULE_LITERAL]
+
+    def check(text):
+        for w in words:
+            if w in text:
+                return w
+        return None
+    return check
+
+
+def per_rule_regex(rules):
+    compiled = []
+    for rule in rules:
+        kind, body = parse_rule(rule)
+        if kind == RULE_LITERAL:
+            rx = re.escape(body)
+        elif kind == RULE_WORD:
+            rx = rf"(?<!\w){re.escape(body)}(?!\w)"
+        elif kind == RULE_PREFIX:
+            rx = rf"(?<!\w){re.escape(body)}"
+        else:
+            rx = body
+        compiled.append((re.compile(rx), rule))
+
+    def check(text):
+        for rx, rule in compiled:
+            if rx.search(text):
+                return rule
+        return None
+    return check
+
+
+def measure(check, messages):
+    costs = []
+    hits = 0
+    for text in messages:
+        t0 = perf_counter()
+        if check(text) is not None:
+            hits += 1
+        costs.append(perf_counter() - t0)
+    costs.sort()
+    return statistics.fmean(costs) * 1e6, costs[int(len(costs) * 0.99)] * 1e6, hits
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rules", type=int, default=1000)
+    parser.add_argument("--messages", type=int, default=20000)
+    args = parser.parse_args()
+
+    rules = make_rules(args.rules)
+    messages = [text.lower() for _, text in generate_chat(args.messages)]
+
+    t0 = perf_counter()
+    matcher = StopWordMatcher(rules, 0)
+    build_ms = (perf_counter() - t0) * 1000
+    print(f"правил: {len(rules)}, сообщений: {len(messages)}, сборка матчера {build_ms:.1f} мс")
+
+    for label, check in (
+        ("цикл подстрок (старый)", naive(rules)),
+        ("regex на каждое правило", per_rule_regex(rules)),
+        ("общий матчер", matcher.match),
+    ):
+        mean, p99, hits = measure(check, messages)
+        print(f"{label:26} mean={mean:8.2f} мкс  p99={p99:8.2f} мкс  срабатываний={hits}")
+
+
+if __name__ == "__main__":
+    main()
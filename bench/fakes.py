@@ -0,0 +1,160 @@
+# bench/fakes.py
+"""
+Локальные заглушки внешних сервисов для бенчмарков:
+Twitch Chat, Telegram Bot и OpenAI-совместимый эндпоинт
+(с задержкой и имитацией 429).
+"""
+import random
+import threading
+import time
+from collections import Counter
+from types import SimpleNamespace
+from typing import List, Optional
+
+
+class Histogram:
+    """Гистограмма задержек с логарифмическими корзинами (мкс)."""
+
+    BOUNDS_US = [10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 50000, 250000]
+
+    def __init__(self):
+        self.values: List[float] = []
+
+    def add(self, seconds: float) -> None:
+        self.values.append(seconds * 1e6)
+
+    def percentile(self, p: float) -> float:
+        if not self.values:
+            return 0.0
+        data = sorted(self.values)
+        return data[min(len(data) - 1, int(len(data) * p))]
+
+    def summary(self) -> dict:
+        n = len(self.values)
+        return {
+            "count": n,
+            "mean_us": sum(self.values) / n if n else 0.0,
+            "p50_us": self.percentile(0.50),
+            "p90_us": self.percentile(0.90),
+            "p99_us": self.percentile(0.99),
+            "max_us": max(self.values) if n else 0.0,
+        }
+
+    def buckets(self) -> List[int]:
+        counts = [0] * (len(self.BOUNDS_US) + 1)
+        for v in self.values:
+            for i, bound in enumerate(self.BOUNDS_US):
+                if v <= bound:
+                    counts[i] += 1
+                    break
+            else:
+                counts[-1] += 1
+        return counts
+
+
+class FakeChat:
+    """Заглушка twitchAPI Chat: запоминает отправленные ботом сообщения."""
+
+    def __init__(self):
+        self.sent: List[tuple] = []
+
+    async def send_message(self, channel: str, text: str):
+        self.sent.append((channel, text))
+
+    async def join_room(self, channel: str):
+        pass
+
+    def is_connected(self) -> bool:
+        return True
+
+
+class FakeTelegramBot:
+    """Заглушка aiogram.Bot с задержкой отправки."""
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.sent = 0
+        self.hist = Histogram()
+
+    async def send_message(self, chat_id, text, **kwargs):
+        t0 = time.perf_counter()
+        if self.latency:
+            import asyncio
+            await asyncio.sleep(self.latency)
+        self.sent += 1
+        self.hist.add(time.perf_counter() - t0)
+
+
+class RateLimitError(Exception):
+    status_code = 429
+
+    def __init__(self):
+        super().__init__("Error code: 429 - rate limited (fake)")
+
+
+class FakeAIEndpoint:
+    """
+    OpenAI-совместимый клиент: задержка ответа (сек) с разбросом
+    и вероятность 429 на запрос. Считает запросы и 429 по ключам.
+    """
+
+    def __init__(self, latency: float = 0.0, jitter: float = 0.0, rate_429: float = 0.0,
+                 seed: Optional[int] = 1):
+        self.latency = latency
+        self.jitter = jitter
+        self.rate_429 = rate_429
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.requests = Counter()
+        self.limited = Counter()
+        self.hist = Histogram()
+
+    def client(self, key: str):
+        endpoint = self
+
+        def create(model, messages, max_tokens, **kwargs):
+            return endpoint._create(key, model, messages, max_tokens)
+
+        return SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create)))
+
+    def _create(self, key, model, messages, max_tokens):
+        t0 = time.perf_counter()
+        with self.lock:
+            self.requests[key] += 1
+            limited = self.rng.random() < self.rate_429
+            delay = max(0.0, self.latency + self.rng.uniform(-self.jitter, self.jitter))
+        if delay:
+            time.sleep(delay)
+        self.hist.add(time.perf_counter() - t0)
+        if limited:
+            with self.lock:
+                self.limited[key] += 1
+            raise RateLimitError()
+
+        prompt_tokens = sum(len(m["content"]) for m in messages) // 4
+        return SimpleNamespace(
+            choices=[SimpleNamespace(message=SimpleNamespace(content="ну это сильно"))],
+            usage=SimpleNamespace(prompt_tokens=prompt_tokens, completion_tokens=5),
+        )
+
+
+def make_msg(user: str, text: str, channel: str):
+    """Объект с полями, которые on_message читает у twitchAPI ChatMessage."""
+    return SimpleNamespace(
+        user=SimpleNamespace(display_name=user, name=user.lower()),
+        text=text,
+        room=SimpleNamespace(name=channel),
+    )
+
+
+class VirtualClock:
+    """Подменяет monotonic() в сервисах, чтобы гонять «часы» чата без ожидания."""
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+    def advance(self, seconds: float) -> None:
+        self.now += seconds
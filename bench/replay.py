@@ -0,0 +1,241 @@
+# bench/replay.py
+"""
+Прогон записанного или сгенерированного Twitch-чата через on_message
+с заглушками Chat / Telegram Bot / AI-эндпоинта.
+
+Запуск из корня проекта:
+    python -m bench.replay --generate 20000 --rate 20
+    python -m bench.replay --source chat.jsonl --rate 5 --ai-latency 0.3 --rate-429 0.1
+    python -m bench.replay --generate 20000 --json after.json --compare before.json
+
+Формат --source: JSONL {"user": ..., "text": ...} или строки "user: text".
+Время чата виртуальное (--rate задаёт скорость по часам чата),
+поэтому прогон идёт с максимальной скоростью процессора.
+"""
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import random
+import sys
+from time import perf_counter
+from typing import Iterator, List, Tuple
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench.fakes import (  # noqa: E402
+    FakeAIEndpoint,
+    FakeChat,
+    FakeTelegramBot,
+    Histogram,
+    VirtualClock,
+    make_msg,
+)
+from services.app_state import state  # noqa: E402
+import services.ai_service as ai_service  # noqa: E402
+import services.ingest as ingest  # noqa: E402
+import services.key_stats as key_stats  # noqa: E402
+import services.model_chain as model_chain  # noqa: E402
+import services.overload as overload  # noqa: E402
+import services.telegram_bridge as bridge  # noqa: E402
+import services.twitch_service as twitch_service  # noqa: E402
+import services.usage as usage  # noqa: E402
+from services.telegram_bridge import telegram_bridge  # noqa: E402
+from services.stop_words import stop_word_index  # noqa: E402
+
+CHANNEL = "bench"
+
+_PHRASES = [
+    "что за билд вообще", "он опять умер", "го следующую катку", "какой сейчас ранг",
+    "это было сильно", "стример не видит", "музыку погромче", "как пройти этот момент",
+    "лучший стрим недели", "сколько часов уже играешь", "вот это поворот", "ну и босс",
+]
+_EMOTES = ["KEKW", "LUL", "PogChamp", "Kappa", "BibleThump", "monkaS", "OMEGALUL"]
+
+
+def generate_chat(count: int, seed: int = 1) -> Iterator[Tuple[str, str]]:
+    """Смесь обычных фраз, смайлов, команд, ссылок и спама одного зрителя."""
+    rng = random.Random(seed)
+    for i in range(count):
+        r = rng.random()
+        user = f"viewer{rng.randint(1, 400)}"
+        if r < 0.55:
+            text = rng.choice(_PHRASES)
+        elif r < 0.75:
+            text = " ".join([rng.choice(_EMOTES)] * rng.randint(1, 6))
+        elif r < 0.82:
+            text = rng.choice(["!drop", "!tg", "!discord", "!uptime"])
+        elif r < 0.85:
+            text = "https://example.com/clip" + str(i % 7)
+        else:
+            user = "spammer"
+            text = "ЗАХОДИТЕ НА МОЙ КАНАЛ"
+        yield user, text
+
+
+def read_chat(path: str) -> Iterator[Tuple[str, str]]:
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            if line.startswith("{"):
+                row = json.loads(line)
+                yield str(row.get("user", "viewer")), str(row["text"])
+            else:
+                user, _, text = line.partition(": ")
+                yield (user, text) if text else ("viewer", user)
+
+
+def setup(endpoint: FakeAIEndpoint, keys: int, clock: VirtualClock) -> None:
+    """Подменяет внешние сервисы и часы, готовит состояние бота."""
+    for module in (overload, ingest, model_chain, key_stats, usage):
+        module.monotonic = clock
+    bridge.BRIDGE_SEND_INTERVAL = 0.0
+
+    state.set_admins([{"telegram_id": 1, "username": "bench", "role": "owner"}])
+    state.owners.clear()
+    state.channels.clear()
+    ctx = state.owner_ctx(1)
+    ctx.BOT_ENABLED = True
+    state.bind_channel(ctx, CHANNEL)
+    stop_word_index.load([{"word": "стример не видит"}])
+    ctx.DEEPSEEK_KEYS = [f"bench-key-{i}" for i in range(keys)]
+    ctx.current_key_index = 0
+
+    ai_service._clients.clear()
+    for key in ctx.DEEPSEEK_KEYS:
+        ai_service._clients[key] = endpoint.client(key)
+    ctx.client = ai_service._clients[ctx.DEEPSEEK_KEYS[0]]
+
+
+async def replay(lines: List[Tuple[str, str]], rate: float, endpoint: FakeAIEndpoint,
+                 tg_latency: float, clock: VirtualClock) -> dict:
+    chat = FakeChat()
+    bot = FakeTelegramBot(tg_latency)
+    state.owner_ctx(1).chat = chat
+    state.telegram_bot = bot
+    state.TELEGRAM_LOOP = asyncio.get_running_loop()
+    telegram_bridge.sent = telegram_bridge.dropped = telegram_bridge.failed = 0
+    telegram_bridge.start()
+
+    # замер стадии генерации: оборачиваем send_ai_message внутри twitch_service
+    ai_hist = Histogram()
+    original_send = twitch_service.send_ai_message
+
+    async def timed_send(ch=None):
+        t0 = perf_counter()
+        await original_send(ch)
+        ai_hist.add(perf_counter() - t0)
+
+    twitch_service.send_ai_message = timed_send
+
+    msg_hist = Histogram()
+    step = 1.0 / rate
+    wall0 = perf_counter()
+    try:
+        for user, text in lines:
+            clock.advance(step)
+            msg = make_msg(user, text, CHANNEL)
+            t0 = perf_counter()
+            await twitch_service.on_message(msg)
+            msg_hist.add(perf_counter() - t0)
+        wall = perf_counter() - wall0
+        await telegram_bridge.stop()
+    finally:
+        twitch_service.send_ai_message = original_send
+
+    virtual_minutes = len(lines) * step / 60.0
+    return {
+        "messages": len(lines),
+        "rate": rate,
+        "wall_s": wall,
+        "msgs_per_sec": len(lines) / wall if wall else 0.0,
+        "generations": len(chat.sent),
+        "generations_per_min": len(chat.sent) / virtual_minutes if virtual_minutes else 0.0,
+        "stages": {
+            "on_message": msg_hist.summary(),
+            "send_ai_message": ai_hist.summary(),
+            "model_call": endpoint.hist.summary(),
+            "telegram_send": bot.hist.summary(),
+        },
+        "telegram": {"sent": bot.sent, "dropped": telegram_bridge.dropped},
+        "keys": {
+            key: {"requests": endpoint.requests[key], "429": endpoint.limited[key]}
+            for key in state.owner_ctx(1).DEEPSEEK_KEYS
+        },
+        "reply_gate_skip_ratio": ai_service.reply_gate.skip_ratio(),
+        "histogram_bounds_us": Histogram.BOUNDS_US,
+        "on_message_buckets": msg_hist.buckets(),
+    }
+
+
+def print_report(r: dict, base: dict = None) -> None:
+    def delta(path, value):
+        if not base:
+            return ""
+        ref = base
+        for p in path:
+            ref = ref.get(p, {}) if isinstance(ref, dict) else {}
+        if not isinstance(ref, (int, float)) or not ref:
+            return ""
+        return f" ({(value - ref) / ref:+.0%})"
+
+    print(
+        f"сообщений: {r['messages']} @ {r['rate']}/сек (вирт.) | "
+        f"{r['msgs_per_sec']:.0f} сообщ./сек{delta(['msgs_per_sec'], r['msgs_per_sec'])} | "
+        f"генераций: {r['generations']} ({r['generations_per_min']:.1f}/мин)"
+    )
+    print(f"{'стадия':18} {'n':>7} {'mean':>9} {'p50':>9} {'p90':>9} {'p99':>9}  мкс")
+    for name, s in r["stages"].items():
+        print(
+            f"{name:18} {s['count']:7} {s['mean_us']:9.1f} {s['p50_us']:9.1f} "
+            f"{s['p90_us']:9.1f} {s['p99_us']:9.1f}"
+            f"{delta(['stages', name, 'p99_us'], s['p99_us'])}"
+        )
+    print(
+        f"telegram: отправлено {r['telegram']['sent']}, отброшено {r['telegram']['dropped']} | "
+        f"фильтр ответов: пропуск {r['reply_gate_skip_ratio']:.0%}"
+    )
+    for key, k in r["keys"].items():
+        print(f"  {key}: запросов {k['requests']}, 429: {k['429']}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--source", help="файл с записанным чатом")
+    parser.add_argument("--generate", type=int, default=10000, help="сколько сообщений сгенерировать")
+    parser.add_argument("--rate", type=float, default=10.0, help="сообщений в секунду (вирт.)")
+    parser.add_argument("--keys", type=int, default=3)
+    parser.add_argument("--ai-latency", type=float, default=0.0, help="задержка модели, сек")
+    parser.add_argument("--ai-jitter", type=float, default=0.0)
+    parser.add_argument("--rate-429", type=float, default=0.0, help="доля ответов 429")
+    parser.add_argument("--tg-latency", type=float, default=0.0, help="задержка Telegram, сек")
+    parser.add_argument("--token-budget", type=int, default=0, help="бюджет токенов канала в час, 0 — без лимита")
+    parser.add_argument("--json", help="сохранить результат в файл")
+    parser.add_argument("--compare", help="сравнить с сохранённым результатом")
+    args = parser.parse_args()
+
+    lines = list(read_chat(args.source) if args.source else generate_chat(args.generate))
+    endpoint = FakeAIEndpoint(args.ai_latency, args.ai_jitter, args.rate_429)
+    clock = VirtualClock()
+    setup(endpoint, args.keys, clock)
+    usage.CHANNEL_HOUR_BUDGET = args.token_budget
+
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        result = asyncio.run(replay(lines, args.rate, endpoint, args.tg_latency, clock))
+
+    base = None
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            base = json.load(f)
+    print_report(result, base)
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
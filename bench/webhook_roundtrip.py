@@ -0,0 +1,127 @@
+# bench/webhook_roundtrip.py
+"""
+Сквозная проверка webhook-режима на локальном «сервере Telegram».
+
+Скрипт сам играет роль Bot API: принимает setWebhook / sendMessage,
+шлёт боту апдейты на webhook с секретом и меряет время до ответа бота.
+
+1) В config бота (копия bot.db):
+     telegram_api_server     = http://127.0.0.1:8081
+     telegram_webhook_url    = http://127.0.0.1:8080/telegram/webhook
+     telegram_webhook_secret = bench-secret
+2) python -m bench.webhook_roundtrip --admin-id <telegram_id> --updates 50
+3) Запустить бота (python main.py) — скрипт дождётся setWebhook.
+"""
+import argparse
+import asyncio
+import itertools
+import time
+
+from aiohttp import ClientSession, web
+
+from bench.fakes import Histogram
+
+
+class FakeBotAPI:
+    def __init__(self):
+        self.webhook_url = None
+        self.webhook_secret = None
+        self.webhook_set = asyncio.Event()
+        self.replies: asyncio.Queue = asyncio.Queue()
+        self.ids = itertools.count(1)
+
+    def _message(self, chat_id, text):
+        return {
+            "message_id": next(self.ids),
+            "date": int(time.time()),
+            "chat": {"id": int(chat_id), "type": "private"},
+            "text": text or "",
+        }
+
+    async def handle(self, request: web.Request) -> web.Response:
+        method = request.match_info["method"]
+        # aiogram шлёт параметры как form-data
+        data = dict(await request.post())
+
+        if method == "getMe":
+            result = {"id": 1, "is_bot": True, "first_name": "bench", "username": "bench_bot"}
+        elif method == "setWebhook":
+            self.webhook_url = data.get("url")
+            self.webhook_secret = data.get("secret_token")
+            self.webhook_set.set()
+            result = True
+        elif method in ("sendMessage", "sendDocument"):
+            await self.replies.put(time.perf_counter())
+            result = self._message(data.get("chat_id", 0), data.get("text"))
+        else:
+            result = True
+        return web.json_response({"ok": True, "result": result})
+
+
+def make_update(update_id: int, admin_id: int, text: str) -> dict:
+    user = {"id": admin_id, "is_bot": False, "first_name": "bench"}
+    return {
+        "update_id": update_id,
+        "message": {
+            "message_id": update_id,
+            "date": int(time.time()),
+            "chat": {"id": admin_id, "type": "private"},
+            "from": user,
+            "text": text,
+        },
+    }
+
+
+async def run(args) -> None:
+    api = FakeBotAPI()
+    app = web.Application()
+    app.router.add_post("/bot{token}/{method}", api.handle)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, "127.0.0.1", args.port).start()
+    print(f"🧪 Fake Bot API на http://127.0.0.1:{args.port}, жду setWebhook...")
+
+    await asyncio.wait_for(api.webhook_set.wait(), args.wait)
+    print(f"🌐 webhook: {api.webhook_url}")
+
+    hist = Histogram()
+    async with ClientSession() as http:
+        # без секрета aiogram должен отвечать 401
+        async with http.post(api.webhook_url, json=make_update(1, args.admin_id, args.text)) as r:
+            print(f"без секрета: HTTP {r.status}")
+
+        headers = {"X-Telegram-Bot-Api-Secret-Token": api.webhook_secret or ""}
+        for i in range(args.updates):
+            t0 = time.perf_counter()
+            async with http.post(api.webhook_url, json=make_update(i + 2, args.admin_id, args.text),
+                                 headers=headers) as r:
+                if r.status != 200:
+                    print(f"⚠ webhook ответил HTTP {r.status}")
+                    continue
+            try:
+                t1 = await asyncio.wait_for(api.replies.get(), 10)
+            except asyncio.TimeoutError:
+                print("⚠ бот не ответил за 10 с")
+                continue
+            hist.add(t1 - t0)
+
+    s = hist.summary()
+    print(
+        f"апдейт → ответ: n={s['count']} mean={s['mean_us'] / 1000:.1f} мс "
+        f"p50={s['p50_us'] / 1000:.1f} p90={s['p90_us'] / 1000:.1f} p99={s['p99_us'] / 1000:.1f} мс"
+    )
+    await runner.cleanup()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--admin-id", type=int, required=True)
+    parser.add_argument("--updates", type=int, default=50)
+    parser.add_argument("--text", default="📊 Статистика", help="кнопка/команда панели")
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--wait", type=float, default=120.0, help="ожидание setWebhook, сек")
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
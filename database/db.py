@@ -8,3 +8,162 @@ DB_PATH = Path("bot.db")
 def get_db_connection():
     """Подключение к SQLite-базе."""
     return sqlite3.connect(DB_PATH)
+
+
+# ======================================================
+# SCHEMA (добавление недостающих колонок/таблиц)
+# ======================================================
+
+def _add_column_if_missing(cur, table: str, column: str, ddl: str) -> None:
+    cur.execute(f"PRAGMA table_info({table})")
+    if column not in {r[1] for r in cur.fetchall()}:
+        cur.execute(f"ALTER TABLE {table} ADD COLUMN {column} {ddl}")
+
+
+def _migrate_bot_state(cur) -> None:
+    """
+    bot_state: строка на владельца (ключ — owner_telegram_id).
+    В исходной схеме была одна строка с CHECK (id = 1), и состояние
+    всех владельцев, кроме первого, молча не сохранялось.
+    """
+    cur.execute("PRAGMA table_info(bot_state)")
+    columns = {r[1]: r for r in cur.fetchall()}
+    owner = columns.get("owner_telegram_id")
+    if owner is not None and owner[5] == 1:
+        return
+
+    cur.execute(
+        """
+        CREATE TABLE bot_state_new (
+            owner_telegram_id INTEGER PRIMARY KEY,
+            current_channel_id INTEGER,           -- FK на channels.id
+            current_key_id INTEGER,               -- FK на deepseek_keys.id
+            bot_enabled INTEGER DEFAULT 0,        -- 1 = бот включен, 0 = выключен
+            FOREIGN KEY (current_channel_id) REFERENCES channels(id),
+            FOREIGN KEY (current_key_id) REFERENCES deepseek_keys(id)
+        )
+        """
+    )
+
+    if columns:
+        rows = []
+        if owner is not None:
+            cur.execute(
+                "SELECT owner_telegram_id, current_channel_id, current_key_id, bot_enabled "
+                "FROM bot_state"
+            )
+            rows = cur.fetchall()
+        # строки-заглушки без числового владельца переносить некуда
+        kept = [
+            (int(r[0]), r[1], r[2], r[3])
+            for r in rows
+            if r[0] is not None and str(r[0]).strip().lstrip("-").isdigit()
+        ]
+        cur.executemany(
+            "INSERT OR REPLACE INTO bot_state_new "
+            "(owner_telegram_id, current_channel_id, current_key_id, bot_enabled) "
+            "VALUES (?, ?, ?, ?)",
+            kept,
+        )
+        if len(kept) != len(rows):
+            print(f"ℹ bot_state: пропущено строк без владельца: {len(rows) - len(kept)}")
+        cur.execute("DROP TABLE bot_state")
+
+    cur.execute("ALTER TABLE bot_state_new RENAME TO bot_state")
+    print("🛠 bot_state переведена на строку на владельца")
+
+
+def ensure_schema() -> None:
+    """
+    Доводит схему существующей bot.db до текущей версии кода.
+    Безопасно вызывать при каждом старте.
+    """
+    conn = None
+    try:
+        conn = get_db_connection()
+        cur = conn.cursor()
+
+        # здоровье и расход DeepSeek-ключей
+        _add_column_if_missing(cur, "deepseek_keys", "last_failed_at", "TEXT")
+        _add_column_if_missing(cur, "deepseek_keys", "requests_count", "INTEGER DEFAULT 0")
+        _add_column_if_missing(cur, "deepseek_keys", "failures_count", "INTEGER DEFAULT 0")
+        _add_column_if_missing(cur, "deepseek_keys", "rate_limited_count", "INTEGER DEFAULT 0")
+        _add_column_if_missing(cur, "deepseek_keys", "avg_latency_ms", "REAL")
+        _add_column_if_missing(cur, "deepseek_keys", "prompt_tokens", "INTEGER DEFAULT 0")
+        _add_column_if_missing(cur, "deepseek_keys", "completion_tokens", "INTEGER DEFAULT 0")
+
+        # состояние бота по владельцам
+        _migrate_bot_state(cur)
+
+        # сохранённые OAuth-токены Twitch (вход без браузера при рестарте)
+        cur.execute(
+            """
+            CREATE TABLE IF NOT EXISTS twitch_tokens (
+                owner_telegram_id INTEGER PRIMARY KEY,
+                access_token TEXT NOT NULL,
+                refresh_token TEXT NOT NULL,
+                updated_at TEXT DEFAULT CURRENT_TIMESTAMP
+            )
+            """
+        )
+
+        # архив чата: только дозапись, чтение — по каналу и времени
+        cur.execute(
+            """
+            CREATE TABLE IF NOT EXISTS chat_archive (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                channel TEXT NOT NULL,
+                ts REAL NOT NULL,
+                user TEXT NOT NULL,
+                text TEXT NOT NULL,
+                result TEXT
+            )
+            """
+        )
+        cur.execute(
+            "CREATE INDEX IF NOT EXISTS idx_chat_archive_channel_ts "
+            "ON chat_archive (channel, ts)"
+        )
+        cur.execute("CREATE INDEX IF NOT EXISTS idx_chat_archive_ts ON chat_archive (ts)")
+
+        # стоп-слова канала / владельца (общие остаются в stop_words);
+        # задано ровно одно из channel / owner_telegram_id
+        cur.execute(
+            """
+            CREATE TABLE IF NOT EXISTS scoped_stop_words (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                word TEXT NOT NULL,
+                channel TEXT,
+                owner_telegram_id INTEGER
+            )
+            """
+        )
+        cur.execute(
+            "CREATE UNIQUE INDEX IF NOT EXISTS idx_scoped_stop_words_scope "
+            "ON scoped_stop_words (IFNULL(channel, ''), IFNULL(owner_telegram_id, 0), word)"
+        )
+
+        # расход токенов по часам (UTC): владелец × канал
+        cur.execute(
+            """
+            CREATE TABLE IF NOT EXISTS token_usage (
+                owner_telegram_id INTEGER NOT NULL,
+                channel TEXT NOT NULL,
+                hour TEXT NOT NULL,
+                requests INTEGER DEFAULT 0,
+                prompt_tokens INTEGER DEFAULT 0,
+                completion_tokens INTEGER DEFAULT 0,
+                PRIMARY KEY (owner_telegram_id, channel, hour)
+            )
+            """
+        )
+
+        conn.commit()
+    except Exception as e:
+        print("⚠ Ошибка обновления схемы БД:", e)
+    finally:
+        try:
+            if conn:
+                conn.close()
+        except:
+            pass
@@ -1,84 +1,146 @@
 # database/repository.py
 from __future__ import annotations
 
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, Set, Tuple
+
+from utils.metrics import Histogram, timed
 from .db import get_db_connection
 
+# сколько минут ключ после сбоя считается «подозрительным»
+KEY_FAIL_COOLDOWN_MIN = 30
+
+DB_QUERY_SECONDS = Histogram(
+    "db_query_seconds",
+    "Время функций репозитория (соединение + запросы)",
+    ("func",),
+)
+
 
 # ======================================================
-# CONFIG
+# STARTUP (config, admins, stop words)
 # ======================================================
 
-def load_config_from_db() -> Dict[str, str]:
+@timed(DB_QUERY_SECONDS)
+def load_startup_data(clear_sessions: bool = True) -> Dict[str, Any]:
     """
-    Загружаем client_id, client_secret и telegram_api_key из таблицы config.
-    Возвращает dict, где ключи — это 'key' из таблицы config.
+    Всё, что нужно при старте, за один проход по БД (одно соединение):
+    очистка free_session_users (кроме тёплого рестарта), config, admins,
+    стоп-слова всех областей, владельцы каналов и владельцы, чьих
+    Twitch-ботов можно поднять без /start (есть токены и канал).
+    Возвращает {"config": {...}, "admins": [...], "stop_words": [...],
+    "channel_owners": {...}, "resume_owners": [...]}.
     """
-    cfg: Dict[str, str] = {}
+    data: Dict[str, Any] = {
+        "config": {}, "admins": [], "stop_words": [], "channel_owners": {}, "resume_owners": [],
+    }
     conn = None
     try:
         conn = get_db_connection()
         cur = conn.cursor()
+
+        if clear_sessions:
+            cur.execute("DELETE FROM free_session_users")
+
         cur.execute("SELECT key, value FROM config")
-        rows = cur.fetchall()
-        cfg = {str(k): str(v) for k, v in rows if k is not None and v is not None}
+        data["config"] = {
+            str(k): str(v) for k, v in cur.fetchall() if k is not None and v is not None
+        }
+
+        cur.execute("SELECT telegram_id, username, role FROM admins")
+        data["admins"] = [
+            {"telegram_id": int(r[0]), "username": r[1], "role": r[2]}
+            for r in cur.fetchall()
+            # незаполненные строки-заглушки не должны ломать весь старт
+            if r and r[0] is not None and str(r[0]).lstrip("-").isdigit()
+        ]
+
+        data["stop_words"] = _stop_word_rows(cur)
+
+        cur.execute("SELECT name, owner_telegram_id FROM channels WHERE owner_telegram_id IS NOT NULL")
+        data["channel_owners"] = {str(r[0]): int(r[1]) for r in cur.fetchall() if r and r[0]}
+
+        cur.execute(
+            """
+            SELECT t.owner_telegram_id
+            FROM twitch_tokens t
+            JOIN bot_state b ON b.owner_telegram_id = t.owner_telegram_id
+            WHERE b.current_channel_id IS NOT NULL
+            """
+        )
+        data["resume_owners"] = [int(r[0]) for r in cur.fetchall() if r and r[0] is not None]
+
+        conn.commit()
     except Exception as e:
-        print("⚠ Ошибка загрузки конфигурации из БД:", e)
+        print("⚠ Ошибка загрузки стартовых данных из БД:", e)
     finally:
         try:
             if conn:
                 conn.close()
         except:
             pass
-    return cfg
+    return data
 
 
 # ======================================================
-# ADMINS / ROLES
+# DEEPSEEK KEYS (Admin+ / per-owner)
 # ======================================================
 
-def load_admins() -> List[Dict[str, Any]]:
+@timed(DB_QUERY_SECONDS)
+def load_deepseek_keys(owner_telegram_id: int) -> List[str]:
     """
-    Возвращает список админов:
-    [
-        {"telegram_id": int, "username": str|None, "role": str}
-    ]
+    Возвращает активные DeepSeek-ключи конкретного админа.
+    Невалидные тоже загружаются (в конце списка): их видно в панели,
+    их можно удалить, а монитор перепроверяет их и возвращает в работу.
     """
-    admins: List[Dict[str, Any]] = []
+    keys: List[str] = []
     conn = None
     try:
         conn = get_db_connection()
         cur = conn.cursor()
-        cur.execute("SELECT telegram_id, username, role FROM admins")
+        cur.execute(
+            """
+            SELECT key
+            FROM deepseek_keys
+            WHERE is_active = 1
+              AND owner_telegram_id = ?
+            ORDER BY
+                -- невалидные — в самый конец, недавно сбоившие — перед ними
+                COALESCE(is_valid, 1) = 0,
+                COALESCE(last_failed_at > datetime('now', ?), 0),
+                id
+            """,
+            (owner_telegram_id, f"-{KEY_FAIL_COOLDOWN_MIN} minutes"),
+        )
         rows = cur.fetchall()
-        admins = [
-            {"telegram_id": int(r[0]), "username": r[1], "role": r[2]}
-            for r in rows
-            if r and r[0] is not None
-        ]
+        keys = [r[0] for r in rows if r and r[0]]
     except Exception as e:
-        print("⚠ Ошибка загрузки админов:", e)
+        print("⚠ Не удалось загрузить ключи DeepSeek:", e)
     finally:
         try:
             if conn:
                 conn.close()
         except:
             pass
-    return admins
+    return keys
 
 
-def get_admin_role(telegram_id: int) -> Optional[str]:
-    """Возвращает роль админа (owner/admin) или None."""
+@timed(DB_QUERY_SECONDS)
+def add_deepseek_key_to_db(key: str, owner_telegram_id: int) -> None:
+    """Добавляет новый DeepSeek-ключ конкретному админу."""
     conn = None
     try:
         conn = get_db_connection()
         cur = conn.cursor()
-        cur.execute("SELECT role FROM admins WHERE telegram_id = ?", (telegram_id,))
-        row = cur.fetchone()
-        return row[0] if row else None
+        cur.execute(
+            """
+            INSERT INTO deepseek_keys (key, is_active, is_valid, owner_telegram_id)
+            VALUES (?, 1, 1, ?)
+            """,
+            (key, owner_telegram_id),
+        )
+        conn.commit()
     except Exception as e:
-        print("⚠ Ошибка получения роли админа:", e)
-        return None
+        print("⚠ Не удалось сохранить ключ в БД:", e)
     finally:
         try:
             if conn:
@@ -87,33 +149,19 @@ def get_admin_role(telegram_id: int) -> Optional[str]:
             pass
 
 
-# ======================================================
-# DEEPSEEK KEYS (Admin+ / per-owner)
-# ======================================================
-
-def load_deepseek_keys(owner_telegram_id: int) -> List[str]:
-    """
-    Возвращает активные и валидные DeepSeek-ключи,
-    принадлежащие конкретному админу.
-    """
-    keys: List[str] = []
+@timed(DB_QUERY_SECONDS)
+def load_owner_key_set(owner_telegram_id: int) -> Set[str]:
+    """Все ключи админа (включая выключенные и невалидные) — для дедупликации."""
+    keys: Set[str] = set()
     conn = None
     try:
         conn = get_db_connection()
         cur = conn.cursor()
         cur.execute(
-            """
-            SELECT key
-            FROM deepseek_keys
-            WHERE is_active = 1
-              AND is_valid = 1
-              AND owner_telegram_id = ?
-            ORDER BY id
-            """,
+            "SELECT key FROM deepseek_keys WHERE owner_telegram_id = ?",
             (owner_telegram_id,),
         )
-        rows = cur.fetchall()
-        keys = [r[0] for r in rows if r and r[0]]
+        keys = {r[0] for r in cur.fetchall() if r and r[0]}
     except Exception as e:
         print("⚠ Не удалось загрузить ключи DeepSeek:", e)
     finally:
@@ -125,22 +173,27 @@ def load_deepseek_keys(owner_telegram_id: int) -> List[str]:
     return keys
 
 
-def add_deepseek_key_to_db(key: str, owner_telegram_id: int) -> None:
-    """Добавляет новый DeepSeek-ключ конкретному админу."""
+@timed(DB_QUERY_SECONDS)
+def add_deepseek_keys_bulk(keys: List[str], owner_telegram_id: int) -> int:
+    """Добавляет ключи одной транзакцией. Возвращает число добавленных."""
+    if not keys:
+        return 0
     conn = None
     try:
         conn = get_db_connection()
         cur = conn.cursor()
-        cur.execute(
+        cur.executemany(
             """
             INSERT INTO deepseek_keys (key, is_active, is_valid, owner_telegram_id)
             VALUES (?, 1, 1, ?)
             """,
-            (key, owner_telegram_id),
+            [(k, owner_telegram_id) for k in keys],
         )
         conn.commit()
+        return len(keys)
     except Exception as e:
-        print("⚠ Не удалось сохранить ключ в БД:", e)
+        print("⚠ Не удалось сохранить ключи в БД:", e)
+        return 0
     finally:
         try:
             if conn:
@@ -149,8 +202,9 @@ def add_deepseek_key_to_db(key: str, owner_telegram_id: int) -> None:
             pass
 
 
-def delete_deepseek_key_from_db(key: str, owner_telegram_id: int) -> None:
-    """Удаляет DeepSeek-ключ конкретного админа."""
+@timed(DB_QUERY_SECONDS)
+def delete_deepseek_key_from_db(key: str, owner_telegram_id: int) -> bool:
+    """Удаляет DeepSeek-ключ конкретного админа. False — удалить не удалось."""
     conn = None
     try:
         conn = get_db_connection()
@@ -164,20 +218,288 @@ def delete_deepseek_key_from_db(key: str, owner_telegram_id: int) -> None:
             (key, owner_telegram_id),
         )
         conn.commit()
+        return True
     except Exception as e:
         print("⚠ Не удалось удалить ключ из БД:", e)
+        return False
+    finally:
+        try:
+            if conn:
+                conn.close()
+        except:
+            pass
+
+
+@timed(DB_QUERY_SECONDS)
+def load_key_health(owner_telegram_id: int) -> Dict[str, Dict[str, Any]]:
+    """
+    Возвращает накопленную статистику ключей владельца:
+    {key: {requests, failures, rate_limited, avg_latency_ms,
+           prompt_tokens, completion_tokens, last_used_at, last_failed_at, is_valid}}
+    """
+    health: Dict[str, Dict[str, Any]] = {}
+    conn = None
+    try:
+        conn = get_db_connection()
+        cur = conn.cursor()
+        cur.execute(
+            """
+            SELECT key, requests_count, failures_count, rate_limited_count,
+                   avg_latency_ms, prompt_tokens, completion_tokens,
+                   last_used_at, last_failed_at, is_valid
+            FROM deepseek_keys
+            WHERE owner_telegram_id = ?
+            """,
+            (owner_telegram_id,),
+        )
+        for r in cur.fetchall():
+            if not r or not r[0]:
+                continue
+            health[r[0]] = {
+                "requests": r[1] or 0,
+                "failures": r[2] or 0,
+                "rate_limited": r[3] or 0,
+                "avg_latency_ms": r[4],
+                "prompt_tokens": r[5] or 0,
+                "completion_tokens": r[6] or 0,
+                "last_used_at": r[7],
+                "last_failed_at": r[8],
+                "is_valid": bool(r[9]),
+            }
+    except Exception as e:
+        print("⚠ Не удалось загрузить статистику ключей:", e)
+    finally:
+        try:
+            if conn:
+                conn.close()
+        except:
+            pass
+    return health
+
+
+@timed(DB_QUERY_SECONDS)
+def save_key_stats(rows: List[tuple]) -> bool:
+    """
+    Пакетно записывает приращения статистики ключей.
+    Строка: (requests, failures, rate_limited, prompt_tokens, completion_tokens,
+             avg_latency_ms, last_used_at, last_failed_at, is_valid, key)
+    Возвращает True, если транзакция прошла.
+    """
+    if not rows:
+        return True
+    conn = None
+    try:
+        conn = get_db_connection()
+        cur = conn.cursor()
+        cur.executemany(
+            """
+            UPDATE deepseek_keys
+            SET requests_count     = COALESCE(requests_count, 0) + ?,
+                failures_count     = COALESCE(failures_count, 0) + ?,
+                rate_limited_count = COALESCE(rate_limited_count, 0) + ?,
+                prompt_tokens      = COALESCE(prompt_tokens, 0) + ?,
+                completion_tokens  = COALESCE(completion_tokens, 0) + ?,
+                avg_latency_ms     = COALESCE(?, avg_latency_ms),
+                last_used_at       = COALESCE(?, last_used_at),
+                last_failed_at     = COALESCE(?, last_failed_at),
+                is_valid           = ?
+            WHERE key = ?
+            """,
+            rows,
+        )
+        conn.commit()
+        return True
+    except Exception as e:
+        print("⚠ Не удалось сохранить статистику ключей:", e)
+        return False
+    finally:
+        try:
+            if conn:
+                conn.close()
+        except:
+            pass
+
+
+@timed(DB_QUERY_SECONDS)
+def save_token_usage(rows: List[tuple]) -> bool:
+    """
+    Пакетно добавляет приращения расхода токенов в почасовые строки.
+    Строка: (owner_telegram_id, channel, hour, requests, prompt_tokens, completion_tokens)
+    Возвращает True, если транзакция прошла.
+    """
+    if not rows:
+        return True
+    conn = None
+    try:
+        conn = get_db_connection()
+        cur = conn.cursor()
+        cur.executemany(
+            """
+            INSERT INTO token_usage
+                (owner_telegram_id, channel, hour, requests, prompt_tokens, completion_tokens)
+            VALUES (?, ?, ?, ?, ?, ?)
+            ON CONFLICT (owner_telegram_id, channel, hour) DO UPDATE SET
+                requests          = requests + excluded.requests,
+                prompt_tokens     = prompt_tokens + excluded.prompt_tokens,
+                completion_tokens = completion_tokens + excluded.completion_tokens
+            """,
+            rows,
+        )
+        conn.commit()
+        return True
+    except Exception as e:
+        print("⚠ Не удалось сохранить расход токенов:", e)
+        return False
+    finally:
+        try:
+            if conn:
+                conn.close()
+        except:
+            pass
+
+
+@timed(DB_QUERY_SECONDS)
+def load_token_usage(since_hour: str) -> List[tuple]:
+    """
+    Почасовой расход начиная с since_hour ('YYYY-MM-DD HH:00', UTC) —
+    чтобы после рестарта часовые окна бюджетов не начинались с нуля.
+    Строка: (owner_telegram_id, channel, hour, requests, prompt_tokens, completion_tokens)
+    """
+    rows: List[tuple] = []
+    conn = None
+    try:
+        conn = get_db_connection()
+        cur = conn.cursor()
+        cur.execute(
+            """
+            SELECT owner_telegram_id, channel, hour, requests, prompt_tokens, completion_tokens
+            FROM token_usage
+            WHERE hour >= ?
+            """,
+            (since_hour,),
+        )
+        rows = [tuple(r) for r in cur.fetchall()]
+    except Exception as e:
+        print("⚠ Не удалось загрузить расход токенов:", e)
+    finally:
+        try:
+            if conn:
+                conn.close()
+        except:
+            pass
+    return rows
+
+
+# ======================================================
+# CHAT ARCHIVE
+# ======================================================
+
+@timed(DB_QUERY_SECONDS)
+def save_chat_lines(rows: List[tuple]) -> bool:
+    """
+    Пакетная дозапись архива чата.
+    Строка: (channel, ts, user, text, result)
+    """
+    if not rows:
+        return True
+    conn = None
+    try:
+        conn = get_db_connection()
+        cur = conn.cursor()
+        cur.executemany(
+            "INSERT INTO chat_archive (channel, ts, user, text, result) VALUES (?, ?, ?, ?, ?)",
+            rows,
+        )
+        conn.commit()
+        return True
+    except Exception as e:
+        print("⚠ Не удалось записать архив чата:", e)
+        return False
+    finally:
+        try:
+            if conn:
+                conn.close()
+        except:
+            pass
+
+
+@timed(DB_QUERY_SECONDS)
+def load_chat_lines(
+    channel: str,
+    since: Optional[float] = None,
+    limit: Optional[int] = None,
+    result: Optional[str] = None,
+) -> List[Dict[str, Any]]:
+    """
+    Строки архива канала по возрастанию времени.
+    limit — последние N строк (после фильтров since / result).
+    """
+    conn = None
+    lines: List[Dict[str, Any]] = []
+    try:
+        conn = get_db_connection()
+        cur = conn.cursor()
+
+        where = ["channel = ?"]
+        params: List[Any] = [channel]
+        if since is not None:
+            where.append("ts >= ?")
+            params.append(since)
+        if result is not None:
+            where.append("result = ?")
+            params.append(result)
+
+        sql = f"SELECT ts, user, text, result FROM chat_archive WHERE {' AND '.join(where)}"
+        if limit:
+            # последние N по индексу (channel, ts), затем в хронологическом порядке
+            sql = f"SELECT * FROM ({sql} ORDER BY ts DESC LIMIT ?) ORDER BY ts"
+            params.append(limit)
+        else:
+            sql += " ORDER BY ts"
+
+        cur.execute(sql, params)
+        lines = [
+            {"ts": r[0], "user": r[1], "text": r[2], "result": r[3]}
+            for r in cur.fetchall()
+        ]
+    except Exception as e:
+        print("⚠ Не удалось прочитать архив чата:", e)
+    finally:
+        try:
+            if conn:
+                conn.close()
+        except:
+            pass
+    return lines
+
+
+@timed(DB_QUERY_SECONDS)
+def prune_chat_archive(before_ts: float) -> int:
+    """Удаляет строки архива старше before_ts. Возвращает число удалённых."""
+    conn = None
+    deleted = 0
+    try:
+        conn = get_db_connection()
+        cur = conn.cursor()
+        cur.execute("DELETE FROM chat_archive WHERE ts < ?", (before_ts,))
+        deleted = cur.rowcount
+        conn.commit()
+    except Exception as e:
+        print("⚠ Не удалось почистить архив чата:", e)
     finally:
         try:
             if conn:
                 conn.close()
         except:
             pass
+    return deleted
 
 
 # ======================================================
 # CHANNELS / BOT STATE (per-owner)
 # ======================================================
 
+@timed(DB_QUERY_SECONDS)
 def load_bot_state(owner_telegram_id: int):
     """
     Возвращает (channel_name, bot_enabled) для конкретного админа.
@@ -210,75 +532,101 @@ def load_bot_state(owner_telegram_id: int):
     return None, False
 
 
-def set_current_channel_in_db(channel_name: str, owner_telegram_id: int) -> None:
+@timed(DB_QUERY_SECONDS)
+def set_current_channel_in_db(channel_name: str, owner_telegram_id: int) -> bool:
     """
-    Устанавливает текущий Twitch-канал для конкретного админа.
-    channels: хранит каналы владельца
+    Устанавливает текущий Twitch-канал для конкретного админа
+    (в новом канале бот стартует выключенным).
+    channels: хранит каналы владельца; канал, записанный раньше
+              за другим владельцем, переходит к этому
     bot_state: хранит активный канал владельца
+    Возвращает True, если запись прошла.
     """
     conn = None
     try:
         conn = get_db_connection()
         cur = conn.cursor()
 
-        # 1) Канал гарантированно существует
+        # 1) Канал существует и принадлежит этому владельцу
         cur.execute(
             """
-            INSERT OR IGNORE INTO channels (name, is_active, owner_telegram_id)
+            INSERT INTO channels (name, is_active, owner_telegram_id)
             VALUES (?, 0, ?)
+            ON CONFLICT(name) DO UPDATE SET
+                owner_telegram_id = excluded.owner_telegram_id
             """,
             (channel_name, owner_telegram_id),
         )
+        cur.execute("SELECT id FROM channels WHERE name = ?", (channel_name,))
+        channel_id = cur.fetchone()[0]
 
-        # 2) Снять активность со всех каналов владельца
+        # 2) Прежний владелец канала больше не считает его текущим
         cur.execute(
             """
-            UPDATE channels
-            SET is_active = 0
-            WHERE owner_telegram_id = ?
+            UPDATE bot_state
+            SET current_channel_id = NULL
+            WHERE current_channel_id = ?
+              AND owner_telegram_id != ?
             """,
-            (owner_telegram_id,),
+            (channel_id, owner_telegram_id),
         )
 
-        # 3) Сделать активным нужный
+        # 3) Активен только этот канал владельца
         cur.execute(
             """
             UPDATE channels
-            SET is_active = 1
-            WHERE name = ?
-              AND owner_telegram_id = ?
+            SET is_active = (id = ?)
+            WHERE owner_telegram_id = ?
             """,
-            (channel_name, owner_telegram_id),
+            (channel_id, owner_telegram_id),
         )
 
-        # 4) bot_state строка владельца должна быть
+        # 4) Строка bot_state владельца: текущий канал, бот выключен
         cur.execute(
             """
-            INSERT OR IGNORE INTO bot_state (owner_telegram_id, bot_enabled, current_channel_id)
-            VALUES (?, 0, NULL)
+            INSERT INTO bot_state (owner_telegram_id, bot_enabled, current_channel_id)
+            VALUES (?, 0, ?)
+            ON CONFLICT(owner_telegram_id) DO UPDATE SET
+                current_channel_id = excluded.current_channel_id,
+                bot_enabled = 0
             """,
-            (owner_telegram_id,),
+            (owner_telegram_id, channel_id),
         )
 
-        # 5) Проставить current_channel_id
+        conn.commit()
+        return True
+    except Exception as e:
+        print("⚠ Не удалось обновить канал в БД:", e)
+        return False
+    finally:
+        try:
+            if conn:
+                conn.close()
+        except:
+            pass
+
+
+@timed(DB_QUERY_SECONDS)
+def set_bot_enabled_in_db(owner_telegram_id: int, enabled: bool) -> bool:
+    """Сохраняет флаг работы бота владельца. Возвращает True, если запись прошла."""
+    conn = None
+    try:
+        conn = get_db_connection()
+        cur = conn.cursor()
         cur.execute(
             """
-            UPDATE bot_state
-            SET current_channel_id = (
-                SELECT id
-                FROM channels
-                WHERE name = ?
-                  AND owner_telegram_id = ?
-                LIMIT 1
-            )
-            WHERE owner_telegram_id = ?
+            INSERT INTO bot_state (owner_telegram_id, bot_enabled, current_channel_id)
+            VALUES (?, ?, NULL)
+            ON CONFLICT(owner_telegram_id) DO UPDATE SET
+                bot_enabled = excluded.bot_enabled
             """,
-            (channel_name, owner_telegram_id, owner_telegram_id),
+            (owner_telegram_id, 1 if enabled else 0),
         )
-
         conn.commit()
+        return True
     except Exception as e:
-        print("⚠ Не удалось обновить канал в БД:", e)
+        print("⚠ Не удалось сохранить состояние бота:", e)
+        return False
     finally:
         try:
             if conn:
@@ -288,43 +636,59 @@ def set_current_channel_in_db(channel_name: str, owner_telegram_id: int) -> None
 
 
 # ======================================================
-# STOP WORDS (GLOBAL)
+# TWITCH OAUTH TOKENS (per-owner)
 # ======================================================
 
-def load_stop_words() -> List[str]:
-    """Возвращает список стоп-слов из таблицы stop_words."""
-    words: List[str] = []
+@timed(DB_QUERY_SECONDS)
+def load_twitch_tokens(owner_telegram_id: int) -> Optional[Tuple[str, str]]:
+    """Возвращает (access_token, refresh_token) владельца или None."""
     conn = None
     try:
         conn = get_db_connection()
         cur = conn.cursor()
-        cur.execute("SELECT word FROM stop_words ORDER BY id")
-        rows = cur.fetchall()
-        words = [r[0].lower() for r in rows if r and r[0]]
+        cur.execute(
+            """
+            SELECT access_token, refresh_token
+            FROM twitch_tokens
+            WHERE owner_telegram_id = ?
+            """,
+            (owner_telegram_id,),
+        )
+        row = cur.fetchone()
+        if row and row[0] and row[1]:
+            return row[0], row[1]
     except Exception as e:
-        print("⚠ Не удалось загрузить стоп-слова:", e)
+        print("⚠ Не удалось загрузить Twitch-токены:", e)
     finally:
         try:
             if conn:
                 conn.close()
         except:
             pass
-    return words
+    return None
 
 
-def add_stop_word(word: str) -> None:
-    """Добавляет стоп-слово в БД."""
-    w = word.lower().strip()
-    if not w:
-        return
+@timed(DB_QUERY_SECONDS)
+def save_twitch_tokens(owner_telegram_id: int, access_token: str, refresh_token: str) -> None:
+    """Сохраняет (перезаписывает) Twitch-токены владельца."""
     conn = None
     try:
         conn = get_db_connection()
         cur = conn.cursor()
-        cur.execute("INSERT OR IGNORE INTO stop_words (word) VALUES (?)", (w,))
+        cur.execute(
+            """
+            INSERT INTO twitch_tokens (owner_telegram_id, access_token, refresh_token, updated_at)
+            VALUES (?, ?, ?, CURRENT_TIMESTAMP)
+            ON CONFLICT(owner_telegram_id) DO UPDATE SET
+                access_token = excluded.access_token,
+                refresh_token = excluded.refresh_token,
+                updated_at = CURRENT_TIMESTAMP
+            """,
+            (owner_telegram_id, access_token, refresh_token),
+        )
         conn.commit()
     except Exception as e:
-        print("⚠ Не удалось добавить стоп-слово:", e)
+        print("⚠ Не удалось сохранить Twitch-токены:", e)
     finally:
         try:
             if conn:
@@ -333,19 +697,75 @@ def add_stop_word(word: str) -> None:
             pass
 
 
-def delete_stop_word(word: str) -> None:
-    """Удаляет стоп-слово из БД."""
-    w = word.lower().strip()
+# ======================================================
+# STOP WORDS (GLOBAL / CHANNEL / OWNER)
+# ======================================================
+
+def _norm_stop_word(word: str) -> str:
+    """Нижний регистр — для всех правил, кроме регулярных выражений (re:...)."""
+    w = word.strip()
+    return w if w.startswith("re:") else w.lower()
+
+
+_STOP_WORD_ROWS_SQL = """
+    SELECT word, channel, owner_telegram_id FROM (
+        SELECT 0 AS part, id, word, NULL AS channel, NULL AS owner_telegram_id FROM stop_words
+        UNION ALL
+        SELECT 1, id, word, channel, owner_telegram_id FROM scoped_stop_words
+    )
+    ORDER BY part, id
+"""
+
+
+def _stop_word_rows(cur) -> List[Dict[str, Any]]:
+    """
+    Все стоп-слова всех областей:
+    [{"word": ..., "channel": str | None, "owner_telegram_id": int | None}, ...]
+    Общие — первыми, внутри области — в порядке добавления.
+    """
+    cur.execute(_STOP_WORD_ROWS_SQL)
+    return [
+        {
+            "word": _norm_stop_word(r[0]),
+            "channel": r[1],
+            "owner_telegram_id": int(r[2]) if r[2] is not None else None,
+        }
+        for r in cur.fetchall()
+        if r and r[0]
+    ]
+
+
+@timed(DB_QUERY_SECONDS)
+def add_stop_word(
+    word: str,
+    channel: Optional[str] = None,
+    owner_telegram_id: Optional[int] = None,
+) -> bool:
+    """
+    Добавляет стоп-слово в БД (уже существующее — тоже успех).
+    Без channel / owner_telegram_id — общее (таблица stop_words).
+    False — записать не удалось.
+    """
+    w = _norm_stop_word(word)
     if not w:
-        return
+        return False
     conn = None
     try:
         conn = get_db_connection()
         cur = conn.cursor()
-        cur.execute("DELETE FROM stop_words WHERE word = ?", (w,))
+        if channel is None and owner_telegram_id is None:
+            cur.execute("INSERT OR IGNORE INTO stop_words (word) VALUES (?)", (w,))
+        else:
+            cur.execute(
+                "INSERT OR IGNORE INTO scoped_stop_words (word, channel, owner_telegram_id) "
+                "VALUES (?, ?, ?)",
+                (w, channel, None if channel is not None else owner_telegram_id),
+            )
         conn.commit()
+        return True
     except Exception as e:
-        print("⚠ Не удалось удалить стоп-слово:", e)
+        print("⚠ Не удалось добавить стоп-слово:", e)
+        return False
     finally:
         try:
             if conn:
@@ -354,23 +774,38 @@ def delete_stop_word(word: str) -> None:
             pass
 
 
-# ======================================================
-# FREE SESSION USERS (current run only)
-# ======================================================
-
-def clear_free_session_users() -> None:
-    """
-    Очищает таблицу free_session_users.
-    Вызывается один раз при старте программы.
-    """
+@timed(DB_QUERY_SECONDS)
+def delete_stop_word(
+    word: str,
+    channel: Optional[str] = None,
+    owner_telegram_id: Optional[int] = None,
+) -> bool:
+    """Удаляет стоп-слово из БД (область — как в add_stop_word). False — не удалось."""
+    w = _norm_stop_word(word)
+    if not w:
+        return False
     conn = None
     try:
         conn = get_db_connection()
         cur = conn.cursor()
-        cur.execute("DELETE FROM free_session_users")
+        if channel is not None:
+            cur.execute(
+                "DELETE FROM scoped_stop_words WHERE word = ? AND channel = ?",
+                (w, channel),
+            )
+        elif owner_telegram_id is not None:
+            cur.execute(
+                "DELETE FROM scoped_stop_words "
+                "WHERE word = ? AND channel IS NULL AND owner_telegram_id = ?",
+                (w, owner_telegram_id),
+            )
+        else:
+            cur.execute("DELETE FROM stop_words WHERE word = ?", (w,))
         conn.commit()
+        return True
     except Exception as e:
-        print("⚠ Ошибка очистки free_session_users:", e)
+        print("⚠ Не удалось удалить стоп-слово:", e)
+        return False
     finally:
         try:
             if conn:
@@ -379,6 +814,11 @@ def clear_free_session_users() -> None:
             pass
 
 
+# ======================================================
+# FREE SESSION USERS (current run only)
+# ======================================================
+
+@timed(DB_QUERY_SECONDS)
 def register_free_user(telegram_id: int, username: Optional[str], first_name: Optional[str]) -> None:
     """
     Регистрирует free пользователя в текущей сессии.
@@ -406,6 +846,7 @@ def register_free_user(telegram_id: int, username: Optional[str], first_name: Op
             pass
 
 
+@timed(DB_QUERY_SECONDS)
 def increment_free_messages(telegram_id: int) -> None:
     """Увеличивает счётчик сообщений free пользователя."""
     conn = None
@@ -431,6 +872,7 @@ def increment_free_messages(telegram_id: int) -> None:
             pass
 
 
+@timed(DB_QUERY_SECONDS)
 def is_free_user_banned(telegram_id: int) -> bool:
     """Проверяет, забанен ли free пользователь в рамках текущей сессии."""
     conn = None
@@ -458,6 +900,7 @@ def is_free_user_banned(telegram_id: int) -> bool:
             pass
 
 
+@timed(DB_QUERY_SECONDS)
 def ban_free_user(telegram_id: int) -> None:
     """Банит free пользователя в рамках текущей сессии."""
     conn = None
@@ -483,6 +926,7 @@ def ban_free_user(telegram_id: int) -> None:
             pass
 
 
+@timed(DB_QUERY_SECONDS)
 def get_free_users() -> List[Dict[str, Any]]:
     """Возвращает список всех free пользователей текущей сессии."""
     users: List[Dict[str, Any]] = []
@@ -1,16 +1,45 @@
 # main.py
 import asyncio
 
-from aiogram import Bot as TgBot, Dispatcher
+from aiogram import Dispatcher
+from aiogram.fsm.storage.memory import MemoryStorage
 
 from services.app_state import state
-from database.repository import (
-    load_config_from_db,
-    load_admins,
-    load_stop_words,
-    clear_free_session_users,
-)
+from database.repository import load_startup_data
+from database.db import ensure_schema
 from services.telegram_service import register_handlers
+from services.key_stats import key_stats_flusher, flush_key_stats
+from services.key_monitor import key_health_monitor
+from services.overload import apply_overload_config
+from services.reply_gate import reply_gate, GATE_MODEL_PATH
+from services.ai_service import configure_models
+from services.startup import startup_timer
+from services.telegram_bridge import telegram_bridge
+from services.telegram_webhook import make_bot, start_webhook, webhook_settings
+from services.chat_archive import chat_archive, apply_archive_config
+from services.usage import apply_usage_config, usage_flusher, usage_tracker
+from services.repo_cache import repo_cache
+from services.owner_bots import resume_owner_bots
+from services.snapshot import (
+    capture,
+    restore_snapshot,
+    snapshotter,
+    write_snapshot,
+)
+from utils.metrics import metrics_port_from_config, start_metrics_server
+
+
+def prewarm_services() -> None:
+    """
+    Подгружает тяжёлые SDK (twitchAPI, openai) в фоновом потоке,
+    уже после того как Telegram-панель начала отвечать.
+    """
+    with startup_timer.phase("prewarm"):
+        try:
+            import services.twitch_service  # noqa: F401
+            import openai  # noqa: F401
+        except Exception as e:
+            print("⚠ Ошибка предзагрузки модулей:", e)
 
 
 async def main():
@@ -23,51 +52,105 @@ async def main():
     state.TELEGRAM_LOOP = loop
 
     # ==================================================
-    # CLEANUP FREE SESSION (на всякий случай)
+    # SCHEMA
+    # ==================================================
+    with startup_timer.phase("schema"):
+        ensure_schema()
+
+    # ==================================================
+    # WARM RESTART (снимок runtime-состояния)
     # ==================================================
-    clear_free_session_users()
+    with startup_timer.phase("snapshot_restore"):
+        warm = restore_snapshot()
 
     # ==================================================
-    # LOAD CONFIG
+    # LOAD CONFIG / ADMINS / STOP WORDS (один проход по БД)
+    # + очистка free_session_users (только при холодном старте)
     # ==================================================
-    cfg = load_config_from_db()
+    with startup_timer.phase("db_load"):
+        data = load_startup_data(clear_sessions=not warm)
+
+    # config, админы и стоп-слова дальше читаются только из памяти
+    cfg = repo_cache.prime(data)
     state.APP_ID = cfg.get("twitch_client_id")
     state.APP_SECRET = cfg.get("twitch_client_secret")
     state.TELEGRAM_API_KEY = cfg.get("telegram_api_key")
+    apply_overload_config(cfg)
+    apply_archive_config(cfg)
+    apply_usage_config(cfg)
+    # часовые окна бюджетов — с расходом, записанным до рестарта
+    with startup_timer.phase("usage_restore"):
+        usage_tracker.restore()
+    configure_models(cfg)
+    reply_gate.load_model(cfg.get("reply_gate_model", GATE_MODEL_PATH))
 
     if not state.TELEGRAM_API_KEY:
         print("❌ TELEGRAM_API_KEY не найден в таблице config.")
         return
 
-    # ==================================================
-    # LOAD ADMINS
-    # ==================================================
-    state.ADMINS = load_admins()
-
     if not state.ADMINS:
         print("⚠ В БД нет администраторов (таблица admins пуста).")
 
-    # ==================================================
-    # LOAD STOP WORDS (GLOBAL)
-    # ==================================================
-    state.STOP_WORDS = load_stop_words()
-
     # ==================================================
     # TELEGRAM BOT INIT
     # ==================================================
-    bot = TgBot(token=state.TELEGRAM_API_KEY)
-    dp = Dispatcher()
+    bot = make_bot(state.TELEGRAM_API_KEY, cfg)
+    # режимы панели — отдельно на каждого админа (ключ — чат и пользователь)
+    dp = Dispatcher(storage=MemoryStorage())
     state.telegram_bot = bot
+    telegram_bridge.start()
+    chat_archive.start()
 
     register_handlers(dp)
 
+    startup_timer.mark("telegram_ready")
+    print(startup_timer.report())
     print("📲 Telegram-бот запущен и ожидает /start")
 
     # ==================================================
-    # START POLLING
+    # START POLLING / WEBHOOK
     # ==================================================
-    await bot.delete_webhook(drop_pending_updates=True)
-    await dp.start_polling(bot)
+    flusher = asyncio.create_task(key_stats_flusher())
+    usage_writer = asyncio.create_task(usage_flusher())
+    key_monitor = asyncio.create_task(key_health_monitor())
+    snapshots = asyncio.create_task(snapshotter())
+    prewarm = asyncio.create_task(asyncio.to_thread(prewarm_services))
+
+    # после рестарта боты владельцев с сохранёнными токенами и каналом
+    # поднимаются сразу, не дожидаясь /start
+    resume_owner_bots(data["resume_owners"])
+
+    # /metrics для Prometheus; metrics_port = 0 в config — выключено
+    metrics_server = None
+    metrics_port = metrics_port_from_config(cfg)
+    if metrics_port:
+        metrics_server = await start_metrics_server(port=metrics_port)
+
+    webhook = webhook_settings(cfg)
+    runner = None
+    try:
+        if webhook:
+            runner = await start_webhook(bot, dp, webhook)
+            # апдейты приходят в aiohttp-обработчик, main просто живёт до остановки
+            await asyncio.Event().wait()
+        else:
+            await bot.delete_webhook(drop_pending_updates=True)
+            await dp.start_polling(bot)
+    finally:
+        if runner is not None:
+            await runner.cleanup()
+        await telegram_bridge.stop()
+        await asyncio.to_thread(chat_archive.stop)
+        flusher.cancel()
+        usage_writer.cancel()
+        key_monitor.cancel()
+        snapshots.cancel()
+        write_snapshot(capture())
+        prewarm.cancel()
+        if metrics_server is not None:
+            metrics_server.close()
+        flush_key_stats()
+        usage_tracker.flush()
 
 
 if __name__ == "__main__":
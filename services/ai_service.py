@@ -1,194 +1,398 @@
 # services/ai_service.py
+import asyncio
 import random
-from typing import Optional
-from openai import OpenAI
+from time import perf_counter
+from typing import TYPE_CHECKING, Dict, List, Optional
 
-from .app_state import state
+if TYPE_CHECKING:
+    from openai import OpenAI
+
+from .app_state import state, ChannelState, OwnerContext, DECORATIONS
+from .model_chain import (
+    DEFAULT_MODELS,
+    parse_models,
+    get_breaker,
+    trip_key,
+    get_model_stats,
+    ordered_models,
+)
+from .key_stats import KEY_RANK_INVALID, key_is_invalid, key_rank, record_key_result
+from .reply_gate import reply_gate
+from .telegram_bridge import telegram_bridge
+from .snapshot import restored_key_index
+from .usage import usage_from_response, usage_tracker
+from .telemetry import (
+    AI_GENERATIONS,
+    AI_GENERATION_SECONDS,
+    AI_REQUESTS,
+    AI_REQUEST_SECONDS,
+    key_label,
+)
 
 
 # ======================================================
 # DEEPSEEK CLIENT MANAGEMENT
 # ======================================================
 
-def init_ai_client() -> bool:
+AI_BASE_URL = "https://openrouter.ai/api/v1"
+AI_REQUEST_TIMEOUT: float = 20.0   # сек — дольше ждать ответа нет смысла
+OWNER_MAX_GENERATIONS: int = 2     # одновременных генераций на владельца
+
+# клиенты кешируются по ключу, чтобы не пересоздавать их на каждый запрос
+_clients: Dict[str, "OpenAI"] = {}
+
+
+def get_client(key: str) -> "OpenAI":
+    client = _clients.get(key)
+    if client is None:
+        # SDK openai подгружается при первом запросе, а не при старте процесса
+        from openai import OpenAI
+        client = OpenAI(
+            api_key=key,
+            base_url=AI_BASE_URL,
+            timeout=AI_REQUEST_TIMEOUT,
+            max_retries=0,
+        )
+        _clients[key] = client
+    return client
+
+
+def configure_models(cfg: Dict[str, str]) -> None:
     """
-    Инициализирует AI-клиент с первым доступным ключом.
+    Загружает цепочку моделей из config (ключ ai_models,
+    через запятую, в порядке предпочтения).
+    """
+    models = parse_models(cfg.get("ai_models", ""))
+    state.AI_MODELS = models or list(DEFAULT_MODELS)
+    print(f"🧠 Модели AI: {', '.join(state.AI_MODELS)}")
+
+
+def init_ai_client(ctx: OwnerContext) -> bool:
+    """
+    Инициализирует AI-клиент владельца с первым доступным ключом.
     Возвращает True, если удалось инициализировать.
     """
-    if not state.DEEPSEEK_KEYS:
+    if not ctx.DEEPSEEK_KEYS:
         print("❌ Нет DeepSeek ключей для инициализации.")
-        state.client = None
+        ctx.client = None
         return False
 
-    state.current_key_index = 0
-    key = state.DEEPSEEK_KEYS[state.current_key_index]
-    state.client = OpenAI(
-        api_key=key,
-        base_url="https://openrouter.ai/api/v1"
-    )
+    # после тёплого рестарта продолжаем с того же ключа
+    restored = restored_key_index(ctx)
+    ctx.current_key_index = restored if restored is not None else 0
+    key = ctx.DEEPSEEK_KEYS[ctx.current_key_index]
+    ctx.client = get_client(key)
     print(f"🧠 AI клиент инициализирован: {key[:12]}...")
     return True
 
 
-def switch_to_next_key() -> bool:
+def switch_to_next_key(ctx: OwnerContext) -> bool:
     """
-    Переключается на следующий ключ DeepSeek.
+    Переключается на следующий ключ DeepSeek владельца.
     Возвращает False, если ключи закончились.
     """
-    state.current_key_index += 1
+    ctx.current_key_index += 1
 
-    if state.current_key_index >= len(state.DEEPSEEK_KEYS):
+    if ctx.current_key_index >= len(ctx.DEEPSEEK_KEYS):
         print("❌ Все ключи DeepSeek исчерпаны.")
-        state.client = None
+        ctx.client = None
         return False
 
-    new_key = state.DEEPSEEK_KEYS[state.current_key_index]
-    state.client = OpenAI(
-        api_key=new_key,
-        base_url="https://openrouter.ai/api/v1"
-    )
+    new_key = ctx.DEEPSEEK_KEYS[ctx.current_key_index]
+    ctx.client = get_client(new_key)
     print(f"🔄 Переключение на новый ключ: {new_key[:12]}...")
     return True
 
 
-def get_first_working_key(max_retries: int = 3) -> Optional[str]:
+def _error_kind(err: Exception) -> str:
+    """
+    Исход по HTTP-статусу ошибки SDK (APIStatusError.status_code),
+    а не по тексту: "401" может встретиться в любом сообщении.
+    """
+    status = getattr(err, "status_code", None)
+    if status is None:
+        status = getattr(getattr(err, "response", None), "status_code", None)
+    if status == 429:
+        return "429"
+    if status == 401:
+        return "401"
+    return "error"
+
+
+def complete(key: str, model: str, messages: List[Dict[str, str]], max_tokens: int,
+             probe: bool = False):
+    """
+    Один запрос к модели через пару ключ×модель с учётом автомата отключения.
+    Возвращает (response, kind), где kind: "ok" / "open" / "429" / "401" / "error".
+    probe=True — фоновая проверка ключа: задержка не влияет на порядок моделей.
     """
-    Проверяет ключи и возвращает первый рабочий.
+    breaker = get_breaker(key, model)
+    if not breaker.allow():
+        AI_REQUESTS.inc(key=key_label(key), model=model, result="open")
+        return None, "open"
+
+    stats = get_model_stats(model)
+    t0 = perf_counter()
+    try:
+        response = get_client(key).chat.completions.create(
+            model=model,
+            messages=messages,
+            max_tokens=max_tokens,
+        )
+    except Exception as e:
+        kind = _error_kind(e)
+        latency = perf_counter() - t0
+        if not probe:
+            stats.record(latency, ok=False)
+        record_key_result(key, kind, latency)
+        AI_REQUESTS.inc(key=key_label(key), model=model, result=kind)
+        AI_REQUEST_SECONDS.observe(latency, model=model)
+        if kind == "401":
+            trip_key(key)
+            print(f"⚠ 401 (невалидный): {key[:12]}...")
+        else:
+            breaker.record_failure()
+            if kind == "429":
+                print(f"⚠ 429 (лимит): {key[:12]}... / {model}")
+            else:
+                print(f"⚠ Ошибка {model} ({key[:12]}...): {e}")
+        return None, kind
+
+    latency = perf_counter() - t0
+    if not probe:
+        stats.record(latency, ok=True)
+    breaker.record_success()
+    AI_REQUESTS.inc(key=key_label(key), model=model, result="ok")
+    AI_REQUEST_SECONDS.observe(latency, model=model)
+
+    usage = getattr(response, "usage", None)
+    record_key_result(
+        key,
+        "ok",
+        latency,
+        prompt_tokens=getattr(usage, "prompt_tokens", 0) or 0,
+        completion_tokens=getattr(usage, "completion_tokens", 0) or 0,
+    )
+    return response, "ok"
+
+
+def get_first_working_key(ctx: OwnerContext, max_retries: int = 3) -> Optional[str]:
+    """
+    Проверяет ключи владельца и возвращает первый рабочий.
     Используется при старте.
     """
-    if not state.DEEPSEEK_KEYS:
+    if not ctx.DEEPSEEK_KEYS:
         print("❌ Список DeepSeek ключей пуст.")
         return None
 
     test_prompt = "ответь одним словом: ok"
+    messages = [
+        {"role": "system", "content": "ответь 'ok'"},
+        {"role": "user", "content": test_prompt}
+    ]
 
     for attempt in range(1, max_retries + 1):
         print(f"🔎 Поиск рабочего ключа (попытка {attempt}/{max_retries})")
 
-        for key in state.DEEPSEEK_KEYS:
-            try:
-                client = OpenAI(
-                    api_key=key,
-                    base_url="https://openrouter.ai/api/v1"
-                )
-                response = client.chat.completions.create(
-                    model="deepseek/deepseek-r1:free",
-                    messages=[
-                        {"role": "system", "content": "ответь 'ok'"},
-                        {"role": "user", "content": test_prompt}
-                    ],
-                    max_tokens=5
-                )
+        for key in ctx.DEEPSEEK_KEYS:
+            if key_is_invalid(key):
+                continue
+            for model in ordered_models():
+                response, kind = complete(key, model, messages, max_tokens=5)
+                if response is not None:
+                    usage_tracker.record_probe(ctx.telegram_id, *usage_from_response(response))
                 if response and response.choices:
-                    print(f"✅ Рабочий ключ найден: {key[:12]}...")
+                    print(f"✅ Рабочий ключ найден: {key[:12]}... ({model})")
                     return key
-            except Exception as e:
-                if "429" in str(e):
-                    print(f"⚠ 429 (лимит): {key[:12]}...")
-                elif "401" in str(e):
-                    print(f"⚠ 401 (невалидный): {key[:12]}...")
-                else:
-                    print(f"⚠ Ошибка ключа {key[:12]}: {e}")
+                if kind == "401":
+                    break
 
     print("❌ Не удалось найти рабочий ключ.")
     return None
 
 
+PROBE_MESSAGES = [{"role": "user", "content": "ok"}]
+
+
+def check_key(key: str, owner_id: Optional[int] = None) -> str:
+    """
+    Фоновая проверка ключа из списка: один токен через лучшую модель,
+    исход попадает в статистику ключа и автоматы (401 размыкает все пары),
+    потраченные токены — в бюджет владельца ключа.
+    """
+    response, kind = complete(key, ordered_models()[0], PROBE_MESSAGES, max_tokens=1, probe=True)
+    if response is not None and owner_id is not None:
+        usage_tracker.record_probe(owner_id, *usage_from_response(response))
+    return kind
+
+
+def probe_key(key: str, owner_id: Optional[int] = None) -> str:
+    """
+    Проверка нового ключа одним коротким запросом, без автоматов и статистики
+    (ключа ещё нет в списке). Возвращает "ok" / "429" / "401" / "error".
+    """
+    model = ordered_models()[0]
+    try:
+        response = get_client(key).chat.completions.create(
+            model=model,
+            messages=PROBE_MESSAGES,
+            max_tokens=1,
+        )
+    except Exception as e:
+        kind = _error_kind(e)
+        if kind != "429":
+            # невалидный / непроверенный ключ — клиент не держим
+            _clients.pop(key, None)
+        return kind
+    if owner_id is not None:
+        usage_tracker.record_probe(owner_id, *usage_from_response(response))
+    return "ok"
+
+
 # ======================================================
 # MESSAGE GENERATION
 # ======================================================
 
-async def send_ai_message():
+def generate(ctx: OwnerContext, messages: List[Dict[str, str]]):
     """
-    Генерирует и отправляет сообщение в Twitch-чат.
-    Вызывается после накопления trigger_messages.
+    Синхронно получает ответ модели из пула ключей владельца: ключи начиная
+    с текущего, для каждого — модели по качеству. Возвращает response или None.
     """
-    if not state.BOT_ENABLED:
+    # обходим ключи начиная с текущего, для каждого — модели по качеству;
+    # разомкнутые пары ключ×модель пропускаются без сетевого запроса
+    # известные монитору невалидные ключи не трогаем, недавно получившие 429 — в конец
+    keys = list(ctx.DEEPSEEK_KEYS)
+    n_keys = len(keys)
+    order = sorted(
+        ((ctx.current_key_index + shift) % n_keys for shift in range(n_keys)),
+        key=lambda i: key_rank(keys[i]),
+    )
+    response = None
+    for idx in order:
+        key = keys[idx]
+        if key_rank(key) == KEY_RANK_INVALID:
+            continue
+
+        for model in ordered_models():
+            response, kind = complete(key, model, messages, max_tokens=60)
+            if kind == "ok" or kind == "401":
+                break
+
+        if response is not None:
+            if idx != ctx.current_key_index or ctx.client is None:
+                ctx.current_key_index = idx
+                ctx.client = get_client(key)
+                print(f"🔄 Переключение на ключ: {key[:12]}...")
+            break
+
+    return response
+
+
+async def send_ai_message(ch: ChannelState):
+    """
+    Генерирует и отправляет сообщение в Twitch-чат канала от бота
+    его владельца. Вызывается после накопления триггеров.
+    """
+    ctx = state.channel_owner(ch.name)
+    if ctx is None or not ctx.BOT_ENABLED:
+        return
+
+    # ctx.client не проверяем: generate() сам выбирает рабочий ключ по key_rank,
+    # так что ключ, не ответивший при старте (например, 429), подхватится позже
+    if not ctx.DEEPSEEK_KEYS:
         return
 
-    if state.client is None:
-        print("⚠ AI клиент не инициализирован.")
+    # часовой бюджет токенов: ближе к лимиту порог растёт, за лимитом — молчим
+    if ch.triggers < ch.threshold * usage_tracker.slowdown(ctx.telegram_id, ch.name):
         return
 
-    if len(state.trigger_messages) < state.message_threshold:
+    if not ch.history:
         return
 
-    if not state.chat_history:
+    # дешёвая локальная проверка: есть ли в истории что-то, на что стоит отвечать
+    # пропуски не печатаем построчно (в загруженном чате это поток строк) —
+    # они в счётчиках фильтра: /stats и /metrics
+    if not reply_gate.should_reply(ch.history):
+        AI_GENERATIONS.inc(channel=ch.name, result="gated")
+        ch.reset_triggers()
         return
 
     prompt = (
         "Ответь как обычный участник Twitch-чата.\n"
         "Ответ короткий (до 10 слов), без точки в конце, с маленькой буквы.\n\n"
         "История сообщений:\n"
-        + "\n".join(state.chat_history)
+        + ch.prompt_history()
     )
 
-    for _ in range(len(state.DEEPSEEK_KEYS)):
-        try:
-            response = state.client.chat.completions.create(
-                model="deepseek/deepseek-r1:free",
-                messages=[
-                    {
-                        "role": "system",
-                        "content": (
-                            "Ты обычный зритель Twitch-чата. "
-                            "Не притворяйся ботом. Пиши естественно."
-                        )
-                    },
-                    {"role": "user", "content": prompt}
-                ],
-                max_tokens=60
+    messages = [
+        {
+            "role": "system",
+            "content": (
+                "Ты обычный зритель Twitch-чата. "
+                "Не притворяйся ботом. Пиши естественно."
             )
+        },
+        {"role": "user", "content": prompt}
+    ]
 
-            if not response or not response.choices:
-                print("⚠ Пустой ответ от AI.")
-                return
+    # запрос к модели блокирующий — уводим его из loop чата в поток,
+    # чтобы чат продолжал читаться; повторная генерация в канале не стартует,
+    # а у владельца не больше OWNER_MAX_GENERATIONS запросов сразу —
+    # один владелец с кучей каналов не занимает потоки остальных
+    if ch.generating or ctx.active_generations >= OWNER_MAX_GENERATIONS:
+        AI_GENERATIONS.inc(channel=ch.name, result="busy")
+        return
+    ch.generating = True
+    ctx.active_generations += 1
+    try:
+        with AI_GENERATION_SECONDS.time(channel=ch.name):
+            response = await asyncio.to_thread(generate, ctx, messages)
+    finally:
+        ch.generating = False
+        ctx.active_generations -= 1
 
-            message = response.choices[0].message.content
-            if not message:
-                print("⚠ AI вернул пустое сообщение.")
-                return
+    if response is None:
+        print("❌ Нет доступных пар ключ×модель для ответа.")
+        AI_GENERATIONS.inc(channel=ch.name, result="no_response")
+        return
 
-            # финальное сообщение
-            if len(message) > 70:
-                sms = random.choice(state.words)
-            else:
-                sms = message.strip() + " " + random.choice(state.words)
-
-            await state.chat.send_message(state.CURRENT_CHANNEL, sms)
-            print(f"🤖 AI → Twitch: {sms}")
-
-            # уведомление админу в Telegram
-            try:
-                from asyncio import run_coroutine_threadsafe
-                admin_id = state.get_main_admin_id()
-                if (
-                    state.TELEGRAM_LOOP
-                    and state.telegram_bot
-                    and admin_id
-                ):
-                    run_coroutine_threadsafe(
-                        state.telegram_bot.send_message(
-                            admin_id,
-                            f"🤖 Бот отправил в Twitch:\n{sms}"
-                        ),
-                        state.TELEGRAM_LOOP
-                    )
-            except Exception as e:
-                print("⚠ Ошибка отправки уведомления в Telegram:", e)
-
-            # сброс триггеров
-            state.trigger_messages.clear()
-            state.message_threshold = random.randint(7, 12)
-            return
-
-        except Exception as e:
-            err = str(e)
-            if "429" in err or "401" in err:
-                print("🔁 Проблема с ключом, пробую следующий...")
-                if not switch_to_next_key():
-                    print("❌ Нет доступных ключей для продолжения.")
-                    return
-            else:
-                print("❌ Ошибка AI:", e)
-                return
+    # токены потрачены, даже если ответ окажется пустым
+    prompt_tokens, completion_tokens = usage_from_response(response)
+    usage_tracker.record(ctx.telegram_id, ch.name, prompt_tokens, completion_tokens)
+
+    if not response.choices:
+        print("⚠ Пустой ответ от AI.")
+        AI_GENERATIONS.inc(channel=ch.name, result="empty")
+        return
+
+    message = response.choices[0].message.content
+    if not message:
+        print("⚠ AI вернул пустое сообщение.")
+        AI_GENERATIONS.inc(channel=ch.name, result="empty")
+        return
+
+    # финальное сообщение
+    if len(message) > 70:
+        # слишком длинный ответ заменяем просто смайлом; последний элемент
+        # DECORATIONS — пустая строка («без смайла»), её здесь не берём,
+        # иначе в чат ушло бы пустое сообщение
+        sms = random.choice(DECORATIONS[:-1])
+    else:
+        sms = (message.strip() + " " + state.pick_decoration()).rstrip()
+
+    # пока шёл запрос, сторож мог пересоздавать чат, а владелец — сменить канал
+    chat = ctx.chat
+    if chat is None or state.channel_owner(ch.name) is not ctx:
+        print(f"⚠ Ответ для #{ch.name} не отправлен: чат переподключается или канал сменился")
+        AI_GENERATIONS.inc(channel=ch.name, result="no_chat")
+        return
+
+    await chat.send_message(ch.name, sms)
+    print(f"🤖 AI → Twitch: {sms}")
+    AI_GENERATIONS.inc(channel=ch.name, result="sent")
+
+    # уведомление владельцу в Telegram
+    telegram_bridge.submit(ctx.telegram_id, f"🤖 Бот отправил в Twitch:\n{sms}")
+
+    # сброс триггеров
+    ch.reset_triggers()
@@ -2,106 +2,201 @@
 from __future__ import annotations
 
 import random
-from typing import List, Optional, Dict, Any
+import sys
+from collections import deque
+from dataclasses import dataclass, field
+from itertools import accumulate
+from typing import TYPE_CHECKING, Any, Deque, Dict, List, Optional
 
-from twitchAPI.chat import Chat
-from twitchAPI.twitch import Twitch
-from openai import OpenAI
+if TYPE_CHECKING:
+    # только для аннотаций: тяжёлые SDK грузятся лениво в своих сервисах
+    from twitchAPI.chat import Chat
+    from twitchAPI.twitch import Twitch
+    from openai import OpenAI
 
 
+HISTORY_SIZE = 7                 # сколько строк чата уходит в промпт
+TRIGGER_RANGE = (7, 12)          # после скольких сообщений пробовать ответить
+
+# смайлы, которые бот дописывает к ответу, и их веса;
+# "" — ответ без смайла (раньше это было 11 пробелов в списке)
+DECORATIONS: List[str] = [
+    "<3", "PoroSad", "WhySoSerious", "BangbooBounce", "SUBprise",
+    "BloodTrail", "DinoDance", "CoolCat", "BabyRage", "ItsBoshyTime",
+    "NotLikeThis", "",
+]
+DECORATION_WEIGHTS: List[int] = [1] * 11 + [11]
+DECORATION_CUM_WEIGHTS: List[int] = list(accumulate(DECORATION_WEIGHTS))
+
+
+def new_threshold() -> int:
+    return random.randint(*TRIGGER_RANGE)
+
+
+# ======================================================
+# ADMINS
+# ======================================================
+
+@dataclass(slots=True)
+class Admin:
+    telegram_id: int
+    username: Optional[str]
+    role: Optional[str]  # owner / admin
+
+
+# ======================================================
+# CHAT HISTORY / CHANNELS
+# ======================================================
+
+@dataclass(slots=True)
+class ChatLine:
+    """Строка истории чата; повторы склеиваются через count."""
+    user: str
+    text: str
+    count: int = 1
+
+    def __str__(self) -> str:
+        if self.count > 1:
+            return f"{self.user}: {self.text} (×{self.count})"
+        return f"{self.user}: {self.text}"
+
+
+@dataclass(slots=True)
+class ChannelState:
+    """
+    Состояние одного Twitch-канала: история для промпта,
+    счётчик триггеров, учёт нагрузки и фильтр истории.
+    """
+    name: str
+    history: Deque[ChatLine] = field(default_factory=lambda: deque(maxlen=HISTORY_SIZE))
+    triggers: int = 0
+    threshold: int = field(default_factory=new_threshold)
+    generating: bool = False
+
+    # создаются лениво в services/overload.py и services/ingest.py
+    load: Any = None
+    ingest: Any = None
+
+    # telegram_id владельца, чей бот сидит в канале
+    owner_id: Optional[int] = None
+
+    def add_line(self, user: str, text: str) -> ChatLine:
+        line = ChatLine(sys.intern(user), text)
+        self.history.append(line)
+        return line
+
+    def prompt_history(self) -> str:
+        return "\n".join(str(line) for line in self.history)
+
+    def reset(self) -> None:
+        """Сбрасывает накопленные сообщения и триггеры."""
+        self.history.clear()
+        self.reset_triggers()
+
+    def reset_triggers(self) -> None:
+        self.triggers = 0
+        self.threshold = new_threshold()
+
+
+# ======================================================
+# OWNERS (у каждого админа — свой бот)
+# ======================================================
+
+@dataclass(slots=True)
+class OwnerContext:
+    """
+    Рабочее состояние одного владельца: ключи, канал, флаг работы
+    и собственное подключение к Twitch (режимы панели — в FSM aiogram).
+    Контексты не пересекаются — несколько админов работают одновременно.
+    """
+    telegram_id: int
+
+    # DeepSeek: свой пул ключей и текущий ключ
+    DEEPSEEK_KEYS: List[str] = field(default_factory=list)
+    client: Optional[OpenAI] = None
+    current_key_index: int = 0
+    active_generations: int = 0      # запросы к модели, идущие прямо сейчас
+
+    # Twitch
+    CURRENT_CHANNEL: Optional[str] = None
+    TARGET_CHANNEL: Optional[str] = None
+    twitch_app: Optional[Twitch] = None
+    chat: Optional[Chat] = None
+    supervisor: Any = None           # ChatSupervisor, создаётся в chat_supervisor.py
+    token_refresher: Any = None      # asyncio.Task
+    init_task: Any = None            # asyncio.Task
+    init_timer: Any = None           # PhaseTimer фаз init_twitch_bot (startup.py)
+    initializing: bool = False
+
+    # режимы панели — FSM aiogram (telegram_service.PanelStates), не здесь
+    BOT_ENABLED: bool = False
+
+
+# ======================================================
+# APP STATE
+# ======================================================
+
+@dataclass(slots=True)
 class AppState:
     """
     Глобальное состояние приложения.
     Используется всеми сервисами (Telegram / Twitch / AI).
     """
 
-    def __init__(self):
-        # ==================================================
-        # CONFIG
-        # ==================================================
-        self.APP_ID: Optional[str] = None
-        self.APP_SECRET: Optional[str] = None
-        self.TELEGRAM_API_KEY: Optional[str] = None
-
-        # ==================================================
-        # ADMINS / ROLES
-        # ==================================================
-        # список админов:
-        # [{ telegram_id, username, role }]
-        self.ADMINS: List[Dict[str, Any]] = []
-
-        # текущий активный админ (устанавливается при /start)
-        self.ACTIVE_TELEGRAM_ID: Optional[int] = None
-        self.ACTIVE_ROLE: Optional[str] = None  # owner / admin
-
-        # ==================================================
-        # DEEPSEEK / AI
-        # ==================================================
-        self.DEEPSEEK_KEYS: List[str] = []
-        self.client: Optional[OpenAI] = None
-        self.current_key_index: int = 0
-
-        # ==================================================
-        # STOP WORDS
-        # ==================================================
-        self.STOP_WORDS: List[str] = []
-        self.STOP_WORDS_MODE: bool = False
-
-        # ==================================================
-        # TWITCH
-        # ==================================================
-        self.CURRENT_CHANNEL: Optional[str] = None
-        self.TARGET_CHANNEL: Optional[str] = None
-
-        self.twitch_app: Optional[Twitch] = None
-        self.chat: Optional[Chat] = None
-
-        # ==================================================
-        # TELEGRAM
-        # ==================================================
-        self.telegram_bot = None          # aiogram.Bot
-        self.TELEGRAM_LOOP = None         # asyncio loop
-
-        # ==================================================
-        # BOT MODES / FLAGS
-        # ==================================================
-        self.BOT_ENABLED: bool = False
-
-        self.CHANGE_CHANNEL_MODE: bool = False
-        self.ADDING_KEY_MODE: bool = False
-        self.DELETING_KEY_MODE: bool = False
-
-        # ==================================================
-        # CHAT MEMORY / TRIGGERS
-        # ==================================================
-        self.chat_history: List[str] = []
-        self.trigger_messages: List[str] = []
-        self.message_threshold: int = random.randint(7, 12)
-
-        # ==================================================
-        # DECORATION WORDS
-        # ==================================================
-        self.words: List[str] = [
-            "<3", "PoroSad", "WhySoSerious", "BangbooBounce", "SUBprise",
-            "BloodTrail", "DinoDance", "CoolCat", "BabyRage", "ItsBoshyTime",
-            "NotLikeThis",
-            " ", " ", " ", " ", " ", " ", " ", " ", " ", " ", " "
-        ]
+    # ==================================================
+    # CONFIG
+    # ==================================================
+    APP_ID: Optional[str] = None
+    APP_SECRET: Optional[str] = None
+    TELEGRAM_API_KEY: Optional[str] = None
+
+    # ==================================================
+    # ADMINS / ROLES
+    # ==================================================
+    ADMINS: List[Admin] = field(default_factory=list)
+    _admins_by_id: Dict[int, Admin] = field(default_factory=dict)
+
+    # рабочие контексты владельцев: telegram_id -> OwnerContext
+    owners: Dict[int, OwnerContext] = field(default_factory=dict)
+
+    # ==================================================
+    # DEEPSEEK / AI
+    # ==================================================
+    # цепочка моделей в порядке предпочтения (config: ai_models)
+    AI_MODELS: List[str] = field(default_factory=lambda: ["deepseek/deepseek-r1:free"])
+
+    # ==================================================
+    # TWITCH
+    # ==================================================
+    # состояние по каналам: name -> ChannelState
+    channels: Dict[str, ChannelState] = field(default_factory=dict)
+
+    # ==================================================
+    # TELEGRAM
+    # ==================================================
+    telegram_bot: Any = None          # aiogram.Bot
+    TELEGRAM_LOOP: Any = None         # asyncio loop
 
     # ==================================================
     # HELPERS
     # ==================================================
 
+    def set_admins(self, rows: List[Dict[str, Any]]) -> None:
+        """Загружает админов из строк БД ({telegram_id, username, role})."""
+        self.ADMINS = [
+            Admin(int(r["telegram_id"]), r.get("username"), r.get("role"))
+            for r in rows
+        ]
+        self._admins_by_id = {a.telegram_id: a for a in self.ADMINS}
+
     def is_admin(self, telegram_id: int) -> bool:
         """Проверяет, является ли пользователь админом."""
-        return any(a["telegram_id"] == telegram_id for a in self.ADMINS)
+        return telegram_id in self._admins_by_id
 
     def get_admin_role(self, telegram_id: int) -> Optional[str]:
         """Возвращает роль админа (owner/admin) или None."""
-        for a in self.ADMINS:
-            if a["telegram_id"] == telegram_id:
-                return a.get("role")
-        return None
+        admin = self._admins_by_id.get(telegram_id)
+        return admin.role if admin else None
 
     def get_main_admin_id(self) -> Optional[int]:
         """
@@ -109,20 +204,64 @@ class AppState:
         иначе — первого админа.
         """
         for a in self.ADMINS:
-            if a.get("role") == "owner":
-                return a["telegram_id"]
-        return self.ADMINS[0]["telegram_id"] if self.ADMINS else None
+            if a.role == "owner":
+                return a.telegram_id
+        return self.ADMINS[0].telegram_id if self.ADMINS else None
+
+    def owner_ctx(self, telegram_id: int) -> OwnerContext:
+        """Контекст владельца (создаётся при первом обращении)."""
+        ctx = self.owners.get(telegram_id)
+        if ctx is None:
+            ctx = OwnerContext(telegram_id)
+            self.owners[telegram_id] = ctx
+        return ctx
+
+    def bind_channel(self, ctx: OwnerContext, name: str) -> ChannelState:
+        """Делает канал текущим для владельца (старый канал освобождается)."""
+        old = ctx.CURRENT_CHANNEL
+        if old and old != name and old in self.channels:
+            self.channels[old].owner_id = None
+        ctx.CURRENT_CHANNEL = name
+        ctx.TARGET_CHANNEL = name
+        ch = self.get_channel(name)
+        ch.owner_id = ctx.telegram_id
+        return ch
+
+    def channel_owner(self, name: Optional[str]) -> Optional[OwnerContext]:
+        """Владелец, чей бот сидит в канале, или None."""
+        ch = self.channels.get(name or "")
+        if ch is None or ch.owner_id is None:
+            return None
+        return self.owners.get(ch.owner_id)
 
-    def set_active_admin(self, telegram_id: int):
-        """Устанавливает активного админа для текущей сессии."""
-        self.ACTIVE_TELEGRAM_ID = telegram_id
-        self.ACTIVE_ROLE = self.get_admin_role(telegram_id)
+    def all_keys(self) -> List[str]:
+        """Ключи всех владельцев (без повторов)."""
+        return list(dict.fromkeys(k for ctx in self.owners.values() for k in ctx.DEEPSEEK_KEYS))
+
+    def get_channel(self, name: Optional[str] = None) -> ChannelState:
+        """Возвращает (создаёт) состояние канала."""
+        name = name or ""
+        ch = self.channels.get(name)
+        if ch is None:
+            ch = ChannelState(sys.intern(name))
+            self.channels[name] = ch
+        return ch
 
     def reset_triggers(self):
-        """Сбрасывает накопленные сообщения и триггеры."""
-        self.chat_history.clear()
-        self.trigger_messages.clear()
-        self.message_threshold = random.randint(7, 12)
+        """Сбрасывает накопленные сообщения и триггеры во всех каналах."""
+        for ch in self.channels.values():
+            ch.reset()
+
+    def reset_owner_triggers(self, ctx: OwnerContext) -> None:
+        """То же, но только в каналах одного владельца."""
+        for ch in self.channels.values():
+            if ch.owner_id == ctx.telegram_id:
+                ch.reset()
+
+    @staticmethod
+    def pick_decoration() -> str:
+        """Случайный смайл к ответу (или пустая строка) по таблице весов."""
+        return random.choices(DECORATIONS, cum_weights=DECORATION_CUM_WEIGHTS)[0]
 
 
 # ======================================================
@@ -0,0 +1,178 @@
+# services/chat_archive.py
+"""
+Архив Twitch-чата: каждая строка, дошедшая до on_message, с исходом обработки.
+
+Горячий путь только кладёт кортеж в deque (потокобезопасно, O(1)).
+Отдельный поток пачками пишет в таблицу chat_archive через executemany,
+раз в сутки удаляет строки старше CHAT_ARCHIVE_DAYS.
+
+Нужен для:
+  • прогрева истории канала после рестарта;
+  • реплей-бенчмарков на реальном чате (экспорт в JSONL);
+  • аналитики.
+
+Экспорт:
+    python -m services.chat_archive export <channel> out.jsonl [--hours 24]
+"""
+import json
+import sys
+import threading
+import time
+from collections import deque
+from typing import Deque, Optional, Tuple
+
+from database.repository import load_chat_lines, prune_chat_archive, save_chat_lines
+
+from .app_state import HISTORY_SIZE, ChannelState
+
+
+# ======================================================
+# SETTINGS
+# ======================================================
+
+ARCHIVE_FLUSH_INTERVAL: float = 2.0     # сек между записями пачек
+ARCHIVE_BATCH_SIZE: int = 500           # запись раньше срока, если набралось
+ARCHIVE_QUEUE_MAX: int = 50000          # дальше — теряем самые старые строки
+ARCHIVE_PRUNE_INTERVAL: float = 24 * 60 * 60
+CHAT_ARCHIVE_DAYS: int = 30             # 0 — хранить всё
+
+WARMUP_MAX_AGE: float = 15 * 60         # старше — история уже неактуальна
+
+
+def apply_archive_config(cfg: dict) -> None:
+    """Переопределяет срок хранения из таблицы config (chat_archive_days)."""
+    global CHAT_ARCHIVE_DAYS
+    try:
+        if cfg.get("chat_archive_days") is not None:
+            CHAT_ARCHIVE_DAYS = int(cfg["chat_archive_days"])
+    except (TypeError, ValueError):
+        print("⚠ Неверное значение chat_archive_days в config, оставляю по умолчанию.")
+
+
+# ======================================================
+# WRITER
+# ======================================================
+
+ArchiveRow = Tuple[str, float, str, str, str]
+
+
+class ChatArchive:
+    def __init__(self):
+        self.pending: Deque[ArchiveRow] = deque(maxlen=ARCHIVE_QUEUE_MAX)
+        self.written: int = 0
+        self.dropped: int = 0
+        self.failed_batches: int = 0
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._next_prune: float = 0.0
+
+    def start(self) -> None:
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="chat-archive", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 5.0) -> None:
+        """Дописывает остаток очереди и останавливает поток."""
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._wake.set()
+        self._thread.join(timeout)
+        self._thread = None
+
+    def append(self, channel: str, user: str, text: str, result: str) -> None:
+        """Вызывается из on_message — без ввода-вывода и блокировок."""
+        if len(self.pending) == ARCHIVE_QUEUE_MAX:
+            # deque с maxlen сам вытеснит самую старую строку
+            self.dropped += 1
+        self.pending.append((channel, time.time(), user, text, result))
+        if len(self.pending) >= ARCHIVE_BATCH_SIZE:
+            self._wake.set()
+
+    def _drain(self) -> None:
+        while self.pending:
+            batch = []
+            while self.pending and len(batch) < ARCHIVE_BATCH_SIZE * 4:
+                batch.append(self.pending.popleft())
+            if save_chat_lines(batch):
+                self.written += len(batch)
+            else:
+                # БД недоступна — строки теряем, но чат не тормозим
+                self.failed_batches += 1
+                self.dropped += len(batch)
+                return
+
+    def _prune(self) -> None:
+        now = time.time()
+        if CHAT_ARCHIVE_DAYS <= 0 or now < self._next_prune:
+            return
+        self._next_prune = now + ARCHIVE_PRUNE_INTERVAL
+        deleted = prune_chat_archive(now - CHAT_ARCHIVE_DAYS * 86400)
+        if deleted:
+            print(f"🗄 Архив чата: удалено {deleted} строк старше {CHAT_ARCHIVE_DAYS} дн.")
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            self._wake.wait(ARCHIVE_FLUSH_INTERVAL)
+            self._wake.clear()
+            self._drain()
+            self._prune()
+        self._drain()
+
+    def stats_text(self) -> str:
+        return (
+            f"Архив чата: записано {self.written}, в очереди {len(self.pending)}, "
+            f"потеряно {self.dropped}"
+        )
+
+
+chat_archive = ChatArchive()
+
+
+# ======================================================
+# WARM-UP
+# ======================================================
+
+def warm_channel_history(ch: ChannelState) -> int:
+    """
+    Заполняет пустую историю канала последними принятыми строками из архива.
+    Блокирующий вызов — из event loop только через asyncio.to_thread.
+    """
+    if ch.history:
+        return 0
+    rows = load_chat_lines(
+        ch.name,
+        since=time.time() - WARMUP_MAX_AGE,
+        limit=HISTORY_SIZE,
+        result="accepted",
+    )
+    for r in rows:
+        ch.add_line(r["user"], r["text"])
+    return len(rows)
+
+
+# ======================================================
+# EXPORT (для bench/replay.py --source)
+# ======================================================
+
+def export_jsonl(channel: str, path: str, hours: Optional[float] = None) -> int:
+    since = time.time() - hours * 3600 if hours else None
+    rows = load_chat_lines(channel, since=since)
+    with open(path, "w", encoding="utf-8") as f:
+        for r in rows:
+            f.write(json.dumps({"user": r["user"], "text": r["text"], "ts": r["ts"]},
+                               ensure_ascii=False) + "\n")
+    return len(rows)
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    if len(args) < 3 or args[0] != "export":
+        print("Использование: python -m services.chat_archive export <channel> out.jsonl [--hours N]")
+        sys.exit(1)
+    hours = float(args[args.index("--hours") + 1]) if "--hours" in args else None
+    n = export_jsonl(args[1].lower(), args[2], hours)
+    print(f"✅ Выгружено строк: {n}")
@@ -0,0 +1,222 @@
+# services/chat_supervisor.py
+"""
+Надзор за подключением к Twitch-чату.
+
+Сторожевая задача в основном loop раз в WATCHDOG_INTERVAL проверяет
+Chat (is_connected / is_ready). Если чат нездоров несколько проверок
+подряд (собственный реконнект twitchAPI не помог), старый клиент
+останавливается и создаётся новый — с экспоненциальной паузой и jitter.
+
+После READY все нужные каналы заходятся пачками в пределах лимита
+Twitch на JOIN (20 каналов за 10 с для обычного аккаунта).
+Состояние каналов (история, триггеры, нагрузка) живёт в state.channels
+и переподключение его не трогает.
+
+У каждого владельца свой Chat (свой Twitch-аккаунт) и свой сторож.
+
+Модуль не импортирует twitchAPI: создание Chat передаётся из twitch_service.
+"""
+import asyncio
+import random
+from time import monotonic
+from typing import Awaitable, Callable, List, Optional, Set
+
+from .app_state import OwnerContext, state
+
+
+# ======================================================
+# SETTINGS
+# ======================================================
+
+WATCHDOG_INTERVAL: float = 10.0     # сек между проверками
+UNHEALTHY_CHECKS: int = 2           # столько проверок подряд — и переподключаемся
+BACKOFF_BASE: float = 1.0
+BACKOFF_MAX: float = 120.0
+
+JOIN_BATCH: int = 20                # лимит Twitch: 20 JOIN за 10 с
+JOIN_WINDOW: float = 10.5
+
+
+def backoff_delay(attempt: int) -> float:
+    """Экспоненциальная пауза с jitter: [0.5; 1] от BASE * 2^attempt, не больше MAX."""
+    delay = min(BACKOFF_MAX, BACKOFF_BASE * (2 ** attempt))
+    return delay * random.uniform(0.5, 1.0)
+
+
+class ChatSupervisor:
+    def __init__(self, ctx: OwnerContext):
+        self.ctx = ctx
+        self.connect: Optional[Callable[[], Awaitable[object]]] = None
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self.chat_loop: Optional[asyncio.AbstractEventLoop] = None
+        self.task: Optional[asyncio.Task] = None
+        self.wake: Optional[asyncio.Event] = None
+
+        self.joined: Set[str] = set()
+        self.attempt: int = 0
+        self.unhealthy: int = 0
+        self.reconnects: int = 0
+        self.down_since: Optional[float] = None
+        self.last_outage: float = 0.0
+
+    # ==================================================
+    # LIFECYCLE
+    # ==================================================
+
+    def start(self, connect: Callable[[], Awaitable[object]]) -> None:
+        """connect() создаёт, настраивает и запускает новый Chat."""
+        self.connect = connect
+        if self.task is not None and not self.task.done():
+            return
+        self.loop = asyncio.get_running_loop()
+        self.wake = asyncio.Event()
+        self.task = asyncio.create_task(self._run())
+
+    def request_reconcile(self) -> None:
+        """Проверить состав каналов сейчас, не дожидаясь таймера (из любого потока)."""
+        if self.loop is not None and self.wake is not None:
+            self.loop.call_soon_threadsafe(self.wake.set)
+
+    def desired_channels(self) -> List[str]:
+        return [self.ctx.CURRENT_CHANNEL] if self.ctx.CURRENT_CHANNEL else []
+
+    # ==================================================
+    # JOIN (выполняется в loop чата)
+    # ==================================================
+
+    async def join_channels(self, chat, channels: List[str]) -> List[str]:
+        """Заходит в каналы пачками по JOIN_BATCH. Возвращает зашедшие."""
+        joined: List[str] = []
+        for i in range(0, len(channels), JOIN_BATCH):
+            if i:
+                await asyncio.sleep(JOIN_WINDOW)
+            batch = channels[i:i + JOIN_BATCH]
+            try:
+                failed = await chat.join_room(batch) or []
+            except Exception as e:
+                print("⚠ Ошибка входа в каналы:", e)
+                continue
+            for name in failed:
+                print(f"⚠ Не удалось зайти в #{name}")
+            joined.extend(c for c in batch if c not in failed)
+        self.joined.update(joined)
+        return joined
+
+    async def on_ready(self, chat) -> List[str]:
+        """Вызывается из READY: заходим во все нужные каналы заново."""
+        self.chat_loop = asyncio.get_running_loop()
+        self.joined.clear()
+        joined = await self.join_channels(chat, self.desired_channels())
+
+        if self.down_since is not None:
+            self.last_outage = monotonic() - self.down_since
+            self.down_since = None
+            print(f"🔌 Twitch-чат восстановлен за {self.last_outage:.1f} с")
+        self.attempt = 0
+        self.unhealthy = 0
+        return joined
+
+    async def _reconcile(self, chat) -> None:
+        desired = set(self.desired_channels())
+        missing = sorted(desired - self.joined)
+        extra = sorted(self.joined - desired)
+        if not (missing or extra) or self.chat_loop is None:
+            return
+
+        async def apply():
+            if extra:
+                try:
+                    await chat.leave_room(extra)
+                except Exception as e:
+                    print("⚠ Ошибка выхода из каналов:", e)
+                self.joined.difference_update(extra)
+            if missing:
+                for name in await self.join_channels(chat, missing):
+                    print(f"🎮 Зашёл в #{name}")
+
+        # join_room работает с websocket чата — только в его loop
+        await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(apply(), self.chat_loop))
+
+    # ==================================================
+    # WATCHDOG
+    # ==================================================
+
+    @staticmethod
+    def _healthy(chat) -> bool:
+        try:
+            return chat.is_connected() and chat.is_ready()
+        except Exception:
+            return False
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self.wake.wait(), WATCHDOG_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+            self.wake.clear()
+
+            chat = self.ctx.chat
+            if chat is None:
+                continue
+
+            try:
+                if self._healthy(chat):
+                    self.unhealthy = 0
+                    await self._reconcile(chat)
+                    continue
+
+                self.unhealthy += 1
+                if self.down_since is None:
+                    self.down_since = monotonic()
+                    print("⚠ Twitch-чат не отвечает, жду восстановления...")
+                if self.unhealthy >= UNHEALTHY_CHECKS:
+                    await self._reconnect(chat)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print("⚠ Ошибка сторожа Twitch-чата:", e)
+
+    async def _reconnect(self, old_chat) -> None:
+        if self.attempt:
+            delay = backoff_delay(self.attempt)
+            print(f"🔁 Переподключение к Twitch через {delay:.1f} с (попытка {self.attempt + 1})")
+            await asyncio.sleep(delay)
+        self.attempt += 1
+        self.unhealthy = 0
+
+        try:
+            # stop() ждёт поток чата — не в event loop
+            await asyncio.to_thread(old_chat.stop)
+        except Exception as e:
+            print("⚠ Ошибка остановки старого Twitch-чата:", e)
+
+        try:
+            self.ctx.chat = await self.connect()
+        except Exception as e:
+            # ctx.chat остаётся старым (нездоровым) — следующая проверка повторит
+            print("❌ Не удалось переподключиться к Twitch:", e)
+            return
+
+        self.reconnects += 1
+        self.joined.clear()
+        print("🔁 Twitch-чат пересоздан, жду READY")
+
+    def stats_text(self) -> str:
+        chat = self.ctx.chat
+        status = "ok" if chat is not None and self._healthy(chat) else "нет связи"
+        return (
+            f"Twitch-чат {self.ctx.telegram_id}: {status}, каналов {len(self.joined)}, "
+            f"переподключений {self.reconnects}, последний обрыв {self.last_outage:.1f} с"
+        )
+
+
+def supervisor_for(ctx: OwnerContext) -> ChatSupervisor:
+    """Сторож чата владельца (создаётся при первом обращении)."""
+    if ctx.supervisor is None:
+        ctx.supervisor = ChatSupervisor(ctx)
+    return ctx.supervisor
+
+
+def all_supervisors() -> List[ChatSupervisor]:
+    return [ctx.supervisor for ctx in list(state.owners.values()) if ctx.supervisor is not None]
@@ -0,0 +1,154 @@
+# services/ingest.py
+import re
+from time import monotonic
+from typing import Dict, Optional
+
+from .app_state import state, ChannelState, ChatLine
+
+
+# ======================================================
+# INGEST SETTINGS
+# ======================================================
+
+USER_BUCKET_CAPACITY: float = 3.0      # сколько строк подряд можно от одного зрителя
+USER_BUCKET_REFILL: float = 1.0 / 15   # +1 строка каждые 15 секунд
+USER_BUCKETS_MAX: int = 5000           # после этого чистим заполненные вёдра
+EMOTE_RUN_MIN: int = 3                 # "KEKW KEKW KEKW" -> "KEKW ×3"
+
+# результат фильтра
+INGEST_NEW = "new"      # новая строка добавлена в историю — считаем триггер
+INGEST_FOLD = "fold"    # повтор: увеличен счётчик последней строки
+INGEST_DROP = "drop"    # отброшено
+
+_SPACES_RE = re.compile(r"\s+")
+_REPEAT_CHARS_RE = re.compile(r"(.)\1+")
+_TRAILING_RE = re.compile(r"[\s!?.,)]+$")
+
+
+def compress_emote_runs(text: str) -> str:
+    """Сворачивает подряд идущие одинаковые слова/смайлы: 'LUL LUL LUL' -> 'LUL ×3'."""
+    words = text.split()
+    if len(words) < EMOTE_RUN_MIN:
+        return text
+
+    out = []
+    i = 0
+    n = len(words)
+    while i < n:
+        j = i + 1
+        while j < n and words[j] == words[i]:
+            j += 1
+        run = j - i
+        out.append(f"{words[i]} ×{run}" if run >= EMOTE_RUN_MIN else " ".join(words[i:j]))
+        i = j
+    return " ".join(out)
+
+
+def normalize_text(text: str) -> str:
+    """Ключ для поиска почти-дубликатов: регистр, пробелы, растянутые буквы, хвостовая пунктуация."""
+    t = _SPACES_RE.sub(" ", text.lower()).strip()
+    t = _REPEAT_CHARS_RE.sub(r"\1", t)
+    return _TRAILING_RE.sub("", t)
+
+
+# ======================================================
+# TOKEN BUCKET
+# ======================================================
+
+class TokenBucket:
+    __slots__ = ("tokens", "ts")
+
+    def __init__(self, now: float):
+        self.tokens = USER_BUCKET_CAPACITY
+        self.ts = now
+
+    def take(self, now: float) -> bool:
+        self.tokens = min(
+            USER_BUCKET_CAPACITY,
+            self.tokens + (now - self.ts) * USER_BUCKET_REFILL,
+        )
+        self.ts = now
+        if self.tokens >= 1.0:
+            self.tokens -= 1.0
+            return True
+        return False
+
+
+# ======================================================
+# INGEST FILTER (per channel)
+# ======================================================
+
+class IngestFilter:
+    """
+    Фильтр перед историей чата:
+    - ограничение частоты строк от одного зрителя (token bucket);
+    - склейка одинаковых подряд строк в одну со счётчиком;
+    - сжатие повторяющихся смайлов.
+    """
+
+    __slots__ = ("channel", "buckets", "last_key", "last_line", "dropped", "folded")
+
+    def __init__(self, channel: ChannelState):
+        self.channel = channel
+        self.buckets: Dict[str, TokenBucket] = {}
+
+        # последняя строка, попавшая в историю
+        self.last_key: Optional[str] = None
+        self.last_line: Optional[ChatLine] = None
+
+        self.dropped: int = 0
+        self.folded: int = 0
+
+    def _allow_user(self, user: str, now: float) -> bool:
+        bucket = self.buckets.get(user)
+        if bucket is None:
+            if len(self.buckets) >= USER_BUCKETS_MAX:
+                self._prune(now)
+            bucket = TokenBucket(now)
+            self.buckets[user] = bucket
+        return bucket.take(now)
+
+    def _prune(self, now: float) -> None:
+        """Удаляет вёдра, которые уже успели заполниться полностью."""
+        full_after = USER_BUCKET_CAPACITY / USER_BUCKET_REFILL
+        self.buckets = {
+            u: b for u, b in self.buckets.items()
+            if now - b.ts < full_after
+        }
+
+    def process(self, user: str, text: str) -> str:
+        """
+        Пропускает строку в историю канала и возвращает действие:
+        INGEST_NEW / INGEST_FOLD / INGEST_DROP.
+        """
+        key = normalize_text(text)
+        if not key:
+            self.dropped += 1
+            return INGEST_DROP
+
+        # повтор последней строки (от кого угодно) — просто увеличиваем счётчик
+        history = self.channel.history
+        if (
+            key == self.last_key
+            and history
+            and history[-1] is self.last_line
+        ):
+            self.last_line.count += 1
+            self.folded += 1
+            return INGEST_FOLD
+
+        if not self._allow_user(user, monotonic()):
+            self.dropped += 1
+            return INGEST_DROP
+
+        self.last_key = key
+        self.last_line = self.channel.add_line(user, compress_emote_runs(text))
+        return INGEST_NEW
+
+
+def get_ingest_filter(channel: str) -> IngestFilter:
+    """Возвращает (создаёт при необходимости) фильтр истории канала."""
+    ch = state.get_channel(channel)
+    if ch.ingest is None:
+        ch.ingest = IngestFilter(ch)
+    return ch.ingest
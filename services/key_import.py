@@ -0,0 +1,111 @@
+# services/key_import.py
+"""
+Пакетный импорт DeepSeek-ключей: текст или файл со множеством ключей.
+
+1) ключи выделяются из текста и дедуплицируются (в пакете и с deepseek_keys);
+2) проверяются параллельно — не больше KEY_IMPORT_CONCURRENCY запросов сразу,
+   каждый в отдельном потоке (SDK синхронный);
+3) рабочие и упёршиеся в лимит добавляются в БД одной транзакцией;
+4) админ получает сводку.
+"""
+import asyncio
+import re
+from typing import Dict, List, Optional
+
+from .ai_service import probe_key
+from .repo_cache import repo_cache
+
+
+KEY_IMPORT_CONCURRENCY: int = 8
+KEY_IMPORT_MAX: int = 500              # больше за раз не проверяем
+KEY_MIN_LENGTH: int = 20
+
+_SPLIT = re.compile(r"[\s,;]+")
+
+# исходы проверки
+KEY_VALID = "ok"
+KEY_RATE_LIMITED = "429"
+KEY_INVALID = "401"
+KEY_UNCHECKED = "error"
+
+
+def parse_keys(text: str) -> List[str]:
+    """Ключи из вставленного текста / файла: без кавычек, дублей и мусора."""
+    keys: List[str] = []
+    seen = set()
+    for token in _SPLIT.split(text):
+        token = token.strip("'\"`")
+        if len(token) < KEY_MIN_LENGTH or token in seen:
+            continue
+        seen.add(token)
+        keys.append(token)
+    return keys
+
+
+async def validate_keys(
+    keys: List[str],
+    owner_id: Optional[int] = None,
+    concurrency: int = KEY_IMPORT_CONCURRENCY,
+) -> Dict[str, str]:
+    """
+    key -> исход проверки; одновременно не больше concurrency запросов.
+    Токены проверок идут в бюджет owner_id.
+    """
+    sem = asyncio.Semaphore(concurrency)
+
+    async def check(key: str) -> str:
+        async with sem:
+            try:
+                return await asyncio.to_thread(probe_key, key, owner_id)
+            except Exception as e:
+                print(f"⚠ Ошибка проверки ключа {key[:12]}...:", e)
+                return KEY_UNCHECKED
+
+    results = await asyncio.gather(*(check(k) for k in keys))
+    return dict(zip(keys, results))
+
+
+async def import_keys(text: str, owner_telegram_id: int) -> str:
+    """Полный цикл импорта. Возвращает сводку для Telegram."""
+    keys = parse_keys(text)
+    if not keys:
+        return "❌ Не нашёл ни одного ключа."
+
+    existing = await repo_cache.owner_key_set(owner_telegram_id)
+    new_keys = [k for k in keys if k not in existing]
+    duplicates = len(keys) - len(new_keys)
+
+    skipped = 0
+    if len(new_keys) > KEY_IMPORT_MAX:
+        skipped = len(new_keys) - KEY_IMPORT_MAX
+        new_keys = new_keys[:KEY_IMPORT_MAX]
+
+    results = await validate_keys(new_keys, owner_telegram_id)
+
+    # 429 — ключ рабочий, просто сейчас в лимите
+    accepted = [k for k in new_keys if results[k] in (KEY_VALID, KEY_RATE_LIMITED)]
+    added = await repo_cache.add_keys(owner_telegram_id, accepted)
+
+    def count(kind: str) -> int:
+        return sum(1 for r in results.values() if r == kind)
+
+    lines = [
+        "📥 Импорт ключей:",
+        f"найдено {len(keys)}, уже были {duplicates}",
+        f"✅ рабочих: {count(KEY_VALID)}",
+        f"⏳ в лимите (429): {count(KEY_RATE_LIMITED)}",
+        f"❌ невалидных: {count(KEY_INVALID)}",
+        f"❔ не удалось проверить: {count(KEY_UNCHECKED)}",
+        f"➕ добавлено в БД: {added}",
+    ]
+    if skipped:
+        lines.append(f"⚠ пропущено сверх лимита {KEY_IMPORT_MAX}: {skipped}")
+
+    bad = [k for k in new_keys if results[k] in (KEY_INVALID, KEY_UNCHECKED)]
+    if bad:
+        lines.append("")
+        lines.append("Не добавлены:")
+        lines.extend(f"  {k[:12]}...{k[-4:]} ({results[k]})" for k in bad[:20])
+        if len(bad) > 20:
+            lines.append(f"  ... и ещё {len(bad) - 20}")
+    return "\n".join(lines)
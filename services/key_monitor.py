@@ -0,0 +1,75 @@
+# services/key_monitor.py
+"""
+Фоновая проверка здоровья DeepSeek-ключей.
+
+Ключи, которые давно не использовались, проверяются минимальным запросом
+(один токен). Проверки растянуты по времени: за KEY_PROBE_PERIOD каждый
+ключ проверяется не больше одного раза, между проверками — пауза с разбросом,
+так что пачек запросов нет даже при сотнях ключей.
+
+Исход пишется туда же, куда и исходы генерации: статистика ключа
+(в памяти + пакетно в deepseek_keys) и автоматы ключ×модель.
+Генерация обходит ключи с учётом этого: невалидные пропускает,
+недавно получившие 429 пробует последними.
+
+Невалидные ключи остаются в списке владельца (в конце) и тоже попадают
+в обход — раз в KEY_INVALID_REPROBE. Ошибочно помеченный ключ
+(например, после временного 401 у провайдера) так возвращается в работу.
+"""
+import asyncio
+import random
+
+from .ai_service import check_key
+from .app_state import state
+from .key_stats import key_idle_seconds, key_is_invalid
+from .model_chain import reset_key
+
+
+KEY_PROBE_IDLE: float = 5 * 60          # проверяем ключи, простаивающие дольше
+KEY_PROBE_PERIOD: float = 10 * 60       # за это время обходим все ключи
+KEY_PROBE_MIN_GAP: float = 3.0          # минимум между двумя проверками, сек
+KEY_INVALID_REPROBE: float = 60 * 60    # невалидные — раз в час (вдруг ожили)
+
+
+def probe_due(key: str) -> bool:
+    idle = key_idle_seconds(key)
+    if key_is_invalid(key):
+        return idle >= KEY_INVALID_REPROBE
+    return idle >= KEY_PROBE_IDLE
+
+
+async def key_health_monitor():
+    """Фоновая задача: проверки простаивающих ключей, по одной."""
+    while True:
+        # ключи всех владельцев, включая невалидные: у каждого ключа свой лимит,
+        # пулы не смешиваются
+        keys = state.all_keys()
+        if not keys:
+            await asyncio.sleep(KEY_PROBE_PERIOD / 10)
+            continue
+
+        gap = max(KEY_PROBE_MIN_GAP, KEY_PROBE_PERIOD / len(keys))
+        for key in keys:
+            await asyncio.sleep(gap * random.uniform(0.75, 1.25))
+
+            # ключ могли удалить из панели, пока шёл обход
+            if key not in state.all_keys() or not probe_due(key):
+                continue
+
+            was_invalid = key_is_invalid(key)
+            # токены проверки — в бюджет владельца ключа
+            owner_id = next(
+                (c.telegram_id for c in state.owners.values() if key in c.DEEPSEEK_KEYS), None
+            )
+            try:
+                kind = await asyncio.to_thread(check_key, key, owner_id)
+            except Exception as e:
+                print(f"⚠ Ошибка проверки ключа {key[:12]}...:", e)
+                continue
+
+            if kind == "401" and not was_invalid:
+                print(f"🩺 Ключ {key[:12]}... невалиден — исключён из генерации")
+            elif kind == "ok" and was_invalid:
+                # 401 разомкнул все пары ключа — замыкаем их сразу, не дожидаясь пауз
+                reset_key(key)
+                print(f"🩺 Ключ {key[:12]}... снова работает")
@@ -0,0 +1,233 @@
+# services/key_stats.py
+"""
+Учёт здоровья и расхода DeepSeek-ключей.
+
+Каждый запрос к модели отмечается здесь (исход, задержка, 429, токены).
+Приращения копятся в памяти и пачкой пишутся в deepseek_keys
+фоновой задачей, так что горячий путь не трогает БД.
+"""
+import asyncio
+import threading
+from datetime import datetime, timezone
+from time import monotonic
+from typing import Dict, List, Optional
+
+from database.repository import load_key_health, save_key_stats
+
+
+KEY_STATS_FLUSH_INTERVAL: float = 30.0   # сек между пакетными записями
+LATENCY_ALPHA: float = 0.2
+KEY_COOLDOWN_429: float = 60.0           # сек после 429, когда ключ пробуем последним
+
+# ранги ключей для порядка обхода при генерации
+KEY_RANK_OK = 0
+KEY_RANK_COOLING = 1
+KEY_RANK_INVALID = 2
+
+
+def _utc_now() -> str:
+    """Формат как у CURRENT_TIMESTAMP в SQLite."""
+    return datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
+
+
+class KeyStats:
+    __slots__ = (
+        "requests", "failures", "rate_limited", "prompt_tokens",
+        "completion_tokens", "avg_latency_ms", "last_used_at",
+        "last_failed_at", "is_valid", "session_requests", "session_started",
+        "d_requests", "d_failures", "d_rate_limited", "d_prompt", "d_completion",
+        "dirty", "last_activity", "last_kind",
+    )
+
+    def __init__(self, persisted: Optional[Dict] = None):
+        p = persisted or {}
+        # накопленные итоги (БД + текущая сессия)
+        self.requests: int = p.get("requests", 0)
+        self.failures: int = p.get("failures", 0)
+        self.rate_limited: int = p.get("rate_limited", 0)
+        self.prompt_tokens: int = p.get("prompt_tokens", 0)
+        self.completion_tokens: int = p.get("completion_tokens", 0)
+        self.avg_latency_ms: Optional[float] = p.get("avg_latency_ms")
+        self.last_used_at: Optional[str] = p.get("last_used_at")
+        self.last_failed_at: Optional[str] = p.get("last_failed_at")
+        self.is_valid: bool = p.get("is_valid", True)
+
+        # для расчёта пропускной способности в этой сессии
+        self.session_requests: int = 0
+        self.session_started: float = monotonic()
+
+        # ещё не записанные в БД приращения
+        self.d_requests = self.d_failures = self.d_rate_limited = 0
+        self.d_prompt = self.d_completion = 0
+        self.dirty: bool = False
+
+        # последний запрос (генерация или проверка) — monotonic и исход
+        self.last_activity: Optional[float] = None
+        self.last_kind: Optional[str] = None
+
+    def health(self) -> str:
+        if not self.is_valid:
+            return "❌"
+        if self.requests and self.failures / self.requests > 0.5:
+            return "⚠"
+        return "✅"
+
+
+_stats: Dict[str, KeyStats] = {}
+_lock = threading.Lock()
+
+
+def _get(key: str) -> KeyStats:
+    st = _stats.get(key)
+    if st is None:
+        st = KeyStats()
+        _stats[key] = st
+    return st
+
+
+def load_key_stats(owner_telegram_id: int) -> None:
+    """Подтягивает сохранённую статистику ключей владельца (без API-запросов)."""
+    health = load_key_health(owner_telegram_id)
+    with _lock:
+        for key, persisted in health.items():
+            if key not in _stats:
+                _stats[key] = KeyStats(persisted)
+
+
+def record_key_result(
+    key: str,
+    kind: str,
+    latency: float,
+    prompt_tokens: int = 0,
+    completion_tokens: int = 0,
+) -> None:
+    """Отмечает исход запроса: kind = "ok" / "429" / "401" / "error"."""
+    now = _utc_now()
+    with _lock:
+        st = _get(key)
+        st.requests += 1
+        st.d_requests += 1
+        st.session_requests += 1
+        st.last_used_at = now
+        st.last_activity = monotonic()
+        st.last_kind = kind
+
+        ms = latency * 1000.0
+        if st.avg_latency_ms is None:
+            st.avg_latency_ms = ms
+        else:
+            st.avg_latency_ms += LATENCY_ALPHA * (ms - st.avg_latency_ms)
+
+        if kind == "ok":
+            # ключ снова отвечает (например, после пополнения баланса)
+            st.is_valid = True
+            st.prompt_tokens += prompt_tokens
+            st.completion_tokens += completion_tokens
+            st.d_prompt += prompt_tokens
+            st.d_completion += completion_tokens
+        else:
+            st.failures += 1
+            st.d_failures += 1
+            st.last_failed_at = now
+            if kind == "429":
+                st.rate_limited += 1
+                st.d_rate_limited += 1
+            elif kind == "401":
+                st.is_valid = False
+
+        st.dirty = True
+
+
+def flush_key_stats() -> int:
+    """
+    Пишет накопленные приращения в БД одной пачкой. Возвращает число ключей.
+    Приращения вычитаются только после успешной записи: при ошибке БД
+    они остаются в памяти и уйдут следующей пачкой.
+    """
+    rows: List[tuple] = []
+    with _lock:
+        for key, st in _stats.items():
+            if not st.dirty:
+                continue
+            rows.append((
+                st.d_requests, st.d_failures, st.d_rate_limited,
+                st.d_prompt, st.d_completion,
+                st.avg_latency_ms, st.last_used_at, st.last_failed_at,
+                1 if st.is_valid else 0,
+                key,
+            ))
+            # исходы, пришедшие во время записи, снова поднимут флаг
+            st.dirty = False
+
+    if not save_key_stats(rows):
+        with _lock:
+            for row in rows:
+                _stats[row[-1]].dirty = True
+        return 0
+
+    with _lock:
+        for row in rows:
+            st = _stats[row[-1]]
+            st.d_requests -= row[0]
+            st.d_failures -= row[1]
+            st.d_rate_limited -= row[2]
+            st.d_prompt -= row[3]
+            st.d_completion -= row[4]
+    return len(rows)
+
+
+async def key_stats_flusher():
+    """Фоновая задача: периодически сбрасывает статистику ключей в БД."""
+    while True:
+        await asyncio.sleep(KEY_STATS_FLUSH_INTERVAL)
+        try:
+            await asyncio.to_thread(flush_key_stats)
+        except Exception as e:
+            print("⚠ Ошибка записи статистики ключей:", e)
+
+
+def key_stats_line(key: str) -> str:
+    """Строка для панели «Наши ключи» — только из памяти, без запросов к API."""
+    with _lock:
+        st = _stats.get(key)
+        if st is None:
+            return "нет данных"
+
+        hours = max((monotonic() - st.session_started) / 3600.0, 1 / 60)
+        latency = f"{st.avg_latency_ms / 1000:.1f} с" if st.avg_latency_ms else "—"
+        tokens = st.prompt_tokens + st.completion_tokens
+        return (
+            f"{st.health()} запросов {st.requests} "
+            f"(~{st.session_requests / hours:.0f}/ч), "
+            f"ошибок {st.failures}, 429: {st.rate_limited}, "
+            f"~{latency}, токенов {tokens}"
+        )
+
+
+def key_is_invalid(key: str) -> bool:
+    st = _stats.get(key)
+    return st is not None and not st.is_valid
+
+
+def key_rank(key: str) -> int:
+    """0 — ключ в порядке, 1 — недавно получил 429, 2 — невалиден."""
+    st = _stats.get(key)
+    if st is None:
+        return KEY_RANK_OK
+    if not st.is_valid:
+        return KEY_RANK_INVALID
+    if (
+        st.last_kind == "429"
+        and st.last_activity is not None
+        and monotonic() - st.last_activity < KEY_COOLDOWN_429
+    ):
+        return KEY_RANK_COOLING
+    return KEY_RANK_OK
+
+
+def key_idle_seconds(key: str) -> float:
+    """Сколько секунд ключ не использовался (inf — ни разу в этой сессии)."""
+    st = _stats.get(key)
+    if st is None or st.last_activity is None:
+        return float("inf")
+    return monotonic() - st.last_activity
@@ -0,0 +1,220 @@
+# services/model_chain.py
+"""
+Цепочка моделей с автоматами отключения (circuit breaker).
+
+Для каждой пары ключ×модель держим свой автомат: после нескольких
+ошибок подряд пара «размыкается» и пропускается без сетевого запроса,
+а по истечении паузы пропускается один пробный запрос (half-open).
+Порядок моделей определяется их задержкой и долей ошибок.
+
+Автоматы и статистику трогают потоки генерации (asyncio.to_thread),
+поэтому переходы состояний идут под общей блокировкой.
+"""
+import threading
+from time import monotonic
+from typing import Dict, List, Tuple
+
+from .app_state import state
+
+
+# ======================================================
+# SETTINGS
+# ======================================================
+
+DEFAULT_MODELS: List[str] = ["deepseek/deepseek-r1:free"]
+
+BREAKER_FAILURES: int = 3          # ошибок подряд до размыкания
+BREAKER_RESET: float = 30.0        # пауза до пробного запроса, сек
+BREAKER_RESET_MAX: float = 600.0   # максимум паузы при повторных неудачах
+
+STATS_ALPHA: float = 0.2           # вес нового замера в скользящих средних
+STATS_MIN_CALLS: int = 3           # до этого модель не обгоняет модели выше в config
+
+BREAKER_CLOSED = "closed"
+BREAKER_OPEN = "open"
+BREAKER_HALF_OPEN = "half_open"
+
+
+def parse_models(value: str) -> List[str]:
+    """'a, b\\nc' -> ['a', 'b', 'c'] без дублей, с сохранением порядка."""
+    models: List[str] = []
+    for part in value.replace("\n", ",").split(","):
+        name = part.strip()
+        if name and name not in models:
+            models.append(name)
+    return models
+
+
+# ======================================================
+# CIRCUIT BREAKER
+# ======================================================
+
+# один на все автоматы и статистику: операции короткие, без сети
+_lock = threading.Lock()
+
+
+class CircuitBreaker:
+    __slots__ = ("state", "failures", "opened_at", "reset_after", "probing")
+
+    def __init__(self):
+        self.state: str = BREAKER_CLOSED
+        self.failures: int = 0
+        self.opened_at: float = 0.0
+        self.reset_after: float = BREAKER_RESET
+        self.probing: bool = False
+
+    def allow(self) -> bool:
+        """Можно ли сейчас отправлять запрос через эту пару ключ×модель."""
+        with _lock:
+            return self._allow()
+
+    def _allow(self) -> bool:
+        if self.state == BREAKER_CLOSED:
+            return True
+
+        if self.state == BREAKER_OPEN:
+            if monotonic() - self.opened_at < self.reset_after:
+                return False
+            self.state = BREAKER_HALF_OPEN
+            self.probing = False
+
+        # half-open: пропускаем только один пробный запрос
+        if self.probing:
+            return False
+        self.probing = True
+        return True
+
+    def record_success(self) -> None:
+        with _lock:
+            self.state = BREAKER_CLOSED
+            self.failures = 0
+            self.reset_after = BREAKER_RESET
+            self.probing = False
+
+    def record_failure(self) -> None:
+        with _lock:
+            self.failures += 1
+            if self.state == BREAKER_HALF_OPEN:
+                # проба не прошла — ждём дольше
+                self.reset_after = min(self.reset_after * 2, BREAKER_RESET_MAX)
+                self._open()
+            elif self.failures >= BREAKER_FAILURES:
+                self._open()
+
+    def trip(self) -> None:
+        """Принудительно размыкает автомат (например, ключ невалиден)."""
+        with _lock:
+            self._open()
+
+    def _open(self) -> None:
+        self.state = BREAKER_OPEN
+        self.opened_at = monotonic()
+        self.probing = False
+
+
+# ======================================================
+# MODEL STATS
+# ======================================================
+
+class ModelStats:
+    __slots__ = ("calls", "errors", "latency", "error_rate")
+
+    def __init__(self):
+        self.calls: int = 0
+        self.errors: int = 0
+        self.latency: float = 0.0      # скользящее среднее, сек
+        self.error_rate: float = 0.0   # скользящее среднее, 0..1
+
+    def record(self, latency: float, ok: bool) -> None:
+        with _lock:
+            self._record(latency, ok)
+
+    def _record(self, latency: float, ok: bool) -> None:
+        self.calls += 1
+        if not ok:
+            self.errors += 1
+        if self.calls == 1:
+            self.latency = latency
+            self.error_rate = 0.0 if ok else 1.0
+            return
+        self.latency += STATS_ALPHA * (latency - self.latency)
+        self.error_rate += STATS_ALPHA * ((0.0 if ok else 1.0) - self.error_rate)
+
+    def sampled(self) -> bool:
+        return self.calls >= STATS_MIN_CALLS
+
+    def score(self) -> float:
+        """Чем меньше, тем лучше: задержка, штрафуемая долей ошибок."""
+        return self.latency * (1.0 + 5.0 * self.error_rate)
+
+
+# ======================================================
+# REGISTRY
+# ======================================================
+
+_breakers: Dict[Tuple[str, str], CircuitBreaker] = {}
+_model_stats: Dict[str, ModelStats] = {}
+
+
+def get_breaker(key: str, model: str) -> CircuitBreaker:
+    breaker = _breakers.get((key, model))
+    if breaker is None:
+        # setdefault: два потока не получат разные автоматы для одной пары
+        breaker = _breakers.setdefault((key, model), CircuitBreaker())
+    return breaker
+
+
+def trip_key(key: str) -> None:
+    """Размыкает все пары с этим ключом (401 — ключ невалиден для любых моделей)."""
+    for model in state.AI_MODELS:
+        get_breaker(key, model).trip()
+
+
+def reset_key(key: str) -> None:
+    """Замыкает все пары с этим ключом (ключ снова валиден)."""
+    for model in state.AI_MODELS:
+        get_breaker(key, model).record_success()
+
+
+def open_breakers_count() -> int:
+    """Сколько пар ключ×модель сейчас не в замкнутом состоянии."""
+    return sum(1 for b in list(_breakers.values()) if b.state != BREAKER_CLOSED)
+
+
+def get_model_stats(model: str) -> ModelStats:
+    stats = _model_stats.get(model)
+    if stats is None:
+        stats = _model_stats.setdefault(model, ModelStats())
+    return stats
+
+
+def ordered_models() -> List[str]:
+    """
+    Модели по возрастанию score; при равенстве — в порядке из config.
+    Модели без STATS_MIN_CALLS замеров получают худший score среди
+    измеренных: непроверенный запасной не обгоняет основную модель,
+    а пока не измерена ни одна — порядок как в config.
+    """
+    models = state.AI_MODELS or DEFAULT_MODELS
+    with _lock:
+        scores = {
+            m: s.score() for m in models
+            for s in (get_model_stats(m),) if s.sampled()
+        }
+    worst = max(scores.values(), default=0.0)
+    return sorted(
+        models,
+        key=lambda m: (scores.get(m, worst), models.index(m)),
+    )
+
+
+def models_stats_text() -> str:
+    """Короткая сводка по моделям для логов / Telegram."""
+    lines = []
+    for model in ordered_models():
+        s = get_model_stats(model)
+        lines.append(
+            f"{model}: {s.calls} запр., ошибок {s.errors}, "
+            f"~{s.latency:.1f} с"
+        )
+    return "\n".join(lines)
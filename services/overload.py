@@ -0,0 +1,141 @@
+# services/overload.py
+import math
+from time import monotonic
+from typing import Dict, Optional
+
+from .app_state import state
+
+
+# ======================================================
+# OVERLOAD SETTINGS
+# ======================================================
+# Скорость считается как экспоненциальное скользящее среднее
+# (сообщений в секунду), поэтому стоимость учёта одного сообщения
+# постоянна и не зависит от нагрузки.
+
+OVERLOAD_ENTER_RATE: float = 4.0    # сообщ./сек — включить режим перегрузки
+OVERLOAD_EXIT_RATE: float = 1.5     # сообщ./сек — выключить (гистерезис)
+OVERLOAD_WINDOW: float = 10.0       # постоянная времени сглаживания, сек
+OVERLOAD_MIN_HOLD: float = 20.0     # минимум секунд в перегрузке перед выходом
+OVERLOAD_SAMPLE_EVERY: int = 5      # в перегрузке в историю берём каждое N-е
+OVERLOAD_SUMMARY_INTERVAL: float = 15.0  # период сводок в Telegram, сек
+
+
+def apply_overload_config(cfg: Dict[str, str]) -> None:
+    """
+    Переопределяет пороги перегрузки значениями из таблицы config
+    (overload_enter_rate, overload_exit_rate, overload_sample_every).
+    """
+    global OVERLOAD_ENTER_RATE, OVERLOAD_EXIT_RATE, OVERLOAD_SAMPLE_EVERY
+    try:
+        if cfg.get("overload_enter_rate"):
+            OVERLOAD_ENTER_RATE = float(cfg["overload_enter_rate"])
+        if cfg.get("overload_exit_rate"):
+            OVERLOAD_EXIT_RATE = float(cfg["overload_exit_rate"])
+        if cfg.get("overload_sample_every"):
+            OVERLOAD_SAMPLE_EVERY = max(1, int(cfg["overload_sample_every"]))
+    except ValueError as e:
+        print("⚠ Неверные настройки перегрузки в config:", e)
+
+    if OVERLOAD_EXIT_RATE >= OVERLOAD_ENTER_RATE:
+        OVERLOAD_EXIT_RATE = OVERLOAD_ENTER_RATE / 2
+
+
+# ======================================================
+# CHANNEL LOAD
+# ======================================================
+
+class ChannelLoad:
+    """
+    Учёт нагрузки одного канала: сглаженная скорость сообщений,
+    флаг перегрузки с гистерезисом и счётчики для сводок.
+    """
+
+    __slots__ = (
+        "channel", "rate", "last_ts", "overloaded", "overloaded_since",
+        "pending_total", "pending_sampled", "last_summary_ts", "_sample_counter",
+    )
+
+    def __init__(self, channel: str):
+        self.channel = channel
+        self.rate: float = 0.0
+        self.last_ts: Optional[float] = None
+
+        self.overloaded: bool = False
+        self.overloaded_since: float = 0.0
+
+        # счётчики для сводки в Telegram
+        self.pending_total: int = 0
+        self.pending_sampled: int = 0
+        self.last_summary_ts: float = 0.0
+        self._sample_counter: int = 0
+
+    def register(self) -> bool:
+        """
+        Учитывает новое сообщение и возвращает True,
+        если канал сейчас в режиме перегрузки.
+        """
+        now = monotonic()
+        if self.last_ts is None:
+            self.rate = 1.0 / OVERLOAD_WINDOW
+        else:
+            dt = max(0.0, now - self.last_ts)
+            self.rate = self.rate * math.exp(-dt / OVERLOAD_WINDOW) + 1.0 / OVERLOAD_WINDOW
+        self.last_ts = now
+
+        if not self.overloaded and self.rate >= OVERLOAD_ENTER_RATE:
+            self.overloaded = True
+            self.overloaded_since = now
+            self.last_summary_ts = now
+            self._sample_counter = 0
+            print(f"🌊 #{self.channel}: режим перегрузки ({self.rate:.1f} сообщ./сек)")
+        elif (
+            self.overloaded
+            and self.rate <= OVERLOAD_EXIT_RATE
+            and now - self.overloaded_since >= OVERLOAD_MIN_HOLD
+        ):
+            self.overloaded = False
+            print(f"✅ #{self.channel}: нагрузка спала ({self.rate:.1f} сообщ./сек)")
+
+        return self.overloaded
+
+    def should_sample(self) -> bool:
+        """В перегрузке пропускает в историю только каждое N-е сообщение."""
+        self.pending_total += 1
+        self._sample_counter += 1
+        if self._sample_counter >= OVERLOAD_SAMPLE_EVERY:
+            self._sample_counter = 0
+            self.pending_sampled += 1
+            return True
+        return False
+
+    def take_summary(self, force: bool = False) -> Optional[str]:
+        """
+        Возвращает текст сводки для Telegram, если пора её отправить
+        (или force=True и есть накопленные сообщения), иначе None.
+        """
+        if not self.pending_total:
+            return None
+
+        now = monotonic()
+        elapsed = now - self.last_summary_ts
+        if not force and elapsed < OVERLOAD_SUMMARY_INTERVAL:
+            return None
+
+        text = (
+            f"🌊 Наплыв в #{self.channel}: {self.pending_total} сообщений "
+            f"за {elapsed:.0f} с (~{self.rate:.1f}/сек), "
+            f"в историю взято {self.pending_sampled}"
+        )
+        self.pending_total = 0
+        self.pending_sampled = 0
+        self.last_summary_ts = now
+        return text
+
+
+def get_channel_load(channel: str) -> ChannelLoad:
+    """Возвращает (создаёт при необходимости) учёт нагрузки канала."""
+    ch = state.get_channel(channel)
+    if ch.load is None:
+        ch.load = ChannelLoad(ch.name)
+    return ch.load
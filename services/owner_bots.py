@@ -0,0 +1,46 @@
+# services/owner_bots.py
+"""
+Запуск Twitch-ботов владельцев.
+
+Бот владельца поднимается по /start, а после рестарта процесса — сразу
+при старте, без /start: для владельцев с сохранёнными Twitch-токенами
+и выбранным каналом (load_startup_data → resume_owners). Вход тогда идёт
+по токенам из БД, без браузера.
+
+Модуль не импортирует twitchAPI при загрузке: twitch_service
+подгружается только когда бот действительно запускается.
+"""
+import asyncio
+from typing import Iterable
+
+from .app_state import OwnerContext, state
+from .repo_cache import repo_cache
+
+
+def start_twitch_bot(ctx: OwnerContext) -> bool:
+    """Запускает init_twitch_bot в фоне, если бот ещё не поднят и не поднимается."""
+    if ctx.chat is not None or (ctx.init_task is not None and not ctx.init_task.done()):
+        return False
+    # twitchAPI подгружается только здесь, панель от него не зависит
+    from services.twitch_service import init_twitch_bot
+    ctx.init_task = asyncio.create_task(init_twitch_bot(ctx))
+    return True
+
+
+def resume_owner_bots(owner_ids: Iterable[int]) -> int:
+    """
+    После рестарта: поднимает ботов владельцев без /start.
+    Владельцы, которые больше не админы, пропускаются.
+    Возвращает число запущенных.
+    """
+    started = 0
+    for owner_id in owner_ids:
+        if not state.is_admin(owner_id):
+            continue
+        ctx = state.owner_ctx(owner_id)
+        repo_cache.load_owner(ctx)
+        if start_twitch_bot(ctx):
+            started += 1
+    if started:
+        print(f"🔁 Twitch-боты владельцев поднимаются без /start: {started}")
+    return started
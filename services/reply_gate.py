@@ -0,0 +1,217 @@
+# services/reply_gate.py
+"""
+Локальный фильтр «стоит ли отвечать».
+
+Перед каждым запросом к модели оцениваем историю чата эвристиками
+(смайлы, команды, ссылки, слишком короткие строки) и, если загружена,
+маленькой наивной байесовской моделью. Всё считается локально,
+без сети, за микросекунды.
+
+Обучение модели на размеченном логе чата (JSONL: {"text": ..., "reply": true/false}):
+    python -m services.reply_gate train chat_log.jsonl reply_gate.json
+"""
+import json
+import math
+import re
+import sys
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from .app_state import ChatLine, DECORATIONS
+
+
+# ======================================================
+# SETTINGS
+# ======================================================
+
+GATE_MIN_SCORE: float = 1.5        # сколько «содержательных» строк нужно для ответа
+GATE_MODEL_PATH: str = "reply_gate.json"
+
+_LINK_RE = re.compile(r"(https?://|www\.)\S+", re.IGNORECASE)
+_WORD_RE = re.compile(r"[a-zа-яё]{3,}", re.IGNORECASE)
+_TOKEN_RE = re.compile(r"\S+")
+# CamelCase-смайлы Twitch: KEKW, PogChamp, BibleThump
+_EMOTE_RE = re.compile(r"^(?:[A-Z][A-Za-z0-9]*[A-Z][A-Za-z0-9]*|[A-Z]{3,}|\W+)$")
+_DECORATIONS = frozenset(DECORATIONS)
+
+
+# ======================================================
+# FEATURES / HEURISTICS
+# ======================================================
+
+def line_tokens(text: str) -> List[str]:
+    """Токены для модели: слова в нижнем регистре + служебные признаки."""
+    tokens: List[str] = []
+    if text.startswith("!"):
+        tokens.append("<cmd>")
+    for tok in _TOKEN_RE.findall(text):
+        if _LINK_RE.match(tok):
+            tokens.append("<link>")
+        elif _EMOTE_RE.match(tok) or tok in _DECORATIONS:
+            tokens.append("<emote>")
+        else:
+            tokens.append(tok.lower())
+    return tokens
+
+
+def line_score(text: str) -> float:
+    """
+    Вес строки для эвристики:
+    команды и ссылки — 0, чистые смайлы — 0,
+    строка со словами — от 0.5 до 1 в зависимости от длины.
+    """
+    text = _LINK_RE.sub(" ", text).strip()
+    if not text or text.startswith("!"):
+        return 0.0
+
+    words = [
+        w for w in _TOKEN_RE.findall(text)
+        if not _EMOTE_RE.match(w) and w not in _DECORATIONS
+    ]
+    letters = sum(len(m) for w in words for m in _WORD_RE.findall(w))
+    if letters < 3:
+        return 0.0
+    return 1.0 if letters >= 12 else 0.5
+
+
+# ======================================================
+# TINY CLASSIFIER (multinomial naive Bayes)
+# ======================================================
+
+class ReplyClassifier:
+    """Наивный Байес по токенам строк истории: класс 1 — стоит отвечать."""
+
+    def __init__(self):
+        self.log_prior: List[float] = [0.0, 0.0]
+        self.log_prob: List[Dict[str, float]] = [{}, {}]
+        self.log_unknown: List[float] = [0.0, 0.0]
+
+    def fit(self, samples: Iterable[Tuple[str, bool]]) -> "ReplyClassifier":
+        counts = [Counter(), Counter()]
+        docs = [0, 0]
+        for text, label in samples:
+            y = 1 if label else 0
+            docs[y] += 1
+            counts[y].update(line_tokens(text))
+
+        vocab = set(counts[0]) | set(counts[1])
+        total_docs = max(1, docs[0] + docs[1])
+        for y in (0, 1):
+            total = sum(counts[y].values()) + len(vocab) + 1
+            self.log_prior[y] = math.log((docs[y] + 1) / (total_docs + 2))
+            self.log_prob[y] = {
+                tok: math.log((counts[y][tok] + 1) / total) for tok in vocab
+            }
+            self.log_unknown[y] = math.log(1 / total)
+        return self
+
+    def predict_proba(self, text: str) -> float:
+        """Вероятность того, что на такую историю стоит отвечать."""
+        logp = list(self.log_prior)
+        for tok in line_tokens(text):
+            for y in (0, 1):
+                logp[y] += self.log_prob[y].get(tok, self.log_unknown[y])
+        m = max(logp)
+        p0 = math.exp(logp[0] - m)
+        p1 = math.exp(logp[1] - m)
+        return p1 / (p0 + p1)
+
+    def save(self, path: str) -> None:
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(
+                {
+                    "log_prior": self.log_prior,
+                    "log_prob": self.log_prob,
+                    "log_unknown": self.log_unknown,
+                },
+                f,
+                ensure_ascii=False,
+            )
+
+    @classmethod
+    def load(cls, path: str) -> "ReplyClassifier":
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+        model = cls()
+        model.log_prior = data["log_prior"]
+        model.log_prob = data["log_prob"]
+        model.log_unknown = data["log_unknown"]
+        return model
+
+
+# ======================================================
+# GATE
+# ======================================================
+
+class ReplyGate:
+    """Решает, стоит ли тратить запрос к модели, и считает пропуски."""
+
+    def __init__(self):
+        self.model: Optional[ReplyClassifier] = None
+        self.checked: int = 0
+        self.skipped: int = 0
+
+    def load_model(self, path: str = GATE_MODEL_PATH) -> bool:
+        """Загружает обученную модель, если файл есть."""
+        try:
+            self.model = ReplyClassifier.load(path)
+            print(f"🧮 Модель фильтра ответов загружена: {path}")
+            return True
+        except FileNotFoundError:
+            self.model = None
+        except Exception as e:
+            print("⚠ Не удалось загрузить модель фильтра ответов:", e)
+            self.model = None
+        return False
+
+    def should_reply(self, history: Iterable[ChatLine]) -> bool:
+        self.checked += 1
+
+        texts = [line.text for line in history]
+        ok = sum(line_score(t) for t in texts) >= GATE_MIN_SCORE
+
+        if ok and self.model is not None:
+            ok = self.model.predict_proba("\n".join(texts)) >= 0.5
+
+        if not ok:
+            self.skipped += 1
+        return ok
+
+    def skip_ratio(self) -> float:
+        return self.skipped / self.checked if self.checked else 0.0
+
+    def stats_text(self) -> str:
+        return (
+            f"фильтр ответов: пропущено {self.skipped} из {self.checked} "
+            f"({self.skip_ratio():.0%})"
+        )
+
+
+reply_gate = ReplyGate()
+
+
+# ======================================================
+# TRAINING CLI
+# ======================================================
+
+def _read_samples(path: str) -> List[Tuple[str, bool]]:
+    samples: List[Tuple[str, bool]] = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            row = json.loads(line)
+            samples.append((str(row["text"]), bool(row["reply"])))
+    return samples
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 3 or sys.argv[1] != "train":
+        print("Использование: python -m services.reply_gate train <log.jsonl> [model.json]")
+        sys.exit(1)
+
+    data = _read_samples(sys.argv[2])
+    out = sys.argv[3] if len(sys.argv) > 3 else GATE_MODEL_PATH
+    ReplyClassifier().fit(data).save(out)
+    print(f"✅ Модель обучена на {len(data)} примерах: {out}")
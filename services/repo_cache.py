@@ -0,0 +1,213 @@
+# services/repo_cache.py
+"""
+Кеш поверх database/repository: config, админы, ключи, каналы, стоп-слова.
+
+Чтение идёт из памяти. Config, админы, стоп-слова и владельцы каналов
+загружаются при старте одним проходом (load_startup_data → prime).
+Ключи и канал владельца читаются из БД один раз — при первом /start
+этого владельца, дальше панель работает без запросов.
+
+Запись — только через методы кеша: сначала БД, и только если запись
+удалась — память, так что они не расходятся. Каждое изменение раздела
+увеличивает его счётчик версии (versions). Представления панели, собранные из памяти
+(view), помнят версии своих разделов и пересобираются, только когда
+какая-то из них сдвинулась.
+"""
+import asyncio
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+
+from database.repository import (
+    add_deepseek_keys_bulk,
+    add_stop_word,
+    delete_deepseek_key_from_db,
+    delete_stop_word,
+    load_bot_state,
+    load_deepseek_keys,
+    load_owner_key_set,
+    set_bot_enabled_in_db,
+    set_current_channel_in_db,
+)
+
+from .app_state import OwnerContext, state
+from .key_stats import load_key_stats
+from .stop_words import scope_db_args, stop_word_index
+
+
+SECTIONS = ("config", "admins", "keys", "channels", "stop_words")
+
+
+class RepoCache:
+    def __init__(self):
+        self.versions: Dict[str, int] = dict.fromkeys(SECTIONS, 0)
+        # (имя, владелец) -> (версии разделов на момент сборки, значение)
+        self._views: Dict[Tuple[str, int], Tuple[Tuple[int, ...], Any]] = {}
+
+        # владельцы, чьи ключи и канал уже подняты из БД
+        self._loaded_owners: Set[int] = set()
+        # все ключи владельца, включая выключенные и невалидные (дедупликация импорта)
+        self._key_sets: Dict[int, Set[str]] = {}
+
+        self.db_reads = 0
+        self.memory_reads = 0
+        self.view_builds = 0
+        self.view_hits = 0
+
+    def _bump(self, section: str) -> None:
+        self.versions[section] += 1
+
+    def view(self, name: str, owner_id: int, sections: Tuple[str, ...], build: Callable[[], Any]) -> Any:
+        """
+        Представление для панели владельца: build() вызывается заново,
+        только если с прошлой сборки сменилась версия одного из sections.
+        """
+        stamp = tuple(self.versions[s] for s in sections)
+        cached = self._views.get((name, owner_id))
+        if cached is not None and cached[0] == stamp:
+            self.view_hits += 1
+            return cached[1]
+        self.view_builds += 1
+        value = build()
+        self._views[(name, owner_id)] = (stamp, value)
+        return value
+
+    # ==================================================
+    # STARTUP
+    # ==================================================
+
+    def prime(self, data: Dict[str, Any]) -> Dict[str, str]:
+        """Заполняет кеш из load_startup_data. Возвращает config."""
+        state.set_admins(data["admins"])
+        stop_word_index.load(data["stop_words"], data["channel_owners"])
+        for section in SECTIONS:
+            self._bump(section)
+        return data["config"]
+
+    # ==================================================
+    # OWNERS: KEYS + CHANNEL
+    # ==================================================
+
+    def load_owner(self, ctx: OwnerContext) -> None:
+        """Ключи, их статистика и канал владельца — из БД только в первый раз."""
+        owner_id = ctx.telegram_id
+        if owner_id in self._loaded_owners:
+            self.memory_reads += 1
+            return
+        self.db_reads += 1
+
+        # ключи уже отсортированы: недавно сбоившие и невалидные — в конце
+        ctx.DEEPSEEK_KEYS = load_deepseek_keys(owner_id)
+        load_key_stats(owner_id)
+
+        channel, enabled = load_bot_state(owner_id)
+        if channel:
+            state.bind_channel(ctx, channel)
+            stop_word_index.set_channel_owner(channel, owner_id)
+        ctx.BOT_ENABLED = enabled
+
+        self._loaded_owners.add(owner_id)
+        self._bump("keys")
+        self._bump("channels")
+
+    async def owner_key_set(self, owner_id: int) -> Set[str]:
+        keys = self._key_sets.get(owner_id)
+        if keys is not None:
+            self.memory_reads += 1
+            return keys
+        self.db_reads += 1
+        keys = await asyncio.to_thread(load_owner_key_set, owner_id)
+        # пока шёл запрос, ключи могли добавить — берём то, что уже в кеше
+        return self._key_sets.setdefault(owner_id, keys)
+
+    async def add_keys(self, owner_id: int, keys: List[str]) -> int:
+        """Новые ключи — в БД одной транзакцией и сразу в рабочий список."""
+        added = await asyncio.to_thread(add_deepseek_keys_bulk, keys, owner_id)
+        if not added:
+            return 0
+        ctx = state.owner_ctx(owner_id)
+        ctx.DEEPSEEK_KEYS.extend(k for k in keys if k not in ctx.DEEPSEEK_KEYS)
+        if owner_id in self._key_sets:
+            self._key_sets[owner_id].update(keys)
+        self._bump("keys")
+        return added
+
+    def delete_key(self, ctx: OwnerContext, index: int) -> Optional[str]:
+        """
+        Удаляет ключ по индексу в ctx.DEEPSEEK_KEYS. Возвращает ключ,
+        None — в БД удалить не удалось (список не тронут).
+        """
+        key = ctx.DEEPSEEK_KEYS[index]
+        if not delete_deepseek_key_from_db(key, ctx.telegram_id):
+            return None
+        ctx.DEEPSEEK_KEYS.pop(index)
+        if index < ctx.current_key_index:
+            # список сдвинулся — индекс должен указывать на тот же ключ
+            ctx.current_key_index -= 1
+        elif index == ctx.current_key_index:
+            # удалён текущий ключ: его место занимает следующий, клиент — заново
+            ctx.client = None
+            if ctx.current_key_index >= len(ctx.DEEPSEEK_KEYS):
+                ctx.current_key_index = 0
+        self._key_sets.get(ctx.telegram_id, set()).discard(key)
+        self._bump("keys")
+        return key
+
+    def set_channel(self, ctx: OwnerContext, channel: str) -> bool:
+        """
+        Новый канал владельца; бот в нём стартует выключенным.
+        Сначала БД: False — запись не удалась, память не тронута.
+        """
+        if not set_current_channel_in_db(channel, ctx.telegram_id):
+            return False
+        state.bind_channel(ctx, channel)
+        ctx.BOT_ENABLED = False
+        state.reset_owner_triggers(ctx)
+        stop_word_index.set_channel_owner(channel, ctx.telegram_id)
+        self._bump("channels")
+        return True
+
+    def set_enabled(self, ctx: OwnerContext, enabled: bool) -> bool:
+        """
+        Включает / выключает бота владельца. В памяти — всегда (это рубильник),
+        False — флаг не сохранён в БД и после рестарта вернётся прежним.
+        """
+        ctx.BOT_ENABLED = enabled
+        state.reset_owner_triggers(ctx)
+        return set_bot_enabled_in_db(ctx.telegram_id, enabled)
+
+    # ==================================================
+    # STOP WORDS
+    # ==================================================
+
+    def add_stop_word(self, scope: str, rule: str) -> Optional[bool]:
+        """
+        True — добавлено; False — правило в этой области уже есть;
+        None — в БД записать не удалось (индекс не тронут).
+        """
+        if rule in stop_word_index.rules(scope):
+            return False
+        if not add_stop_word(rule, **scope_db_args(scope)):
+            return None
+        stop_word_index.add(scope, rule)
+        self._bump("stop_words")
+        return True
+
+    def remove_stop_word(self, scope: str, rule: str) -> Optional[bool]:
+        """Как add_stop_word: False — правила нет, None — ошибка БД."""
+        if rule not in stop_word_index.rules(scope):
+            return False
+        if not delete_stop_word(rule, **scope_db_args(scope)):
+            return None
+        stop_word_index.remove(scope, rule)
+        self._bump("stop_words")
+        return True
+
+    def stats_text(self) -> str:
+        versions = ", ".join(f"{s} v{v}" for s, v in self.versions.items())
+        return (
+            f"Кеш БД: чтений из БД {self.db_reads}, из памяти {self.memory_reads} "
+            f"({versions}); панели: сборок {self.view_builds}, из кеша {self.view_hits}"
+        )
+
+
+repo_cache = RepoCache()
+
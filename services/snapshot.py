@@ -0,0 +1,192 @@
+# services/snapshot.py
+"""
+Снимки состояния для «тёплого» рестарта.
+
+Раз в SNAPSHOT_INTERVAL в файл пишется то, чего нет в БД:
+история и триггеры каналов, пороги, текущие ключи владельцев.
+Формат — JSON (только словари, списки, строки и числа): файл лежит
+в рабочем каталоге, и его чтение не должно уметь исполнять код,
+как pickle. Запись атомарная: временный файл + fsync + os.replace,
+под замком (фоновая запись и запись при остановке не пересекаются).
+Если состояние не менялось, файл не перезаписывается — только
+обновляется его mtime, чтобы снимок простаивающего бота не «устарел».
+
+При старте main() восстанавливает снимок, если он не старше
+SNAPSHOT_MAX_AGE, и сразу поднимает Twitch-ботов владельцев
+с сохранёнными токенами (owner_bots.resume_owner_bots) — бот
+отвечает с контекстом, не дожидаясь /start.
+"""
+import asyncio
+import hashlib
+import json
+import os
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+from .app_state import OwnerContext, state
+
+
+# ======================================================
+# SETTINGS
+# ======================================================
+
+SNAPSHOT_PATH: str = "runtime_state.snapshot"
+SNAPSHOT_INTERVAL: float = 60.0
+SNAPSHOT_MAX_AGE: float = 30 * 60      # старше — контекст чата уже неактуален
+SNAPSHOT_VERSION: int = 3
+
+_last_payload: Optional[str] = None
+_write_lock = threading.Lock()
+_restored_key_ids: Dict[int, str] = {}
+
+
+def _key_id(key: str) -> str:
+    # сам ключ в файл не пишем
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()[:16]
+
+
+# ======================================================
+# CAPTURE / WRITE
+# ======================================================
+
+def capture() -> Dict[str, Any]:
+    """Снимок в виде встроенных типов. Дёшево: несколько каналов по 7 строк."""
+    channels: Dict[str, Any] = {}
+    for name, ch in list(state.channels.items()):
+        if not name:
+            continue
+        channels[name] = {
+            "history": [[line.user, line.text, line.count] for line in list(ch.history)],
+            "triggers": ch.triggers,
+            "threshold": ch.threshold,
+        }
+
+    # ключи словаря в JSON — строки
+    current_keys: Dict[str, str] = {}
+    for telegram_id, ctx in list(state.owners.items()):
+        if 0 <= ctx.current_key_index < len(ctx.DEEPSEEK_KEYS):
+            current_keys[str(telegram_id)] = _key_id(ctx.DEEPSEEK_KEYS[ctx.current_key_index])
+
+    return {
+        "version": SNAPSHOT_VERSION,
+        "channels": channels,
+        "current_keys": current_keys,
+    }
+
+
+def write_snapshot(data: Dict[str, Any], path: Optional[str] = None) -> bool:
+    """Атомарная запись. False — если не изменилось или не удалось."""
+    global _last_payload
+    path = path or SNAPSHOT_PATH
+
+    payload = json.dumps(data, ensure_ascii=False, sort_keys=True)
+    with _write_lock:
+        if payload == _last_payload:
+            # состояние то же — только отмечаем, что оно актуально сейчас
+            try:
+                os.utime(path)
+            except OSError:
+                _last_payload = None
+            return False
+
+        tmp = f"{path}.tmp"
+        try:
+            with open(tmp, "w", encoding="utf-8") as f:
+                # время записи — отдельной первой строкой, чтобы не мешать сравнению payload
+                f.write(f"{time.time()!r}\n")
+                f.write(payload)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp, path)
+        except OSError as e:
+            print("⚠ Не удалось сохранить снимок состояния:", e)
+            return False
+
+        _last_payload = payload
+        return True
+
+
+async def snapshotter():
+    """Фоновая задача: периодические снимки (запись файла — в потоке)."""
+    while True:
+        await asyncio.sleep(SNAPSHOT_INTERVAL)
+        try:
+            await asyncio.to_thread(write_snapshot, capture())
+        except Exception as e:
+            print("⚠ Ошибка снимка состояния:", e)
+
+
+# ======================================================
+# RESTORE
+# ======================================================
+
+def restore_snapshot(path: Optional[str] = None) -> bool:
+    """
+    Восстанавливает каналы из снимка. True — тёплый старт.
+    Битый, чужой версии или устаревший снимок просто игнорируется.
+    """
+    global _last_payload, _restored_key_ids
+    path = path or SNAPSHOT_PATH
+
+    try:
+        with open(path, encoding="utf-8") as f:
+            saved_at = float(f.readline())
+            payload = f.read()
+        data = json.loads(payload)
+        # неизменный снимок не перезаписывается, свежесть — по mtime
+        saved_at = max(saved_at, os.path.getmtime(path))
+    except FileNotFoundError:
+        return False
+    except Exception as e:
+        print("⚠ Снимок состояния повреждён, старт с нуля:", e)
+        return False
+
+    age = time.time() - float(saved_at)
+    if not isinstance(data, dict) or data.get("version") != SNAPSHOT_VERSION:
+        print("⚠ Снимок состояния другой версии — пропускаю.")
+        return False
+    if age > SNAPSHOT_MAX_AGE:
+        print(f"ℹ Снимок состояния устарел ({age / 60:.0f} мин) — старт с нуля.")
+        return False
+
+    try:
+        channels = {
+            str(name): (
+                [(str(user), str(text), int(count)) for user, text, count in saved["history"]],
+                int(saved["triggers"]),
+                int(saved["threshold"]),
+            )
+            for name, saved in data.get("channels", {}).items()
+        }
+        key_ids = {int(k): str(v) for k, v in data.get("current_keys", {}).items()}
+    except (AttributeError, KeyError, TypeError, ValueError) as e:
+        print("⚠ Снимок состояния повреждён, старт с нуля:", e)
+        return False
+
+    restored: List[str] = []
+    for name, (history, triggers, threshold) in channels.items():
+        ch = state.get_channel(name)
+        ch.history.clear()
+        for user, text, count in history:
+            ch.add_line(user, text).count = count
+        ch.triggers = triggers
+        ch.threshold = threshold
+        restored.append(f"#{name} ({len(ch.history)})")
+
+    _restored_key_ids = key_ids
+    _last_payload = payload
+
+    print(f"♻ Тёплый старт из снимка ({age:.0f} с назад): {', '.join(restored) or 'без каналов'}")
+    return True
+
+
+def restored_key_index(ctx: OwnerContext) -> Optional[int]:
+    """Индекс ключа владельца, который был текущим до рестарта (один раз после restore)."""
+    key_id = _restored_key_ids.pop(ctx.telegram_id, None)
+    if key_id is None:
+        return None
+    for i, key in enumerate(ctx.DEEPSEEK_KEYS):
+        if _key_id(key) == key_id:
+            return i
+    return None
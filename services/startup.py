@@ -0,0 +1,56 @@
+# services/startup.py
+"""
+Замеры времени запуска по фазам.
+
+Фазы могут идти параллельно (проверка ключей одновременно с авторизацией
+Twitch), поэтому для каждой храним начало и конец относительно старта
+таймера — по ним видно и длительность, и перекрытия.
+
+startup_timer — запуск процесса (схема, БД, Telegram). Подъём
+Twitch-бота у каждого владельца свой и идёт параллельно с другими,
+поэтому его фазы пишутся в отдельный PhaseTimer владельца (ctx.init_timer).
+"""
+from contextlib import contextmanager
+from time import perf_counter
+from typing import Dict, Optional, Tuple
+
+
+class PhaseTimer:
+    def __init__(self):
+        self.t0: float = perf_counter()
+        self.phases: Dict[str, Tuple[float, Optional[float]]] = {}
+
+    @contextmanager
+    def phase(self, name: str):
+        """with timer.phase("twitch_auth"): ... — работает и внутри корутин."""
+        start = perf_counter() - self.t0
+        self.phases[name] = (start, None)
+        try:
+            yield
+        finally:
+            self.phases[name] = (start, perf_counter() - self.t0)
+
+    def mark(self, name: str) -> None:
+        """Отметка момента (например, chat_ready) без длительности."""
+        at = perf_counter() - self.t0
+        self.phases[name] = (at, at)
+
+    def elapsed(self) -> float:
+        return perf_counter() - self.t0
+
+    def report(self, title: str = "⏱ Запуск по фазам") -> str:
+        lines = [f"{title} (начало → конец, длительность):"]
+        for name, (start, end) in sorted(self.phases.items(), key=lambda kv: kv[1][0]):
+            if end is None:
+                lines.append(f"  {name:14} {start * 1000:8.0f} мс → …")
+            elif end == start:
+                lines.append(f"  {name:14} {start * 1000:8.0f} мс ●")
+            else:
+                lines.append(
+                    f"  {name:14} {start * 1000:8.0f} → {end * 1000:8.0f} мс "
+                    f"({(end - start) * 1000:.0f} мс)"
+                )
+        return "\n".join(lines)
+
+
+startup_timer = PhaseTimer()
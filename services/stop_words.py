@@ -0,0 +1,356 @@
+# services/stop_words.py
+"""
+Стоп-слова с типами правил и одним скомпилированным матчером.
+
+Запись правила (хранится как есть в stop_words.word):
+    слово        — подстрока где угодно (как раньше)
+    w:слово      — целое слово / фраза (границы слов)
+    p:стрим      — слово, начинающееся с префикса
+    re:@?стример — регулярное выражение
+
+Области: общие (stop_words), канала и владельца (scoped_stop_words).
+
+Все правила собираются в одно регулярное выражение:
+подстроки, слова и префиксы — в три префиксных дерева (trie),
+все regex-правила — в одну общую группу. Номер сработавшей группы
+(match.lastindex) указывает на вид правила; какое именно regex-правило
+сработало, уточняется отдельно и только при срабатывании — отдельная
+группа на каждое правило лишает движок быстрой проверки первого
+символа альтернатив и раздувает хвост задержки.
+Границы слов — через (?<!\w) / (?!\w), а не \b: правило вроде
+w:@streamer или w:c++ начинается / кончается не буквой.
+Правила всех областей живут в одном индексе (StopWordIndex)
+с битовыми масками каналов.
+
+Текст сообщения приходит уже в нижнем регистре — regex-правила тоже
+видят его в нижнем регистре.
+"""
+import re
+from typing import Dict, List, Optional, Pattern, Tuple
+
+
+RULE_LITERAL = "literal"
+RULE_WORD = "word"
+RULE_PREFIX = "prefix"
+RULE_REGEX = "regex"
+
+_PREFIXES = (("w:", RULE_WORD), ("p:", RULE_PREFIX), ("re:", RULE_REGEX))
+
+# обратные ссылки на номера групп не переживают объединение в один шаблон
+_BACKREF = re.compile(r"\\[1-9]|\(\?P=")
+
+
+def parse_rule(rule: str) -> Tuple[str, str]:
+    """'w:слово' -> ('word', 'слово'); без префикса — подстрока."""
+    for prefix, kind in _PREFIXES:
+        if rule.startswith(prefix):
+            return kind, rule[len(prefix):]
+    return RULE_LITERAL, rule
+
+
+def normalize_rule(text: str) -> str:
+    """Приводит ввод админа к хранимой записи (regex не трогаем)."""
+    text = text.strip()
+    kind, _ = parse_rule(text)
+    if kind == RULE_REGEX:
+        return text
+    return text.lower()
+
+
+def validate_rule(rule: str) -> Optional[str]:
+    """Текст ошибки или None, если правило корректно."""
+    kind, body = parse_rule(rule)
+    if not body.strip():
+        return "пустое правило"
+    if kind == RULE_REGEX:
+        try:
+            re.compile(body)
+        except re.error as e:
+            return f"ошибка в регулярном выражении: {e}"
+    return None
+
+
+def _trie_regex(words: List[str]) -> str:
+    """Список слов -> регулярное выражение по префиксному дереву (без групп)."""
+    trie: Dict = {}
+    for w in words:
+        node = trie
+        for ch in w:
+            node = node.setdefault(ch, {})
+        node[""] = True
+
+    def build(node: Dict) -> str:
+        alts = [re.escape(ch) + build(child) for ch, child in sorted(node.items()) if ch]
+        if not alts:
+            return ""
+        optional = "" in node
+        if len(alts) == 1 and not optional:
+            return alts[0]
+        return "(?:" + "|".join(alts) + ")" + ("?" if optional else "")
+
+    return build(trie)
+
+
+# ======================================================
+# MATCHER
+# ======================================================
+
+class StopWordMatcher:
+    """Один проход regex по тексту вместо цикла по всем правилам."""
+
+    __slots__ = ("version", "pattern", "group_lookup", "regex_group", "regex_rules",
+                 "fallback", "size")
+
+    def __init__(self, rules: List[str], version: int):
+        self.version = version
+        self.size = len(rules)
+        # группа дерева -> {совпавший текст -> правило}
+        self.group_lookup: Dict[int, Dict[str, str]] = {}
+        # общая группа regex-правил и сами правила (для уточнения при срабатывании)
+        self.regex_group: Optional[int] = None
+        self.regex_rules: List[Tuple[Pattern, str]] = []
+        # regex-правила с обратными ссылками проверяются отдельно
+        self.fallback: List[Tuple[Pattern, str]] = []
+
+        by_kind: Dict[str, Dict[str, str]] = {RULE_LITERAL: {}, RULE_WORD: {}, RULE_PREFIX: {}}
+        regexes: List[Tuple[str, str]] = []
+        for rule in rules:
+            kind, body = parse_rule(rule)
+            if not body or validate_rule(rule):
+                continue
+            if kind == RULE_REGEX:
+                if _BACKREF.search(body):
+                    self.fallback.append((re.compile(body), rule))
+                else:
+                    regexes.append((body, rule))
+            else:
+                by_kind[kind].setdefault(body, rule)
+
+        parts: List[str] = []
+        group = 0
+        for kind, wrap in (
+            (RULE_LITERAL, "({})"),
+            (RULE_WORD, r"(?<!\w)({})(?!\w)"),
+            (RULE_PREFIX, r"(?<!\w)({})"),
+        ):
+            words = by_kind[kind]
+            if not words:
+                continue
+            group += 1
+            parts.append(wrap.format(_trie_regex(list(words))))
+            self.group_lookup[group] = words
+
+        if regexes:
+            # группа последняя: вложенные группы правил не сдвигают номера деревьев,
+            # а lastindex всё равно указывает на внешнюю группу (она закрывается последней)
+            group += 1
+            parts.append("((?:" + "|".join(body for body, _ in regexes) + "))")
+            self.regex_group = group
+            self.regex_rules = [(re.compile(body), rule) for body, rule in regexes]
+
+        try:
+            self.pattern: Optional[Pattern] = re.compile("|".join(parts)) if parts else None
+        except re.error as e:
+            # например, одинаковые имена групп в разных regex-правилах
+            print("⚠ Стоп-слова: общий шаблон не собрался, regex-правила проверяются по одному:", e)
+            self.fallback.extend(self.regex_rules)
+            self.regex_group = None
+            self.regex_rules = []
+            literal_parts = parts[:len(self.group_lookup)]
+            self.pattern = re.compile("|".join(literal_parts)) if literal_parts else None
+
+    def match(self, text: str) -> Optional[str]:
+        """Первое сработавшее правило (в записи из БД) или None."""
+        if self.pattern is not None:
+            m = self.pattern.search(text)
+            if m is not None:
+                idx = m.lastindex
+                lookup = self.group_lookup.get(idx)
+                if lookup is not None:
+                    return lookup.get(m.group(idx), m.group(idx))
+                # сработала общая группа regex-правил: какое правило совпало здесь
+                start = m.start()
+                for rx, rule in self.regex_rules:
+                    if rx.match(text, start):
+                        return rule
+                return ""
+        for rx, rule in self.fallback:
+            if rx.search(text):
+                return rule
+        return None
+
+
+# ======================================================
+# SCOPES
+# ======================================================
+
+SCOPE_GLOBAL = ""
+
+
+def channel_scope(channel: str) -> str:
+    return f"#{channel}"
+
+
+def owner_scope(owner_telegram_id: int) -> str:
+    return f"@{owner_telegram_id}"
+
+
+def scope_of(row: Dict) -> str:
+    """Строка БД {word, channel, owner_telegram_id} -> ключ области."""
+    if row.get("channel"):
+        return channel_scope(row["channel"])
+    if row.get("owner_telegram_id") is not None:
+        return owner_scope(row["owner_telegram_id"])
+    return SCOPE_GLOBAL
+
+
+def scope_db_args(scope: str) -> Dict:
+    """Ключ области -> channel / owner_telegram_id для репозитория."""
+    if scope.startswith("#"):
+        return {"channel": scope[1:]}
+    if scope.startswith("@"):
+        return {"owner_telegram_id": int(scope[1:])}
+    return {}
+
+
+# ======================================================
+# INDEX
+# ======================================================
+
+class StopWordIndex:
+    """
+    Стоп-слова всех каналов и владельцев в одном общем матчере.
+
+    У каждого правила — битовая маска областей, где оно действует
+    (бит 0 — общие). У канала — маска: общие | его канал | его владелец.
+    Сообщение проверяется одним проходом общего шаблона; если сработало
+    правило чужой области (редко), проверка повторяется матчером только
+    по правилам этого канала — он собирается лениво и кешируется по маске.
+
+    Изменения из панели применяются точечно, без перечитывания БД.
+    Общий шаблон пересобирается только при появлении / исчезновении
+    правила целиком; перенос правила между областями меняет лишь маски.
+    """
+
+    def __init__(self):
+        self.masks: Dict[str, int] = {}                   # правило -> биты областей
+        self.by_scope: Dict[str, List[str]] = {}          # область -> правила (для панели)
+        self.scope_bits: Dict[str, int] = {SCOPE_GLOBAL: 1}
+        self.channel_owner: Dict[str, int] = {}
+
+        self.version = 0
+        self._matcher: Optional[StopWordMatcher] = None
+        self._channel_masks: Dict[str, int] = {}
+        self._by_mask: Dict[int, StopWordMatcher] = {}
+
+    # ---------- загрузка / изменения ----------
+
+    def load(self, rows: List[Dict], channel_owners: Optional[Dict[str, int]] = None) -> None:
+        """Полная загрузка при старте: строки БД (см. _stop_word_rows в load_startup_data)."""
+        self.masks.clear()
+        self.by_scope.clear()
+        self.scope_bits = {SCOPE_GLOBAL: 1}
+        self.channel_owner = dict(channel_owners or {})
+        for row in rows:
+            self._add(scope_of(row), row["word"])
+        self._changed(rebuild=True)
+
+    def add(self, scope: str, rule: str) -> bool:
+        """Добавляет правило в область. False — уже было."""
+        if rule in self.by_scope.get(scope, ()):
+            return False
+        is_new = rule not in self.masks
+        self._add(scope, rule)
+        self._changed(rebuild=is_new)
+        return True
+
+    def remove(self, scope: str, rule: str) -> bool:
+        rules = self.by_scope.get(scope)
+        if not rules or rule not in rules:
+            return False
+        rules.remove(rule)
+        mask = self.masks.get(rule, 0) & ~self.scope_bits[scope]
+        if mask:
+            self.masks[rule] = mask
+        else:
+            self.masks.pop(rule, None)
+        self._changed(rebuild=not mask)
+        return True
+
+    def set_channel_owner(self, channel: str, owner_telegram_id: Optional[int]) -> None:
+        if owner_telegram_id is None or self.channel_owner.get(channel) == owner_telegram_id:
+            return
+        self.channel_owner[channel] = owner_telegram_id
+        self._channel_masks.pop(channel, None)
+
+    def _add(self, scope: str, rule: str) -> None:
+        bit = self.scope_bits.get(scope)
+        if bit is None:
+            bit = self.scope_bits[scope] = 1 << len(self.scope_bits)
+            # новая область может относиться к уже посчитанным каналам
+            self._channel_masks.clear()
+        self.masks[rule] = self.masks.get(rule, 0) | bit
+        self.by_scope.setdefault(scope, []).append(rule)
+
+    def _changed(self, rebuild: bool) -> None:
+        self._by_mask.clear()
+        if rebuild:
+            self.version += 1
+
+    # ---------- чтение ----------
+
+    def rules(self, scope: str) -> List[str]:
+        return self.by_scope.get(scope, [])
+
+    def channel_mask(self, channel: Optional[str]) -> int:
+        if not channel:
+            return self.scope_bits[SCOPE_GLOBAL]
+        mask = self._channel_masks.get(channel)
+        if mask is None:
+            mask = self.scope_bits[SCOPE_GLOBAL] | self.scope_bits.get(channel_scope(channel), 0)
+            owner = self.channel_owner.get(channel)
+            if owner is not None:
+                mask |= self.scope_bits.get(owner_scope(owner), 0)
+            self._channel_masks[channel] = mask
+        return mask
+
+    def matcher(self) -> StopWordMatcher:
+        """Общий матчер всех правил; пересобирается только после изменений набора."""
+        if self._matcher is None or self._matcher.version != self.version:
+            self._matcher = StopWordMatcher(list(self.masks), self.version)
+        return self._matcher
+
+    def match(self, text_lower: str, channel: Optional[str] = None) -> Optional[str]:
+        """Первое правило, действующее в канале, или None."""
+        rule = self.matcher().match(text_lower)
+        if rule is None:
+            return None
+
+        mask = self.channel_mask(channel)
+        if self.masks.get(rule, 0) & mask:
+            return rule
+
+        # сработало чужое правило — оно могло заслонить своё
+        own = self._by_mask.get(mask)
+        if own is None:
+            own = self._by_mask[mask] = StopWordMatcher(
+                [r for r, m in self.masks.items() if m & mask], self.version
+            )
+        return own.match(text_lower)
+
+    def stats_text(self) -> str:
+        return f"Стоп-слова: правил {len(self.masks)}, областей {len(self.scope_bits)}"
+
+
+stop_word_index = StopWordIndex()
+
+
+def match_stop_word(text_lower: str, channel: Optional[str] = None) -> Optional[str]:
+    return stop_word_index.match(text_lower, channel)
+
+
+def describe_rule(rule: str) -> str:
+    kind, body = parse_rule(rule)
+    label = {RULE_LITERAL: "", RULE_WORD: "[слово] ", RULE_PREFIX: "[префикс] ",
+             RULE_REGEX: "[regex] "}[kind]
+    return f"{label}{body}"
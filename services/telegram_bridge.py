@@ -0,0 +1,171 @@
+# services/telegram_bridge.py
+"""
+Мост Twitch → Telegram.
+
+twitchAPI вызывает обработчики чата в своём потоке со своим event loop,
+а aiogram живёт в главном loop. Все отправки в Telegram идут через
+очереди в loop Telegram: из чужого потока — одним call_soon_threadsafe,
+без создания корутин и Future на каждое сообщение.
+
+У каждого получателя (владельца) своя ограниченная очередь: наплыв
+в канале одного владельца вытесняет только его же старые сообщения
+и не трогает пересылки остальных. Одна задача-отправитель обходит
+очереди по кругу — по сообщению за раз, так что и темп отправки
+делится поровну. Отброшенные сообщения считаются по получателям,
+ошибки отправки — в лог.
+"""
+import asyncio
+from collections import deque
+from typing import Any, Deque, Dict, Optional, Tuple
+
+from .app_state import state
+
+
+BRIDGE_QUEUE_SIZE: int = 200       # сколько сообщений может ждать отправки у одного получателя
+BRIDGE_SEND_INTERVAL: float = 0.05  # пауза между отправками (лимиты Telegram)
+
+
+class TelegramBridge:
+    def __init__(self, maxsize: int = BRIDGE_QUEUE_SIZE):
+        self.maxsize = maxsize
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self.worker: Optional[asyncio.Task] = None
+
+        # chat_id -> ожидающие тексты; очередь обхода — получатели с сообщениями
+        self.queues: Dict[int, Deque[str]] = {}
+        self.ready: Deque[int] = deque()
+        self._wake: Optional[asyncio.Event] = None
+        self._sending: bool = False
+
+        self.sent: int = 0
+        self.dropped: int = 0
+        self.dropped_by: Dict[int, int] = {}
+        self.failed: int = 0
+        self.last_error: Optional[str] = None
+
+    # ==================================================
+    # LIFECYCLE (вызывается из loop Telegram)
+    # ==================================================
+
+    def start(self) -> None:
+        self.loop = asyncio.get_running_loop()
+        self.queues.clear()
+        self.ready.clear()
+        self.dropped_by.clear()
+        self._wake = asyncio.Event()
+        self.worker = self.loop.create_task(self._run())
+
+    async def stop(self, timeout: float = 5.0) -> None:
+        """Дожидается отправки очередей (не дольше timeout) и останавливает задачу."""
+        if self.worker is not None:
+            deadline = self.loop.time() + timeout
+            while (self.ready or self._sending) and self.loop.time() < deadline:
+                await asyncio.sleep(0.01)
+            if self.ready:
+                print(f"⚠ Не отправлено в Telegram при остановке: {self.queued()}")
+            self.worker.cancel()
+        self.loop = None
+
+    # ==================================================
+    # SUBMIT (из любого потока / loop)
+    # ==================================================
+
+    def submit(self, chat_id: int, text: str) -> bool:
+        """Ставит сообщение в очередь получателя. Не блокирует и не ждёт отправки."""
+        loop = self.loop
+        if loop is None or loop.is_closed():
+            return False
+
+        item = (chat_id, text)
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+
+        if running is loop:
+            self._enqueue(item)
+        else:
+            loop.call_soon_threadsafe(self._enqueue, item)
+        return True
+
+    def _enqueue(self, item: Tuple[int, str]) -> None:
+        # выполняется только в loop Telegram
+        chat_id, text = item
+        queue = self.queues.get(chat_id)
+        if queue is None:
+            queue = self.queues[chat_id] = deque()
+        if len(queue) >= self.maxsize:
+            # backpressure: свежие строки важнее старых — только у этого получателя
+            queue.popleft()
+            self.dropped += 1
+            self.dropped_by[chat_id] = self.dropped_by.get(chat_id, 0) + 1
+        if not queue:
+            self.ready.append(chat_id)
+        queue.append(text)
+        self._wake.set()
+
+    def queued(self) -> int:
+        return sum(len(q) for q in list(self.queues.values()))
+
+    # ==================================================
+    # WORKER
+    # ==================================================
+
+    async def _run(self) -> None:
+        while True:
+            if not self.ready:
+                self._wake.clear()
+                await self._wake.wait()
+                continue
+
+            # по кругу: одно сообщение получателя — и он в конец очереди обхода
+            chat_id = self.ready.popleft()
+            queue = self.queues[chat_id]
+            text = queue.popleft()
+            if queue:
+                self.ready.append(chat_id)
+
+            self._sending = True
+            try:
+                await self._send(chat_id, text)
+            finally:
+                self._sending = False
+            await asyncio.sleep(BRIDGE_SEND_INTERVAL)
+
+    async def _send(self, chat_id: int, text: str) -> None:
+        bot: Any = state.telegram_bot
+        if bot is None:
+            self.failed += 1
+            return
+        try:
+            await bot.send_message(chat_id, text)
+            self.sent += 1
+        except Exception as e:
+            retry_after = getattr(e, "retry_after", None)
+            if retry_after:
+                # флуд-лимит Telegram: ждём и пробуем ещё раз
+                await asyncio.sleep(retry_after)
+                try:
+                    await bot.send_message(chat_id, text)
+                    self.sent += 1
+                    return
+                except Exception as e2:
+                    e = e2
+            self.failed += 1
+            self.last_error = str(e)
+            print("⚠ Ошибка отправки в Telegram:", e)
+
+    def stats_text(self) -> str:
+        text = (
+            f"Telegram: отправлено {self.sent}, в очереди {self.queued()}, "
+            f"отброшено {self.dropped}, ошибок {self.failed}"
+        )
+        if self.dropped_by:
+            worst = sorted(self.dropped_by.items(), key=lambda kv: -kv[1])[:3]
+            text += "\nотброшено по получателям: " + ", ".join(f"{cid}: {n}" for cid, n in worst)
+        if self.last_error:
+            text += f"\nпоследняя ошибка: {self.last_error[:200]}"
+        return text
+
+
+telegram_bridge = TelegramBridge()
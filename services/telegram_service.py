@@ -1,19 +1,32 @@
 # services/telegram_service.py
+import asyncio
+import time
+from typing import Any, Awaitable, Callable, Dict
+
 from aiogram import Dispatcher, types, F
-from aiogram.filters import CommandStart
-from aiogram.types import ReplyKeyboardMarkup, KeyboardButton
-
-from services.app_state import state
-from database.repository import (
-    load_deepseek_keys,
-    add_deepseek_key_to_db,
-    delete_deepseek_key_from_db,
-    load_stop_words,
-    add_stop_word,
-    delete_stop_word,
-    set_current_channel_in_db,
-    load_bot_state,
+from aiogram.filters import Command, CommandObject, CommandStart
+from aiogram.fsm.context import FSMContext
+from aiogram.fsm.state import State, StatesGroup
+from aiogram.types import BufferedInputFile, ReplyKeyboardMarkup, KeyboardButton
+
+from services.app_state import OwnerContext, state
+from services.key_stats import key_stats_line
+from services.telemetry import TELEGRAM_HANDLER_SECONDS, stats_text
+from services.chat_supervisor import supervisor_for
+from services.key_import import import_keys
+from services.usage import usage_tracker
+from services.repo_cache import repo_cache
+from services.owner_bots import start_twitch_bot
+from services.stop_words import (
+    SCOPE_GLOBAL,
+    channel_scope,
+    describe_rule,
+    normalize_rule,
+    owner_scope,
+    stop_word_index,
+    validate_rule,
 )
+from utils.profiler import PROFILE_MAX_SECONDS, PROFILE_MIN_SECONDS, run_profile
 
 
 # ======================================================
@@ -34,16 +47,36 @@ main_kb = ReplyKeyboardMarkup(
             KeyboardButton(text="🔑 Наши ключи"),
             KeyboardButton(text="🛑 Стоп-слова"),
         ],
+        [
+            KeyboardButton(text="📊 Статистика"),
+            KeyboardButton(text="💰 Расход токенов"),
+        ],
     ],
     resize_keyboard=True,
 )
 
 
+# ======================================================
+# PANEL STATES
+# ======================================================
+
+class PanelStates(StatesGroup):
+    """
+    Режимы панели — свои у каждого админа (FSM aiogram, хранилище в памяти).
+    Ввод в режиме попадает сразу в обработчик этого состояния,
+    Twitch-часть о режимах панели не знает.
+    """
+    change_channel = State()
+    adding_key = State()
+    deleting_key = State()
+    stop_words = State()
+
+
 # ======================================================
 # START / AUTH
 # ======================================================
 
-async def cmd_start(message: types.Message):
+async def cmd_start(message: types.Message, fsm: FSMContext):
     telegram_id = message.from_user.id
 
     if not state.is_admin(telegram_id):
@@ -53,18 +86,15 @@ async def cmd_start(message: types.Message):
         )
         return
 
-    # фиксируем активного админа
-    state.set_active_admin(telegram_id)
+    # у каждого админа свой контекст: ключи, канал, флаги, свой Twitch-бот
+    ctx = state.owner_ctx(telegram_id)
+    await fsm.clear()
 
-    # загружаем персональные данные админа
-    state.DEEPSEEK_KEYS = load_deepseek_keys(telegram_id)
-    state.STOP_WORDS = load_stop_words()
+    # персональные данные админа: из БД только при первом входе, дальше — из памяти
+    repo_cache.load_owner(ctx)
 
-    channel, enabled = load_bot_state(telegram_id)
-    if channel:
-        state.CURRENT_CHANNEL = channel
-        state.TARGET_CHANNEL = channel
-    state.BOT_ENABLED = enabled
+    # Twitch-часть поднимается в фоне, панель отвечает сразу
+    start_twitch_bot(ctx)
 
     await message.answer(
         "👋 Привет!\n\n"
@@ -84,55 +114,94 @@ async def cmd_start(message: types.Message):
 # BOT ENABLE / DISABLE
 # ======================================================
 
-async def cmd_enable(message: types.Message):
+async def cmd_enable(message: types.Message, fsm: FSMContext):
     if not state.is_admin(message.from_user.id):
         return
+    ctx = state.owner_ctx(message.from_user.id)
 
-    state.BOT_ENABLED = True
-    state.reset_triggers()
+    saved = repo_cache.set_enabled(ctx, True)
+    await fsm.clear()
 
-    state.CHANGE_CHANNEL_MODE = False
-    state.ADDING_KEY_MODE = False
-    state.DELETING_KEY_MODE = False
-    state.STOP_WORDS_MODE = False
+    await message.answer("✅ Бот включён. Теперь он отвечает в Twitch-чате." + _unsaved_note(saved))
 
-    await message.answer("✅ Бот включён. Теперь он отвечает в Twitch-чате.")
 
-
-async def cmd_disable(message: types.Message):
+async def cmd_disable(message: types.Message, fsm: FSMContext):
     if not state.is_admin(message.from_user.id):
         return
+    ctx = state.owner_ctx(message.from_user.id)
+
+    saved = repo_cache.set_enabled(ctx, False)
+    await fsm.clear()
+
+    await message.answer("⛔ Бот остановлен." + _unsaved_note(saved))
+
 
-    state.BOT_ENABLED = False
-    state.reset_triggers()
+def _unsaved_note(saved: bool) -> str:
+    return "" if saved else "\n\n⚠ Не удалось сохранить в БД — после перезапуска не сохранится."
 
-    state.CHANGE_CHANNEL_MODE = False
-    state.ADDING_KEY_MODE = False
-    state.DELETING_KEY_MODE = False
-    state.STOP_WORDS_MODE = False
 
-    await message.answer("⛔ Бот остановлен.")
+# запись не прошла — ни БД, ни память не изменились
+DB_WRITE_FAILED = "❌ Не удалось сохранить изменение в БД, ничего не изменено. Попробуй ещё раз."
 
 
 # ======================================================
 # CHANGE CHANNEL
 # ======================================================
 
-async def cmd_change_channel(message: types.Message):
+async def cmd_change_channel(message: types.Message, fsm: FSMContext):
     if not state.is_admin(message.from_user.id):
         return
 
-    state.BOT_ENABLED = False
-    state.reset_triggers()
-
-    state.CHANGE_CHANNEL_MODE = True
-    state.ADDING_KEY_MODE = False
-    state.DELETING_KEY_MODE = False
-    state.STOP_WORDS_MODE = False
+    # бот продолжает работать в старом канале, пока не введён новый
+    await fsm.set_state(PanelStates.change_channel)
 
     await message.answer(
         "🔄 Смена Twitch-канала.\n\n"
-        "Введи название канала (без @ и ссылок)."
+        "Введи название канала (без @ и ссылок).\n"
+        "0 — отмена."
+    )
+
+
+async def handle_channel_input(message: types.Message, fsm: FSMContext):
+    if not state.is_admin(message.from_user.id):
+        return
+
+    text = message.text.strip()
+    owner_id = message.from_user.id
+    ctx = state.owner_ctx(owner_id)
+
+    if text == "0":
+        await fsm.clear()
+        await message.answer("❎ Смена канала отменена.")
+        return
+
+    if not text:
+        await message.answer("❌ Название канала не может быть пустым.")
+        return
+
+    channel = text.lstrip("@").lower()
+    other = state.channel_owner(channel)
+    if other is not None and other is not ctx:
+        await message.answer("❌ В этом канале уже работает бот другого админа.")
+        return
+
+    # в новом канале бот стартует выключенным
+    if not repo_cache.set_channel(ctx, channel):
+        # режим ввода не сбрасываем — можно сразу попробовать ещё раз
+        await message.answer(DB_WRITE_FAILED)
+        return
+
+    await fsm.clear()
+
+    # если чат уже подключён — сторож сразу перейдёт в новый канал
+    supervisor_for(ctx).request_reconcile()
+
+    await message.answer(
+        f"✅ Канал установлен: `{channel}`\n\n"
+        "Бот сейчас выключен.\n"
+        "Нажми «🚀 Запустить бота».",
+        parse_mode="Markdown",
+        reply_markup=main_kb
     )
 
 
@@ -140,191 +209,359 @@ async def cmd_change_channel(message: types.Message):
 # DEEPSEEK KEYS
 # ======================================================
 
-async def cmd_add_key(message: types.Message):
+async def cmd_add_key(message: types.Message, fsm: FSMContext):
     if not state.is_admin(message.from_user.id):
         return
 
-    state.BOT_ENABLED = False
-    state.reset_triggers()
-
-    state.ADDING_KEY_MODE = True
-    state.CHANGE_CHANNEL_MODE = False
-    state.DELETING_KEY_MODE = False
-    state.STOP_WORDS_MODE = False
+    await fsm.set_state(PanelStates.adding_key)
 
     await message.answer(
-        "➕ Добавление DeepSeek-ключа.\n\n"
-        "Отправь новый API-ключ целиком.\n"
+        "➕ Добавление DeepSeek-ключей.\n\n"
+        "Отправь ключ целиком, несколько ключей (через пробел / с новой строки)\n"
+        "или .txt-файл со списком — каждый ключ будет проверен.\n"
         "Отправь 0 — для отмены."
     )
 
 
-async def cmd_show_keys(message: types.Message):
+async def handle_key_input(message: types.Message, fsm: FSMContext):
     if not state.is_admin(message.from_user.id):
         return
 
-    state.BOT_ENABLED = False
-    state.reset_triggers()
+    text = message.text.strip()
+    if text == "0":
+        await fsm.clear()
+        await message.answer("❎ Добавление ключа отменено.")
+        return
+
+    await message.answer("🔎 Проверяю ключи...")
+    summary = await import_keys(text, message.from_user.id)
+
+    await fsm.clear()
 
-    state.DELETING_KEY_MODE = True
-    state.ADDING_KEY_MODE = False
-    state.CHANGE_CHANNEL_MODE = False
-    state.STOP_WORDS_MODE = False
+    await message.answer(summary)
 
-    if not state.DEEPSEEK_KEYS:
+
+KEY_FILE_MAX_BYTES = 1024 * 1024
+
+
+async def handle_key_file(message: types.Message, fsm: FSMContext):
+    """Файл со списком ключей в режиме добавления ключей."""
+    if not state.is_admin(message.from_user.id):
+        return
+
+    if message.document.file_size and message.document.file_size > KEY_FILE_MAX_BYTES:
+        await message.answer("❌ Файл слишком большой (максимум 1 МБ).")
+        return
+
+    data = await message.bot.download(message.document)
+    text = data.read().decode("utf-8", errors="ignore")
+
+    await message.answer("🔎 Проверяю ключи из файла...")
+    summary = await import_keys(text, message.from_user.id)
+
+    await fsm.clear()
+
+    await message.answer(summary)
+
+
+async def cmd_show_keys(message: types.Message, fsm: FSMContext):
+    if not state.is_admin(message.from_user.id):
+        return
+    ctx = state.owner_ctx(message.from_user.id)
+
+    if not ctx.DEEPSEEK_KEYS:
+        await fsm.clear()
         await message.answer("🔑 Список ключей пуст.")
         return
 
+    await fsm.set_state(PanelStates.deleting_key)
+
     text = "🔑 Твои DeepSeek-ключи:\n\n"
-    for i, key in enumerate(state.DEEPSEEK_KEYS, 1):
+    for i, key in enumerate(ctx.DEEPSEEK_KEYS, 1):
         short = key[:12] + "..." if len(key) > 12 else key
-        text += f"{i}) {short}\n"
+        text += f"{i}) {short}\n   {key_stats_line(key)}\n"
 
     text += "\nОтправь номер ключа — удалить\n0 — отмена"
 
     await message.answer(text)
 
 
+async def handle_key_delete(message: types.Message, fsm: FSMContext):
+    if not state.is_admin(message.from_user.id):
+        return
+
+    text = message.text.strip()
+    owner_id = message.from_user.id
+    ctx = state.owner_ctx(owner_id)
+
+    if text == "0":
+        await fsm.clear()
+        await message.answer("❎ Удаление отменено.")
+        return
+
+    if not text.isdigit():
+        await message.answer("❌ Введи номер ключа.")
+        return
+
+    idx = int(text)
+    if idx < 1 or idx > len(ctx.DEEPSEEK_KEYS):
+        await message.answer("❌ Неверный номер.")
+        return
+
+    if repo_cache.delete_key(ctx, idx - 1) is None:
+        # режим удаления не сбрасываем — можно сразу попробовать ещё раз
+        await message.answer(DB_WRITE_FAILED)
+        return
+
+    await fsm.clear()
+    await message.answer("🗑 Ключ удалён.")
+
+
 # ======================================================
 # STOP WORDS
 # ======================================================
 
-async def cmd_stop_words(message: types.Message):
-    if not state.is_admin(message.from_user.id):
-        return
+STOP_WORDS_SHOWN = 100
+STOP_WORDS_HELP = (
+    "Отправь правило — добавить:\n"
+    "  слово — подстрока где угодно\n"
+    "  w:слово — только целое слово\n"
+    "  p:стрим — слова, начинающиеся с префикса\n"
+    "  re:шаблон — регулярное выражение\n"
+    "Куда добавлять: «канал», «мои» (все мои каналы), «общие»"
+)
+SCOPE_COMMANDS = {"канал", "мои", "общие"}
+
+
+def _panel_scopes(ctx: OwnerContext):
+    """Области, которые видит админ в панели: (ключ, заголовок)."""
+    scopes = [
+        (SCOPE_GLOBAL, "🌐 Общие"),
+        (owner_scope(ctx.telegram_id), "👤 Мои (все мои каналы)"),
+    ]
+    if ctx.CURRENT_CHANNEL:
+        scopes.append((channel_scope(ctx.CURRENT_CHANNEL), f"📺 Канал #{ctx.CURRENT_CHANNEL}"))
+    return scopes
+
+
+def _panel_rules(ctx: OwnerContext):
+    """Сквозная нумерация правил панели: [(область, правило), ...]."""
+    # зависит от правил и от текущего канала владельца
+    return repo_cache.view(
+        "stop_word_rules", ctx.telegram_id, ("stop_words", "channels"),
+        lambda: [
+            (scope, rule)
+            for scope, _ in _panel_scopes(ctx)
+            for rule in stop_word_index.rules(scope)
+        ],
+    )
 
-    state.BOT_ENABLED = False
-    state.reset_triggers()
 
-    state.STOP_WORDS_MODE = True
-    state.CHANGE_CHANNEL_MODE = False
-    state.ADDING_KEY_MODE = False
-    state.DELETING_KEY_MODE = False
+def _scope_title(ctx: OwnerContext, scope: str) -> str:
+    for key, title in _panel_scopes(ctx):
+        if key == scope:
+            return title
+    return scope
 
-    state.STOP_WORDS = load_stop_words()
 
-    if not state.STOP_WORDS:
-        await message.answer(
-            "🛑 Стоп-слов пока нет.\n\n"
-            "Отправь слово или фразу — добавить.\n"
-            "0 — выход."
-        )
+def _stop_words_listing(ctx: OwnerContext) -> str:
+    """Список правил панели по областям, сквозная нумерация как в _panel_rules."""
+    text = "🛑 Стоп-слова:\n"
+    n = 0
+    for scope, title in _panel_scopes(ctx):
+        rules = stop_word_index.rules(scope)
+        text += f"\n{title}: {len(rules) or 'нет'}\n"
+        for rule in rules:
+            n += 1
+            if n <= STOP_WORDS_SHOWN:
+                text += f"{n}) {describe_rule(rule)}\n"
+    if n > STOP_WORDS_SHOWN:
+        text += f"... всего {n}\n"
+    return text
+
+
+async def cmd_stop_words(message: types.Message, fsm: FSMContext):
+    if not state.is_admin(message.from_user.id):
         return
+    ctx = state.owner_ctx(message.from_user.id)
 
-    text = "🛑 Текущие стоп-слова:\n\n"
-    for i, w in enumerate(state.STOP_WORDS, 1):
-        text += f"{i}) {w}\n"
+    # правила уже в памяти (загружены при старте, панель меняет их точечно);
+    # изменения применяются сразу, бот в это время продолжает работать
+    target = channel_scope(ctx.CURRENT_CHANNEL) if ctx.CURRENT_CHANNEL else SCOPE_GLOBAL
+    await fsm.set_state(PanelStates.stop_words)
+    await fsm.update_data(scope=target)
 
-    text += "\nОтправь слово — добавить\nНомер — удалить\n0 — выход"
+    text = repo_cache.view(
+        "stop_words_panel", ctx.telegram_id, ("stop_words", "channels"),
+        lambda: _stop_words_listing(ctx),
+    )
+    text += (
+        f"\nНовые правила → {_scope_title(ctx, target)}\n"
+        f"{STOP_WORDS_HELP}\nНомер — удалить\n0 — выход"
+    )
 
     await message.answer(text)
 
 
-# ======================================================
-# TEXT HANDLER (MODES)
-# ======================================================
-
-async def handle_text(message: types.Message):
+async def handle_stop_word_input(message: types.Message, fsm: FSMContext):
     if not state.is_admin(message.from_user.id):
         return
 
     text = message.text.strip()
-    owner_id = state.ACTIVE_TELEGRAM_ID
+    owner_id = message.from_user.id
+    ctx = state.owner_ctx(owner_id)
 
-    # ---------- CHANGE CHANNEL ----------
-    if state.CHANGE_CHANNEL_MODE:
-        if not text:
-            await message.answer("❌ Название канала не может быть пустым.")
-            return
+    if text == "0":
+        await fsm.clear()
+        await message.answer("Выход из управления стоп-словами.")
+        return
 
-        channel = text.lstrip("@").lower()
-        state.CURRENT_CHANNEL = channel
-        state.TARGET_CHANNEL = channel
+    if text.lower() in SCOPE_COMMANDS:
+        scope = {
+            "канал": channel_scope(ctx.CURRENT_CHANNEL) if ctx.CURRENT_CHANNEL else None,
+            "мои": owner_scope(owner_id),
+            "общие": SCOPE_GLOBAL,
+        }[text.lower()]
+        if scope is None:
+            await message.answer("❌ Канал не выбран.")
+            return
+        await fsm.update_data(scope=scope)
+        await message.answer(f"Новые правила → {_scope_title(ctx, scope)}")
+        return
 
-        set_current_channel_in_db(channel, owner_id)
+    if text.isdigit():
+        idx = int(text)
+        entries = _panel_rules(ctx)
+        if 1 <= idx <= len(entries):
+            scope, word = entries[idx - 1]
+            if repo_cache.remove_stop_word(scope, word) is None:
+                await message.answer(DB_WRITE_FAILED)
+                return
+            await message.answer(f"❌ Удалено ({_scope_title(ctx, scope)}): {describe_rule(word)}")
+        else:
+            await message.answer("❌ Неверный номер.")
+        return
 
-        state.CHANGE_CHANNEL_MODE = False
+    rule = normalize_rule(text)
+    error = validate_rule(rule)
+    if error:
+        await message.answer(f"❌ Правило не добавлено: {error}")
+        return
 
-        await message.answer(
-            f"✅ Канал установлен: `{channel}`\n\n"
-            "Бот сейчас выключен.\n"
-            "Нажми «🚀 Запустить бота».",
-            parse_mode="Markdown",
-            reply_markup=main_kb
-        )
+    scope = (await fsm.get_data()).get("scope", SCOPE_GLOBAL)
+    added = repo_cache.add_stop_word(scope, rule)
+    if added is None:
+        await message.answer(DB_WRITE_FAILED)
         return
+    if not added:
+        await message.answer(f"Уже есть ({_scope_title(ctx, scope)}): {describe_rule(rule)}")
+        return
+    await message.answer(f"✅ Добавлено ({_scope_title(ctx, scope)}): {describe_rule(rule)}")
 
-    # ---------- ADD KEY ----------
-    if state.ADDING_KEY_MODE:
-        if text == "0":
-            state.ADDING_KEY_MODE = False
-            await message.answer("❎ Добавление ключа отменено.")
-            return
 
-        add_deepseek_key_to_db(text, owner_id)
-        state.DEEPSEEK_KEYS.append(text)
+# ======================================================
+# STATS
+# ======================================================
 
-        state.ADDING_KEY_MODE = False
+async def cmd_stats(message: types.Message):
+    # только чтение: режимы и генерацию не трогаем
+    if not state.is_admin(message.from_user.id):
+        return
 
-        await message.answer("✅ Ключ добавлен.")
+    await message.answer(stats_text())
+
+
+async def cmd_usage(message: types.Message):
+    # только чтение: сводка из окон в памяти, без запросов к БД
+    if not state.is_admin(message.from_user.id):
         return
 
-    # ---------- DELETE KEY ----------
-    if state.DELETING_KEY_MODE:
-        if text == "0":
-            state.DELETING_KEY_MODE = False
-            await message.answer("❎ Удаление отменено.")
-            return
+    await message.answer(usage_tracker.summary_text(message.from_user.id))
 
-        if not text.isdigit():
-            await message.answer("❌ Введи номер ключа.")
-            return
 
-        idx = int(text)
-        if idx < 1 or idx > len(state.DEEPSEEK_KEYS):
-            await message.answer("❌ Неверный номер.")
-            return
+# ======================================================
+# PROFILE (owner)
+# ======================================================
 
-        key = state.DEEPSEEK_KEYS.pop(idx - 1)
-        delete_deepseek_key_from_db(key, owner_id)
+PROFILE_DEFAULT_SECONDS = 30
+PROFILE_TOP_N = 15
 
-        state.DELETING_KEY_MODE = False
-        await message.answer("🗑 Ключ удалён.")
+
+async def cmd_profile(message: types.Message, command: CommandObject):
+    """
+    /profile [сек] — семплирующий профиль работающего процесса.
+    Присылает collapsed stacks (для flamegraph) и топ горячих функций.
+    """
+    if state.get_admin_role(message.from_user.id) != "owner":
         return
 
-    # ---------- STOP WORDS ----------
-    if state.STOP_WORDS_MODE:
-        if text == "0":
-            state.STOP_WORDS_MODE = False
-            await message.answer("Выход из управления стоп-словами.")
-            return
+    seconds = PROFILE_DEFAULT_SECONDS
+    if command.args and command.args.strip().isdigit():
+        seconds = int(command.args.strip())
+    seconds = max(PROFILE_MIN_SECONDS, min(PROFILE_MAX_SECONDS, seconds))
 
-        if text.isdigit():
-            idx = int(text)
-            if 1 <= idx <= len(state.STOP_WORDS):
-                word = state.STOP_WORDS.pop(idx - 1)
-                delete_stop_word(word)
-                await message.answer(f"❌ Удалено: {word}")
-            else:
-                await message.answer("❌ Неверный номер.")
-            return
+    await message.answer(f"⏱ Снимаю профиль {seconds} с...")
 
-        add_stop_word(text)
-        state.STOP_WORDS.append(text.lower())
-        await message.answer(f"✅ Добавлено: {text.lower()}")
+    # семплер живёт в отдельном потоке, event loop продолжает работать
+    prof = await asyncio.to_thread(run_profile, seconds)
+    if prof is None:
+        await message.answer("⚠ Профиль уже снимается.")
         return
 
+    stamp = time.strftime("%Y%m%d-%H%M%S")
+    await message.answer_document(
+        BufferedInputFile(prof.collapsed().encode("utf-8"), filename=f"profile-{stamp}.folded"),
+        caption="flamegraph.pl profile.folded > profile.svg  или  speedscope.app",
+    )
+    await message.answer(prof.report(PROFILE_TOP_N))
+
 
 # ======================================================
 # REGISTER
 # ======================================================
 
+async def metrics_middleware(
+    handler: Callable[[types.Message, Dict[str, Any]], Awaitable[Any]],
+    event: types.Message,
+    data: Dict[str, Any],
+) -> Any:
+    """Время каждого обработчика сообщений — в telegram_handler_seconds."""
+    handler_obj = data.get("handler")
+    name = getattr(getattr(handler_obj, "callback", None), "__name__", "unknown")
+    with TELEGRAM_HANDLER_SECONDS.time(handler=name):
+        return await handler(event, data)
+
+
+async def fsm_middleware(
+    handler: Callable[[types.Message, Dict[str, Any]], Awaitable[Any]],
+    event: types.Message,
+    data: Dict[str, Any],
+) -> Any:
+    """
+    aiogram передаёт FSMContext под именем `state`, а здесь так зовётся
+    общее AppState — обработчики получают его как `fsm`.
+    """
+    data["fsm"] = data["state"]
+    return await handler(event, data)
+
+
 def register_handlers(dp: Dispatcher):
+    dp.message.middleware(metrics_middleware)
+    dp.message.middleware(fsm_middleware)
     dp.message.register(cmd_start, CommandStart())
+    dp.message.register(cmd_profile, Command("profile"))
     dp.message.register(cmd_enable, F.text == "🚀 Запустить бота")
     dp.message.register(cmd_disable, F.text == "⛔ Остановить бота")
     dp.message.register(cmd_change_channel, F.text == "🔄 Сменить канал")
     dp.message.register(cmd_add_key, F.text == "➕ Добавить ключ DeepSeek")
     dp.message.register(cmd_show_keys, F.text == "🔑 Наши ключи")
     dp.message.register(cmd_stop_words, F.text == "🛑 Стоп-слова")
-    dp.message.register(handle_text)
+    dp.message.register(cmd_stats, F.text == "📊 Статистика")
+    dp.message.register(cmd_usage, F.text == "💰 Расход токенов")
+
+    # ввод в режимах панели; кнопки выше срабатывают в любом режиме
+    dp.message.register(handle_channel_input, PanelStates.change_channel, F.text)
+    dp.message.register(handle_key_input, PanelStates.adding_key, F.text)
+    dp.message.register(handle_key_file, PanelStates.adding_key, F.document)
+    dp.message.register(handle_key_delete, PanelStates.deleting_key, F.text)
+    dp.message.register(handle_stop_word_input, PanelStates.stop_words, F.text)
@@ -0,0 +1,92 @@
+# services/telegram_webhook.py
+"""
+Режим webhook для Telegram-панели (вместо long polling).
+
+Включается ключом telegram_webhook_url в таблице config:
+  telegram_webhook_url     — публичный https-адрес (за reverse proxy)
+  telegram_webhook_secret  — секрет для X-Telegram-Bot-Api-Secret-Token
+                             (если не задан — генерируется при каждом старте)
+  telegram_webhook_host    — где слушать локально (по умолчанию 127.0.0.1)
+  telegram_webhook_port    — порт (по умолчанию 8080)
+
+Для проверки без настоящего Telegram: telegram_api_server — базовый адрес
+локального сервера Bot API (например, http://127.0.0.1:8081),
+тогда и setWebhook, и ответы бота уходят туда.
+"""
+import secrets
+from typing import Any, Dict, Optional
+from urllib.parse import urlsplit
+
+from aiohttp import web
+from aiogram import Bot, Dispatcher
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
+from aiogram.webhook.aiohttp_server import SimpleRequestHandler, setup_application
+
+WEBHOOK_DEFAULT_HOST = "127.0.0.1"
+WEBHOOK_DEFAULT_PORT = 8080
+WEBHOOK_DEFAULT_PATH = "/telegram/webhook"
+
+
+def make_bot(token: str, cfg: Dict[str, str]) -> Bot:
+    """Bot с обычным или локальным (telegram_api_server) сервером Bot API."""
+    api_server = cfg.get("telegram_api_server")
+    if not api_server:
+        return Bot(token=token)
+    print(f"🧪 Telegram Bot API: {api_server}")
+    session = AiohttpSession(api=TelegramAPIServer.from_base(api_server, is_local=True))
+    return Bot(token=token, session=session)
+
+
+def webhook_settings(cfg: Dict[str, str]) -> Optional[Dict[str, Any]]:
+    """Настройки webhook из config или None — тогда работаем через polling."""
+    url = (cfg.get("telegram_webhook_url") or "").strip()
+    if not url:
+        return None
+
+    path = urlsplit(url).path or WEBHOOK_DEFAULT_PATH
+    try:
+        port = int(cfg.get("telegram_webhook_port") or WEBHOOK_DEFAULT_PORT)
+    except ValueError:
+        print("⚠ Неверный telegram_webhook_port, использую", WEBHOOK_DEFAULT_PORT)
+        port = WEBHOOK_DEFAULT_PORT
+
+    return {
+        "url": url,
+        "path": path,
+        "host": cfg.get("telegram_webhook_host") or WEBHOOK_DEFAULT_HOST,
+        "port": port,
+        # Telegram допускает A-Z a-z 0-9 _ - (до 256 символов)
+        "secret": cfg.get("telegram_webhook_secret") or secrets.token_urlsafe(32),
+    }
+
+
+async def start_webhook(bot: Bot, dp: Dispatcher, settings: Dict[str, Any]) -> web.AppRunner:
+    """
+    Поднимает HTTP-сервер и регистрирует webhook в Telegram.
+    Запросы без верного секрета aiogram отклоняет с 401.
+    """
+    app = web.Application()
+    SimpleRequestHandler(
+        dispatcher=dp,
+        bot=bot,
+        secret_token=settings["secret"],
+    ).register(app, path=settings["path"])
+    setup_application(app, dp, bot=bot)
+
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, settings["host"], settings["port"])
+    await site.start()
+
+    await bot.set_webhook(
+        settings["url"],
+        secret_token=settings["secret"],
+        allowed_updates=dp.resolve_used_update_types(),
+        drop_pending_updates=True,
+    )
+    print(
+        f"🌐 Webhook: {settings['url']} → "
+        f"http://{settings['host']}:{settings['port']}{settings['path']}"
+    )
+    return runner
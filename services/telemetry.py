@@ -0,0 +1,169 @@
+# services/telemetry.py
+"""
+Метрики бота: сообщения Twitch, генерации и запросы к модели,
+обработчики Telegram. Отдаются на /metrics (utils/metrics.py)
+и в компактном виде — кнопкой «📊 Статистика» в Telegram.
+"""
+from typing import Optional
+
+from utils.metrics import Counter, Gauge, Histogram, register_collector
+
+from .app_state import state
+from .model_chain import open_breakers_count, ordered_models, get_model_stats
+from .reply_gate import reply_gate
+from .telegram_bridge import telegram_bridge
+from .chat_archive import chat_archive
+from .chat_supervisor import all_supervisors
+from .stop_words import stop_word_index
+from .repo_cache import repo_cache
+
+
+# ======================================================
+# METRICS
+# ======================================================
+
+TWITCH_MESSAGES = Counter(
+    "twitch_messages_total",
+    "Сообщения Twitch-чата по исходу обработки",
+    ("channel", "result"),
+)
+ON_MESSAGE_SECONDS = Histogram(
+    "twitch_on_message_seconds",
+    "Время on_message до генерации ответа",
+    ("channel",),
+)
+
+AI_GENERATIONS = Counter(
+    "ai_generations_total",
+    "Попытки генерации ответа по исходу",
+    ("channel", "result"),
+)
+AI_GENERATION_SECONDS = Histogram(
+    "ai_generation_seconds",
+    "Время получения ответа модели (все ключи и модели цепочки)",
+    ("channel",),
+)
+AI_REQUESTS = Counter(
+    "ai_requests_total",
+    "Запросы к модели по паре ключ×модель и исходу",
+    ("key", "model", "result"),
+)
+AI_REQUEST_SECONDS = Histogram(
+    "ai_request_seconds",
+    "Время одного запроса к модели",
+    ("model",),
+)
+AI_TOKENS = Counter(
+    "ai_tokens_total",
+    "Токены ответов, отправленных в чат (из usage ответа)",
+    ("channel", "kind"),
+)
+
+TELEGRAM_HANDLER_SECONDS = Histogram(
+    "telegram_handler_seconds",
+    "Время обработчиков Telegram",
+    ("handler",),
+)
+
+CHANNEL_RATE = Gauge("twitch_channel_message_rate", "Сглаженная скорость сообщений, в сек", ("channel",))
+CHANNEL_OVERLOADED = Gauge("twitch_channel_overloaded", "1 — канал в режиме перегрузки", ("channel",))
+TELEGRAM_QUEUE = Gauge("telegram_bridge_queue", "Сообщения в очереди на отправку в Telegram")
+TELEGRAM_BRIDGE = Gauge("telegram_bridge_messages", "Итоги моста в Telegram", ("result",))
+TELEGRAM_DROPPED = Gauge("telegram_bridge_dropped", "Отброшенные пересылки по получателям", ("owner",))
+AI_KEYS = Gauge("ai_keys", "Количество загруженных ключей")
+AI_BREAKERS_OPEN = Gauge("ai_breakers_open", "Разомкнутые пары ключ×модель")
+TWITCH_RECONNECTS = Gauge("twitch_chat_reconnects", "Переподключения к Twitch-чату")
+TWITCH_JOINED = Gauge("twitch_chat_joined_channels", "Каналы, в которые бот зашёл")
+CHAT_ARCHIVE = Gauge("chat_archive_lines", "Строки архива чата", ("result",))
+REPLY_GATE = Gauge("ai_reply_gate", "Проверки локального фильтра ответов", ("result",))
+
+
+def key_label(key: str) -> str:
+    """Метка ключа: только префикс, как в логах."""
+    return key[:12]
+
+
+def _collect() -> None:
+    for name, ch in list(state.channels.items()):
+        if ch.load is not None:
+            CHANNEL_RATE.set(ch.load.rate, channel=name)
+            CHANNEL_OVERLOADED.set(1 if ch.load.overloaded else 0, channel=name)
+
+    TELEGRAM_QUEUE.set(telegram_bridge.queued())
+    TELEGRAM_BRIDGE.set(telegram_bridge.sent, result="sent")
+    TELEGRAM_BRIDGE.set(telegram_bridge.dropped, result="dropped")
+    TELEGRAM_BRIDGE.set(telegram_bridge.failed, result="failed")
+    for owner_id, dropped in list(telegram_bridge.dropped_by.items()):
+        TELEGRAM_DROPPED.set(dropped, owner=owner_id)
+
+    supervisors = all_supervisors()
+    TWITCH_RECONNECTS.set(sum(s.reconnects for s in supervisors))
+    TWITCH_JOINED.set(sum(len(s.joined) for s in supervisors))
+
+    CHAT_ARCHIVE.set(chat_archive.written, result="written")
+    CHAT_ARCHIVE.set(len(chat_archive.pending), result="pending")
+    CHAT_ARCHIVE.set(chat_archive.dropped, result="dropped")
+
+    AI_KEYS.set(len(state.all_keys()))
+    AI_BREAKERS_OPEN.set(open_breakers_count())
+    REPLY_GATE.set(reply_gate.checked, result="checked")
+    REPLY_GATE.set(reply_gate.skipped, result="skipped")
+
+
+register_collector(_collect)
+
+
+# ======================================================
+# TELEGRAM STATS VIEW
+# ======================================================
+
+def _ms(seconds: Optional[float]) -> str:
+    if seconds is None:
+        return "—"
+    if seconds == float("inf"):
+        return ">30 с"
+    if seconds < 0.001:
+        return f"{seconds * 1e6:.0f} мкс"
+    return f"{seconds * 1000:.0f} мс" if seconds < 1 else f"{seconds:.1f} с"
+
+
+def stats_text() -> str:
+    """Сводка для Telegram — только из уже агрегированных метрик."""
+    _collect()
+    lines = ["📊 Статистика\n"]
+
+    for name, ch in list(state.channels.items()):
+        total = sum(
+            v for (c, _), v in list(TWITCH_MESSAGES.values.items()) if c == name
+        )
+        accepted = TWITCH_MESSAGES.get(channel=name, result="accepted")
+        rate = ch.load.rate if ch.load is not None else 0.0
+        flag = " 🌊" if ch.load is not None and ch.load.overloaded else ""
+        lines.append(
+            f"#{name}{flag}: {total:.0f} сообщ. (~{rate:.1f}/сек), "
+            f"в историю {accepted:.0f}, "
+            f"p99 обработки {_ms(ON_MESSAGE_SECONDS.quantile(0.99, channel=name))}"
+        )
+        sent = AI_GENERATIONS.get(channel=name, result="sent")
+        lines.append(
+            f"   ответов {sent:.0f}, генерация p50 "
+            f"{_ms(AI_GENERATION_SECONDS.quantile(0.5, channel=name))} / p90 "
+            f"{_ms(AI_GENERATION_SECONDS.quantile(0.9, channel=name))}"
+        )
+
+    lines.append("")
+    for model in ordered_models():
+        s = get_model_stats(model)
+        lines.append(
+            f"🧠 {model}: {s.calls} запр., ошибок {s.errors}, "
+            f"p90 {_ms(AI_REQUEST_SECONDS.quantile(0.9, model=model))}"
+        )
+    lines.append(f"🔌 разомкнуто пар ключ×модель: {AI_BREAKERS_OPEN.get():.0f}")
+    lines.append(f"⏭ {reply_gate.stats_text()}")
+    for supervisor in all_supervisors():
+        lines.append(f"🔌 {supervisor.stats_text()}")
+    lines.append(f"📨 {telegram_bridge.stats_text()}")
+    lines.append(f"🗄 {chat_archive.stats_text()}")
+    lines.append(f"🛑 {stop_word_index.stats_text()}")
+    lines.append(f"💾 {repo_cache.stats_text()}")
+    return "\n".join(lines)
@@ -1,18 +1,32 @@
 # services/twitch_service.py
 import asyncio
+from functools import partial
+from time import perf_counter
+
 from twitchAPI.chat import Chat, ChatMessage, EventData
 from twitchAPI.type import AuthScope, ChatEvent
-from twitchAPI.oauth import UserAuthenticator
+from twitchAPI.oauth import UserAuthenticator, refresh_access_token
 from twitchAPI.twitch import Twitch
 
-from services.app_state import state
+from services.app_state import OwnerContext, state
 from services.ai_service import (
     init_ai_client,
     get_first_working_key,
-    switch_to_next_key,
     send_ai_message,
 )
-from database.repository import load_deepseek_keys
+from services.startup import PhaseTimer
+from services.telegram_bridge import telegram_bridge
+from services.telemetry import ON_MESSAGE_SECONDS, TWITCH_MESSAGES
+from services.chat_archive import chat_archive, warm_channel_history
+from services.chat_supervisor import supervisor_for
+from services.stop_words import match_stop_word
+from services.overload import get_channel_load
+from services.ingest import get_ingest_filter, INGEST_NEW
+from services.repo_cache import repo_cache
+from database.repository import (
+    load_twitch_tokens,
+    save_twitch_tokens,
+)
 
 
 # ======================================================
@@ -22,135 +36,261 @@ from database.repository import load_deepseek_keys
 async def on_message(msg: ChatMessage):
     """
     Обработчик сообщений Twitch-чата.
+    При наплыве сообщений (рейд, хайп-трейн) канал переходит в режим
+    перегрузки: в историю попадает только выборка строк, вместо
+    пересылки каждой строки в Telegram уходят периодические сводки.
+    Всё, что касается владельца (пауза, включён ли бот, кому слать
+    в Telegram), берётся из контекста владельца канала.
+    """
+    channel = msg.room.name if msg.room else ""
+
+    t0 = perf_counter()
+    result = _process_message(msg, channel)
+    ON_MESSAGE_SECONDS.observe(perf_counter() - t0, channel=channel)
+    TWITCH_MESSAGES.inc(channel=channel, result=result)
+    chat_archive.append(channel, msg.user.display_name, msg.text, result)
+
+    if result == "accepted":
+        await send_ai_message(state.get_channel(channel))
+
+
+def _process_message(msg: ChatMessage, channel: str) -> str:
+    """
+    Синхронная часть обработки сообщения до генерации ответа.
+    Возвращает исход: paused / stop_word / sampled_out / filtered / accepted.
     """
-    # режимы паузы (настройки из Telegram)
-    if (
-        state.CHANGE_CHANNEL_MODE
-        or state.ADDING_KEY_MODE
-        or state.DELETING_KEY_MODE
-        or state.STOP_WORDS_MODE
-    ):
+    ctx = state.channel_owner(channel)
+
+    # канал без владельца (уже покинут); меню панели бота не останавливают
+    if ctx is None:
         print(f"[PAUSED] {msg.user.display_name}: {msg.text}")
-        return
+        return "paused"
+
+    load = get_channel_load(channel)
+    overloaded = load.register()
 
     text_lower = msg.text.lower()
 
-    # стоп-слова (обращения к стримеру и т.п.)
-    for w in state.STOP_WORDS:
-        if w in text_lower:
+    # стоп-слова (обращения к стримеру и т.п.) — один проход общего шаблона
+    if match_stop_word(text_lower, channel) is not None:
+        if not overloaded:
             print(f"[STOP WORD] {msg.user.display_name}: {msg.text}")
-            return
+        return "stop_word"
 
-    print(f"{msg.user.display_name}: {msg.text}")
+    if overloaded:
+        # сводка вместо пересылки каждой строки
+        summary = load.take_summary()
+        if summary and ctx.BOT_ENABLED:
+            telegram_bridge.submit(ctx.telegram_id, summary)
 
-    # пересылка админу в Telegram (только если бот включён)
-    if state.BOT_ENABLED:
-        try:
-            from asyncio import run_coroutine_threadsafe
-            admin_id = state.get_main_admin_id()
-            if (
-                state.TELEGRAM_LOOP
-                and state.telegram_bot
-                and admin_id
-            ):
-                run_coroutine_threadsafe(
-                    state.telegram_bot.send_message(
-                        admin_id,
-                        f"{msg.user.display_name}: {msg.text}"
-                    ),
-                    state.TELEGRAM_LOOP
-                )
-        except Exception as e:
-            print("⚠ Ошибка пересылки сообщения в Telegram:", e)
+        if not load.should_sample():
+            return "sampled_out"
+    else:
+        # добиваем сводку, оставшуюся после выхода из перегрузки
+        summary = load.take_summary(force=True)
+        if summary and ctx.BOT_ENABLED:
+            telegram_bridge.submit(ctx.telegram_id, summary)
+
+        print(f"{msg.user.display_name}: {msg.text}")
+
+        # пересылка владельцу в Telegram (только если бот включён)
+        if ctx.BOT_ENABLED:
+            telegram_bridge.submit(ctx.telegram_id, f"{msg.user.display_name}: {msg.text}")
+
+    # история для AI через фильтр: лимит на зрителя, склейка повторов, сжатие смайлов
+    if get_ingest_filter(channel).process(msg.user.display_name, msg.text) != INGEST_NEW:
+        return "filtered"
 
-    # история для AI
-    state.chat_history.append(f"{msg.user.display_name}: {msg.text}")
-    if len(state.chat_history) > 7:
-        state.chat_history.pop(0)
+    state.get_channel(channel).triggers += 1
+    return "accepted"
 
-    state.trigger_messages.append(msg.text)
 
-    await send_ai_message()
+async def on_ready(ctx: OwnerContext, event: EventData):
+    # READY приходит и после каждого переподключения — заходим во все каналы заново
+    for channel in await supervisor_for(ctx).on_ready(event.chat):
+        print(f"🎮 Twitch-бот подключён к каналу #{channel}")
 
+        # после рестарта история не пустая: подтягиваем свежие строки из архива
+        warmed = await asyncio.to_thread(warm_channel_history, state.get_channel(channel))
+        if warmed:
+            print(f"🗄 История #{channel} прогрета из архива: {warmed} строк")
 
-async def on_ready(event: EventData):
-    await event.chat.join_room(state.CURRENT_CHANNEL)
-    print(f"🎮 Twitch-бот подключён к каналу #{state.CURRENT_CHANNEL}")
+    timer = ctx.init_timer
+    if timer is not None and "chat_ready" not in timer.phases:
+        timer.mark("chat_ready")
+        print(timer.report(f"⏱ Запуск Twitch-бота владельца {ctx.telegram_id}"))
 
 
 # ======================================================
-# TWITCH INIT
+# TWITCH AUTH (с кешем токенов в БД)
 # ======================================================
 
-async def init_twitch_bot():
+TWITCH_SCOPES = [
+    AuthScope.CHAT_READ,
+    AuthScope.CHAT_EDIT,
+    AuthScope.CHANNEL_MANAGE_BROADCAST,
+]
+
+# как часто обновлять токен заранее (живёт ~4 часа)
+TOKEN_REFRESH_INTERVAL: float = 3 * 60 * 60
+
+async def authenticate_user(twitch: Twitch, owner_telegram_id: int) -> bool:
     """
-    Инициализация Twitch-бота.
-    Вызывается один раз после того, как админ вошёл (/start).
+    Авторизует пользователя Twitch.
+    Сначала пробует сохранённые в БД токены (и их обновление),
+    и только если их нет или они отозваны — интерактивный вход через браузер.
     """
-    if state.chat is not None:
-        # уже инициализирован
-        return
+    async def on_refresh(token: str, refresh_token: str):
+        # twitchAPI вызывает это при каждом автообновлении токена
+        await asyncio.to_thread(
+            save_twitch_tokens, owner_telegram_id, token, refresh_token
+        )
+        print("🔐 Twitch-токен обновлён и сохранён")
 
-    if not state.ACTIVE_TELEGRAM_ID:
-        print("⚠ Нельзя инициализировать Twitch без активного админа.")
-        return
+    twitch.user_auth_refresh_callback = on_refresh
 
-    # ==================================================
-    # DEEPSEEK KEYS
-    # ==================================================
-    state.DEEPSEEK_KEYS = load_deepseek_keys(state.ACTIVE_TELEGRAM_ID)
+    cached = load_twitch_tokens(owner_telegram_id)
+    if cached:
+        token, refresh_token = cached
+        try:
+            await twitch.set_user_authentication(token, TWITCH_SCOPES, refresh_token)
+            print("🔐 Twitch: вход по сохранённому токену")
+            return True
+        except Exception as e:
+            print("⚠ Сохранённый Twitch-токен не подошёл, обновляю:", e)
 
-    if not state.DEEPSEEK_KEYS:
-        print("❌ У админа нет DeepSeek ключей.")
-        return
+        try:
+            token, refresh_token = await refresh_access_token(
+                refresh_token, state.APP_ID, state.APP_SECRET,
+                auth_base_url=twitch.auth_base_url,
+            )
+            await twitch.set_user_authentication(token, TWITCH_SCOPES, refresh_token)
+            save_twitch_tokens(owner_telegram_id, token, refresh_token)
+            print("🔐 Twitch: токен обновлён по refresh_token")
+            return True
+        except Exception as e:
+            print("⚠ Не удалось обновить Twitch-токен, нужен вход заново:", e)
+
+    try:
+        auth = UserAuthenticator(twitch, TWITCH_SCOPES)
+        token, refresh_token = await auth.authenticate()
+        await twitch.set_user_authentication(token, TWITCH_SCOPES, refresh_token)
+    except Exception as e:
+        print("❌ Ошибка авторизации Twitch:", e)
+        return False
+
+    save_twitch_tokens(owner_telegram_id, token, refresh_token)
+    print("🔐 Twitch: вход выполнен, токены сохранены")
+    return True
+
+
+async def token_refresher(twitch: Twitch):
+    """
+    Фоновая задача: заранее обновляет пользовательский токен,
+    новый токен сохраняется через user_auth_refresh_callback.
+    """
+    while True:
+        await asyncio.sleep(TOKEN_REFRESH_INTERVAL)
+        try:
+            await twitch.refresh_used_token()
+        except Exception as e:
+            print("⚠ Ошибка фонового обновления Twitch-токена:", e)
+
+
+# ======================================================
+# TWITCH INIT
+# ======================================================
+
+async def _prepare_ai(ctx: OwnerContext) -> bool:
+    """Проверка ключей (синхронные запросы — в отдельном потоке) и AI-клиент."""
+    with ctx.init_timer.phase("key_probe"):
+        working_key = await asyncio.to_thread(get_first_working_key, ctx)
 
-    working_key = get_first_working_key()
     if not working_key:
         print("❌ Ни один DeepSeek ключ не работает.")
-        return
+        return False
 
     # инициализация AI клиента
-    if not init_ai_client():
+    return init_ai_client(ctx)
+
+
+async def _connect_twitch(ctx: OwnerContext) -> bool:
+    """Авторизация Twitch владельца и подключение к чату."""
+    with ctx.init_timer.phase("twitch_auth"):
+        ctx.twitch_app = await Twitch(state.APP_ID, state.APP_SECRET)
+        if not await authenticate_user(ctx.twitch_app, ctx.telegram_id):
+            return False
+
+    if ctx.token_refresher is None or ctx.token_refresher.done():
+        ctx.token_refresher = asyncio.create_task(token_refresher(ctx.twitch_app))
+
+    with ctx.init_timer.phase("chat_connect"):
+        ctx.chat = await _open_chat(ctx)
+
+    # сторож переподключает чат при обрывах
+    supervisor_for(ctx).start(partial(_open_chat, ctx))
+    return True
+
+
+async def _open_chat(ctx: OwnerContext) -> Chat:
+    """Новый клиент чата владельца с нашими обработчиками (и для переподключения)."""
+    chat = await Chat(ctx.twitch_app)
+    chat.register_event(ChatEvent.READY, partial(on_ready, ctx))
+    chat.register_event(ChatEvent.MESSAGE, on_message)
+    chat.start()
+    return chat
+
+
+async def init_twitch_bot(ctx: OwnerContext):
+    """
+    Инициализация Twitch-бота владельца.
+    Вызывается один раз после того, как владелец вошёл (/start).
+    Проверка DeepSeek-ключей идёт параллельно с авторизацией Twitch
+    и подключением к чату; время фаз пишется в свой таймер владельца
+    (ctx.init_timer) — запуски разных владельцев не затирают друг друга.
+    """
+    if ctx.chat is not None or ctx.initializing:
+        # уже инициализирован / инициализируется
         return
 
     # ==================================================
-    # TWITCH AUTH
+    # DEEPSEEK KEYS
     # ==================================================
+    ctx.init_timer = PhaseTimer()
+    with ctx.init_timer.phase("keys_load"):
+        # обычно уже в памяти после /start — тогда без запросов к БД
+        repo_cache.load_owner(ctx)
+
+    if not ctx.DEEPSEEK_KEYS:
+        print("❌ У админа нет DeepSeek ключей.")
+        return
+
     if not state.APP_ID or not state.APP_SECRET:
         print("❌ Не заданы Twitch APP_ID / APP_SECRET.")
         return
 
-    state.twitch_app = await Twitch(state.APP_ID, state.APP_SECRET)
-
-    auth = UserAuthenticator(
-        state.twitch_app,
-        [
-            AuthScope.CHAT_READ,
-            AuthScope.CHAT_EDIT,
-            AuthScope.CHANNEL_MANAGE_BROADCAST,
-        ],
-    )
-
-    token, refresh_token = await auth.authenticate()
-
-    await state.twitch_app.set_user_authentication(
-        token,
-        [
-            AuthScope.CHAT_READ,
-            AuthScope.CHAT_EDIT,
-            AuthScope.CHANNEL_MANAGE_BROADCAST,
-        ],
-        refresh_token,
-    )
-
     # ==================================================
-    # CHAT
+    # KEY PROBE || TWITCH AUTH + CHAT
     # ==================================================
-    state.chat = await Chat(state.twitch_app)
+    ctx.initializing = True
+    try:
+        results = await asyncio.gather(
+            _prepare_ai(ctx), _connect_twitch(ctx), return_exceptions=True
+        )
+    finally:
+        ctx.initializing = False
 
-    state.chat.register_event(ChatEvent.READY, on_ready)
-    state.chat.register_event(ChatEvent.MESSAGE, on_message)
+    # исключение одной ветки не должно потеряться молча
+    for phase, result in zip(("Проверка ключей", "Подключение к Twitch"), results):
+        if isinstance(result, BaseException):
+            print(f"❌ {phase}: ошибка при запуске:", repr(result))
+    ai_ok, chat_ok = (result is True for result in results)
+
+    if not chat_ok:
+        return
 
-    state.chat.start()
+    if not ai_ok:
+        # генерация сама переберёт ключи, когда какой-нибудь снова заработает
+        print("⚠ AI пока недоступен: бот читает чат и ответит, когда ключ заработает.")
 
     print("✅ Twitch-чат запущен (бот отвечает только когда BOT_ENABLED = True)")
@@ -0,0 +1,332 @@
+# services/usage.py
+"""
+Учёт расхода токенов по владельцам и каналам и часовые бюджеты.
+
+После каждого ответа модели токены из response.usage попадают
+в скользящие окна за последний час (корзины по минуте) — отдельно
+для владельца и для пары владелец×канал. Сумма окна хранится готовой,
+так что проверка бюджета на каждом сообщении — O(1).
+
+Приращения по часам (UTC) копятся в памяти и пачкой пишутся
+в token_usage фоновой задачей, как статистика ключей. При старте
+окна заполняются из token_usage за последний час, так что рестарт
+не обнуляет бюджет. Проверки ключей (монитор, поиск рабочего ключа,
+импорт) тоже тратят токены — они идут в бюджет владельца отдельной
+строкой PROBE_CHANNEL.
+
+Бюджеты (config: token_budget_owner_hour / token_budget_channel_hour,
+0 — без лимита) не обрывают ответы резко: начиная с половины бюджета
+порог триггеров растёт, и бот отвечает всё реже; за бюджетом — молчит,
+пока окно не сдвинется. Так ключи не доходят до 429.
+"""
+import asyncio
+import threading
+import time
+from collections import deque
+from datetime import datetime, timedelta, timezone
+from time import monotonic
+from typing import Deque, Dict, List, Tuple
+
+from database.repository import load_token_usage, save_token_usage
+
+from .telemetry import AI_TOKENS
+
+
+# ======================================================
+# SETTINGS
+# ======================================================
+
+USAGE_WINDOW: float = 60 * 60          # окно бюджета, сек
+USAGE_BUCKET: float = 60.0             # размер корзины окна
+USAGE_FLUSH_INTERVAL: float = 60.0     # сек между пакетными записями
+
+OWNER_HOUR_BUDGET: int = 0             # токенов в час на владельца, 0 — без лимита
+CHANNEL_HOUR_BUDGET: int = 0           # токенов в час на канал, 0 — без лимита
+
+BUDGET_SLOWDOWN_FROM: float = 0.5      # с какой доли бюджета отвечаем реже
+BUDGET_MAX_SLOWDOWN: float = 4.0       # во сколько раз реже у самой границы
+
+# «канал» для токенов проверок ключей: считаются в бюджет владельца,
+# но не в бюджет какого-либо канала
+PROBE_CHANNEL = "(проверки ключей)"
+
+
+def apply_usage_config(cfg: dict) -> None:
+    """Бюджеты из таблицы config (token_budget_owner_hour / token_budget_channel_hour)."""
+    global OWNER_HOUR_BUDGET, CHANNEL_HOUR_BUDGET
+    try:
+        if cfg.get("token_budget_owner_hour") is not None:
+            OWNER_HOUR_BUDGET = int(cfg["token_budget_owner_hour"])
+        if cfg.get("token_budget_channel_hour") is not None:
+            CHANNEL_HOUR_BUDGET = int(cfg["token_budget_channel_hour"])
+    except (TypeError, ValueError):
+        print("⚠ Неверный бюджет токенов в config, оставляю без лимита.")
+
+
+HOUR_FORMAT = "%Y-%m-%d %H:00"
+
+
+def _utc_hour() -> str:
+    return datetime.now(timezone.utc).strftime(HOUR_FORMAT)
+
+
+# ======================================================
+# SLIDING WINDOW
+# ======================================================
+
+class UsageWindow:
+    """Токены и запросы за последний USAGE_WINDOW плюс итоги с запуска."""
+
+    __slots__ = (
+        "buckets", "tokens", "requests",
+        "total_prompt", "total_completion", "total_requests",
+    )
+
+    def __init__(self):
+        # [начало корзины, токены, запросы]
+        self.buckets: Deque[List[float]] = deque()
+        self.tokens: int = 0
+        self.requests: int = 0
+
+        self.total_prompt: int = 0
+        self.total_completion: int = 0
+        self.total_requests: int = 0
+
+    def _evict(self, now: float) -> None:
+        edge = now - USAGE_WINDOW
+        while self.buckets and self.buckets[0][0] <= edge:
+            _, tokens, requests = self.buckets.popleft()
+            self.tokens -= tokens
+            self.requests -= requests
+
+    def add(self, prompt: int, completion: int, now: float) -> None:
+        self._evict(now)
+        start = now - now % USAGE_BUCKET
+        tokens = prompt + completion
+        if self.buckets and self.buckets[-1][0] == start:
+            self.buckets[-1][1] += tokens
+            self.buckets[-1][2] += 1
+        else:
+            self.buckets.append([start, tokens, 1])
+        self.tokens += tokens
+        self.requests += 1
+
+        self.total_prompt += prompt
+        self.total_completion += completion
+        self.total_requests += 1
+
+    def hour_tokens(self, now: float) -> int:
+        self._evict(now)
+        return self.tokens
+
+    def seed(self, tokens: int, requests: int, start: float, end: float, now: float) -> None:
+        """
+        Расход из БД за отрезок [start, end) (monotonic) — поровну по корзинам
+        отрезка; итоги «с запуска» не трогает. Вызывается до первых record(),
+        отрезки — по возрастанию времени (корзины окна идут по порядку).
+        """
+        edge = now - USAGE_WINDOW
+        first = start - start % USAGE_BUCKET
+        starts = []
+        t = first
+        while t < end:
+            starts.append(t)
+            t += USAGE_BUCKET
+        if not starts:
+            return
+        for i, bucket in enumerate(starts):
+            if bucket <= edge:
+                # уже за пределами окна
+                continue
+            # остаток от деления — в последнюю корзину
+            share = tokens // len(starts) + (tokens % len(starts) if i == len(starts) - 1 else 0)
+            reqs = requests // len(starts) + (requests % len(starts) if i == len(starts) - 1 else 0)
+            if self.buckets and self.buckets[-1][0] == bucket:
+                self.buckets[-1][1] += share
+                self.buckets[-1][2] += reqs
+            else:
+                self.buckets.append([bucket, share, reqs])
+            self.tokens += share
+            self.requests += reqs
+        self._evict(now)
+
+
+# ======================================================
+# TRACKER
+# ======================================================
+
+class UsageTracker:
+    def __init__(self):
+        self.owners: Dict[int, UsageWindow] = {}
+        self.channels: Dict[Tuple[int, str], UsageWindow] = {}
+        # ещё не записанные приращения: (владелец, канал, час) -> [запросы, prompt, completion]
+        self.pending: Dict[Tuple[int, str, str], List[int]] = {}
+        self._lock = threading.Lock()
+
+    def record(self, owner_id: int, channel: str, prompt: int, completion: int) -> None:
+        """Расход одного ответа модели (из response.usage)."""
+        now = monotonic()
+        with self._lock:
+            self.owners.setdefault(owner_id, UsageWindow()).add(prompt, completion, now)
+            self.channels.setdefault((owner_id, channel), UsageWindow()).add(prompt, completion, now)
+
+            row = self.pending.setdefault((owner_id, channel, _utc_hour()), [0, 0, 0])
+            row[0] += 1
+            row[1] += prompt
+            row[2] += completion
+
+        AI_TOKENS.inc(prompt, channel=channel, kind="prompt")
+        AI_TOKENS.inc(completion, channel=channel, kind="completion")
+
+    def record_probe(self, owner_id: int, prompt: int, completion: int) -> None:
+        """Расход проверки ключа владельца — отдельной строкой, в его общий бюджет."""
+        self.record(owner_id, PROBE_CHANNEL, prompt, completion)
+
+    def restore(self) -> int:
+        """
+        При старте: окна за последний час из token_usage (почасовые строки).
+        Расход часа считается равномерным; прошлый час попадает в окно
+        только той частью, что ещё не вышла за USAGE_WINDOW.
+        Возвращает число загруженных строк.
+        """
+        now_dt = datetime.now(timezone.utc)
+        since = (now_dt - timedelta(seconds=USAGE_WINDOW)).strftime(HOUR_FORMAT)
+        rows = load_token_usage(since)
+
+        now = monotonic()
+        # перевод настенного времени (UTC) в шкалу monotonic
+        offset = now - time.time()
+        wall_now = now_dt.timestamp()
+        with self._lock:
+            # окна заполняются по порядку: сначала прошлый час, потом текущий
+            rows = sorted(rows, key=lambda r: str(r[2]))
+            for owner_id, channel, hour, requests, prompt, completion in rows:
+                try:
+                    start = datetime.strptime(hour, HOUR_FORMAT).replace(tzinfo=timezone.utc).timestamp()
+                except (TypeError, ValueError):
+                    continue
+                end = min(start + 3600, wall_now)
+                if end <= start:
+                    continue
+                tokens = (prompt or 0) + (completion or 0)
+                for window in (
+                    self.owners.setdefault(owner_id, UsageWindow()),
+                    self.channels.setdefault((owner_id, channel), UsageWindow()),
+                ):
+                    window.seed(tokens, requests or 0, start + offset, end + offset, now)
+        return len(rows)
+
+    def _ratio(self, owner_id: int, channel: str, now: float) -> float:
+        """Доля израсходованного часового бюджета (максимум из владельца и канала)."""
+        ratio = 0.0
+        if OWNER_HOUR_BUDGET > 0:
+            w = self.owners.get(owner_id)
+            if w is not None:
+                ratio = max(ratio, w.hour_tokens(now) / OWNER_HOUR_BUDGET)
+        if CHANNEL_HOUR_BUDGET > 0:
+            w = self.channels.get((owner_id, channel))
+            if w is not None:
+                ratio = max(ratio, w.hour_tokens(now) / CHANNEL_HOUR_BUDGET)
+        return ratio
+
+    def slowdown(self, owner_id: int, channel: str) -> float:
+        """
+        Множитель порога триггеров: 1 — как обычно,
+        до BUDGET_MAX_SLOWDOWN у границы бюджета, inf — бюджет исчерпан.
+        """
+        if OWNER_HOUR_BUDGET <= 0 and CHANNEL_HOUR_BUDGET <= 0:
+            return 1.0
+        with self._lock:
+            ratio = self._ratio(owner_id, channel, monotonic())
+        if ratio >= 1.0:
+            return float("inf")
+        if ratio <= BUDGET_SLOWDOWN_FROM:
+            return 1.0
+        share = (ratio - BUDGET_SLOWDOWN_FROM) / (1.0 - BUDGET_SLOWDOWN_FROM)
+        return 1.0 + (BUDGET_MAX_SLOWDOWN - 1.0) * share
+
+    def flush(self) -> int:
+        """
+        Пишет накопленные приращения в БД одной пачкой. Возвращает число строк.
+        Из памяти они вычитаются только после успешной записи — при ошибке
+        БД уйдут следующей пачкой.
+        """
+        with self._lock:
+            rows = [
+                (owner_id, channel, hour, r[0], r[1], r[2])
+                for (owner_id, channel, hour), r in self.pending.items()
+            ]
+        if not rows or not save_token_usage(rows):
+            return 0
+        with self._lock:
+            for owner_id, channel, hour, requests, prompt, completion in rows:
+                key = (owner_id, channel, hour)
+                r = self.pending.get(key)
+                if r is None:
+                    continue
+                r[0] -= requests
+                r[1] -= prompt
+                r[2] -= completion
+                if not any(r):
+                    del self.pending[key]
+        return len(rows)
+
+    # ==================================================
+    # PANEL
+    # ==================================================
+
+    def summary_text(self, owner_id: int) -> str:
+        """Сводка для Telegram — только из окон в памяти."""
+        now = monotonic()
+        with self._lock:
+            owner = self.owners.get(owner_id)
+            channels = [
+                (name, w) for (oid, name), w in self.channels.items() if oid == owner_id
+            ]
+            if owner is None:
+                return "💰 Расход токенов\n\nЗа эту сессию ответов ещё не было."
+
+            lines = ["💰 Расход токенов\n"]
+            lines.append(_window_line("Всего", owner, now, OWNER_HOUR_BUDGET))
+            for name, w in sorted(channels, key=lambda item: -item[1].total_requests):
+                lines.append(_window_line(f"#{name}", w, now, CHANNEL_HOUR_BUDGET))
+
+            hour = owner.hour_tokens(now)
+        lines.append("")
+        lines.append(f"Прогноз на сутки при текущем темпе: ~{hour * 24:,} токенов".replace(",", " "))
+        return "\n".join(lines)
+
+
+def _window_line(title: str, w: UsageWindow, now: float, budget: int) -> str:
+    hour = w.hour_tokens(now)
+    per_reply = (w.total_prompt + w.total_completion) / w.total_requests if w.total_requests else 0
+    text = (
+        f"{title}: за час {hour} ток. ({w.requests} отв.), "
+        f"с запуска {w.total_prompt}+{w.total_completion} ток. ({w.total_requests} отв., "
+        f"~{per_reply:.0f} на ответ)"
+    )
+    if budget > 0:
+        text += f"\n   бюджет {hour * 100 // budget}% из {budget}/ч"
+    return text
+
+
+usage_tracker = UsageTracker()
+
+
+def usage_from_response(response) -> Tuple[int, int]:
+    """(prompt_tokens, completion_tokens) из метаданных ответа; без usage — нули."""
+    usage = getattr(response, "usage", None)
+    return (
+        getattr(usage, "prompt_tokens", 0) or 0,
+        getattr(usage, "completion_tokens", 0) or 0,
+    )
+
+
+async def usage_flusher():
+    """Фоновая задача: периодически сбрасывает расход токенов в БД."""
+    while True:
+        await asyncio.sleep(USAGE_FLUSH_INTERVAL)
+        try:
+            await asyncio.to_thread(usage_tracker.flush)
+        except Exception as e:
+            print("⚠ Ошибка записи расхода токенов:", e)
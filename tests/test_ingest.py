@@ -0,0 +1,118 @@
+# tests/test_ingest.py
+"""
+Фильтр истории чата (services/ingest): token bucket на зрителя,
+склейка повторов и сжатие смайлов.
+
+Запуск из корня проекта:
+    python -m pytest -q tests
+"""
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services import ingest  # noqa: E402
+from services.app_state import ChannelState  # noqa: E402
+from services.ingest import (  # noqa: E402
+    INGEST_DROP,
+    INGEST_FOLD,
+    INGEST_NEW,
+    USER_BUCKET_CAPACITY,
+    USER_BUCKET_REFILL,
+    IngestFilter,
+    TokenBucket,
+    compress_emote_runs,
+    normalize_text,
+)
+
+
+REFILL_ONE = 1.0 / USER_BUCKET_REFILL     # секунд на одну строку
+
+
+# ======================================================
+# TOKEN BUCKET
+# ======================================================
+
+def test_bucket_allows_capacity_then_blocks():
+    bucket = TokenBucket(0.0)
+
+    assert all(bucket.take(0.0) for _ in range(int(USER_BUCKET_CAPACITY)))
+    assert not bucket.take(0.0)
+
+
+def test_bucket_refills_over_time():
+    bucket = TokenBucket(0.0)
+    for _ in range(int(USER_BUCKET_CAPACITY)):
+        bucket.take(0.0)
+
+    assert not bucket.take(REFILL_ONE / 2)
+    assert bucket.take(REFILL_ONE)
+    assert not bucket.take(REFILL_ONE)
+
+
+def test_bucket_refill_is_capped():
+    bucket = TokenBucket(0.0)
+    for _ in range(int(USER_BUCKET_CAPACITY)):
+        bucket.take(0.0)
+
+    now = REFILL_ONE * 100
+    taken = sum(bucket.take(now) for _ in range(int(USER_BUCKET_CAPACITY) + 5))
+    assert taken == int(USER_BUCKET_CAPACITY)
+
+
+# ======================================================
+# INGEST FILTER
+# ======================================================
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(ingest, "monotonic", lambda: now[0])
+    return now
+
+
+@pytest.fixture
+def flt():
+    return IngestFilter(ChannelState("chan"))
+
+
+def test_chatty_user_is_rate_limited(flt, clock):
+    results = [flt.process("spammer", f"строка {i}") for i in range(5)]
+
+    assert results.count(INGEST_NEW) == int(USER_BUCKET_CAPACITY)
+    assert results.count(INGEST_DROP) == 5 - int(USER_BUCKET_CAPACITY)
+    # другой зритель не страдает
+    assert flt.process("other", "привет") == INGEST_NEW
+
+    clock[0] += REFILL_ONE
+    assert flt.process("spammer", "снова я") == INGEST_NEW
+
+
+def test_repeats_are_folded(flt, clock):
+    assert flt.process("a", "Ураааа!!!") == INGEST_NEW
+    assert flt.process("b", "ура") == INGEST_FOLD
+    assert flt.process("c", "УРААА  ") == INGEST_FOLD
+
+    history = flt.channel.history
+    assert len(history) == 1
+    assert history[-1].count == 3
+    assert flt.folded == 2
+
+
+def test_empty_line_is_dropped(flt, clock):
+    assert flt.process("a", "   ") == INGEST_DROP
+    assert not flt.channel.history
+
+
+def test_emote_runs_compressed_in_history(flt, clock):
+    flt.process("a", "KEKW KEKW KEKW KEKW ого")
+
+    assert flt.channel.history[-1].text == "KEKW ×4 ого"
+
+
+def test_compress_and_normalize():
+    assert compress_emote_runs("LUL LUL") == "LUL LUL"
+    assert compress_emote_runs("a LUL LUL LUL b") == "a LUL ×3 b"
+    assert normalize_text("  Приииивет   ВСЕМ!!! ") == "привет всем"
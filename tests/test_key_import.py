@@ -0,0 +1,155 @@
+# tests/test_key_import.py
+"""
+Импорт DeepSeek-ключей (services/key_import): разбор текста, дедупликация
+с уже сохранёнными ключами, параллельная проверка и итоговая сводка.
+
+Сеть и БД не нужны: probe_key и методы repo_cache подменены.
+
+Запуск из корня проекта:
+    python -m pytest -q tests
+"""
+import asyncio
+import os
+import sys
+import threading
+import time
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services import key_import  # noqa: E402
+from services.key_import import (  # noqa: E402
+    KEY_INVALID,
+    KEY_RATE_LIMITED,
+    KEY_UNCHECKED,
+    KEY_VALID,
+    import_keys,
+    parse_keys,
+    validate_keys,
+)
+from services.repo_cache import repo_cache  # noqa: E402
+
+
+OWNER = 42
+
+
+def _key(name: str) -> str:
+    return f"sk-{name}".ljust(32, "x")
+
+
+# ======================================================
+# PARSE
+# ======================================================
+
+def test_parse_splits_dedupes_and_strips_quotes():
+    a, b, c = _key("a"), _key("b"), _key("c")
+    text = f"'{a}', {b}\n\"{a}\"; `{c}`  short-token {b}"
+
+    assert parse_keys(text) == [a, b, c]
+
+
+def test_parse_ignores_short_tokens():
+    assert parse_keys("sk-1 sk-2, hello") == []
+
+
+# ======================================================
+# VALIDATE
+# ======================================================
+
+def test_validate_respects_concurrency(monkeypatch):
+    lock = threading.Lock()
+    active = [0, 0]            # сейчас, максимум
+
+    def probe(key, owner_id=None):
+        with lock:
+            active[0] += 1
+            active[1] = max(active[1], active[0])
+        time.sleep(0.02)
+        with lock:
+            active[0] -= 1
+        return KEY_VALID
+
+    monkeypatch.setattr(key_import, "probe_key", probe)
+    keys = [_key(str(i)) for i in range(12)]
+
+    results = asyncio.run(validate_keys(keys, OWNER, concurrency=3))
+
+    assert results == dict.fromkeys(keys, KEY_VALID)
+    assert active[1] <= 3
+
+
+def test_probe_exception_is_unchecked(monkeypatch):
+    def probe(key, owner_id=None):
+        raise RuntimeError("сеть упала")
+
+    monkeypatch.setattr(key_import, "probe_key", probe)
+
+    assert asyncio.run(validate_keys([_key("a")], OWNER)) == {_key("a"): KEY_UNCHECKED}
+
+
+# ======================================================
+# IMPORT
+# ======================================================
+
+@pytest.fixture
+def repo(monkeypatch):
+    """Ключи владельца в памяти вместо deepseek_keys."""
+    existing = {_key("old")}
+    added = []
+
+    async def owner_key_set(owner_id):
+        return existing
+
+    async def add_keys(owner_id, keys):
+        added.extend(keys)
+        existing.update(keys)
+        return len(keys)
+
+    monkeypatch.setattr(repo_cache, "owner_key_set", owner_key_set)
+    monkeypatch.setattr(repo_cache, "add_keys", add_keys)
+    return added
+
+
+def test_import_adds_only_new_working_keys(monkeypatch, repo):
+    outcomes = {
+        _key("ok"): KEY_VALID,
+        _key("limit"): KEY_RATE_LIMITED,
+        _key("bad"): KEY_INVALID,
+        _key("net"): KEY_UNCHECKED,
+    }
+    probed = []
+
+    def probe(key, owner_id=None):
+        probed.append((key, owner_id))
+        return outcomes[key]
+
+    monkeypatch.setattr(key_import, "probe_key", probe)
+    text = " ".join([_key("old"), *outcomes, _key("ok")])
+
+    summary = asyncio.run(import_keys(text, OWNER))
+
+    # уже сохранённый ключ не проверяется, токены проверок — в бюджет владельца
+    assert sorted(k for k, _ in probed) == sorted(outcomes)
+    assert {owner for _, owner in probed} == {OWNER}
+    # 429 — рабочий ключ в лимите, его берём
+    assert sorted(repo) == sorted([_key("ok"), _key("limit")])
+    assert "найдено 5, уже были 1" in summary
+    assert "➕ добавлено в БД: 2" in summary
+    assert "(401)" in summary and "(error)" in summary
+
+
+def test_import_without_keys(repo):
+    assert asyncio.run(import_keys("ничего тут нет", OWNER)).startswith("❌")
+    assert repo == []
+
+
+def test_import_caps_batch(monkeypatch, repo):
+    monkeypatch.setattr(key_import, "KEY_IMPORT_MAX", 2)
+    monkeypatch.setattr(key_import, "probe_key", lambda key, owner_id=None: KEY_VALID)
+    text = " ".join(_key(str(i)) for i in range(5))
+
+    summary = asyncio.run(import_keys(text, OWNER))
+
+    assert len(repo) == 2
+    assert "пропущено сверх лимита 2: 3" in summary
@@ -0,0 +1,149 @@
+# tests/test_model_chain.py
+"""
+Порядок моделей и автоматы ключ×модель (services/model_chain).
+
+Запуск из корня проекта:
+    python -m pytest -q tests
+"""
+import os
+import sys
+import threading
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services import model_chain  # noqa: E402
+from services.app_state import state  # noqa: E402
+from services.model_chain import (  # noqa: E402
+    BREAKER_CLOSED,
+    BREAKER_FAILURES,
+    BREAKER_HALF_OPEN,
+    BREAKER_OPEN,
+    STATS_MIN_CALLS,
+    CircuitBreaker,
+    get_model_stats,
+    ordered_models,
+)
+
+
+MODELS = ["primary", "fallback-a", "fallback-b"]
+
+
+@pytest.fixture(autouse=True)
+def models(monkeypatch):
+    monkeypatch.setattr(state, "AI_MODELS", list(MODELS))
+    monkeypatch.setattr(model_chain, "_model_stats", {})
+    monkeypatch.setattr(model_chain, "_breakers", {})
+
+
+def _sample(model: str, latency: float, ok: bool = True, calls: int = STATS_MIN_CALLS):
+    for _ in range(calls):
+        get_model_stats(model).record(latency, ok)
+
+
+# ======================================================
+# ORDERING
+# ======================================================
+
+def test_config_order_without_samples():
+    assert ordered_models() == MODELS
+
+
+def test_sampled_primary_stays_ahead_of_untried_fallbacks():
+    _sample("primary", 2.5)
+
+    assert ordered_models() == MODELS
+
+
+def test_few_calls_do_not_reorder():
+    _sample("primary", 5.0)
+    _sample("fallback-b", 0.1, calls=STATS_MIN_CALLS - 1)
+
+    assert ordered_models()[0] == "primary"
+
+
+def test_faster_sampled_model_moves_up():
+    _sample("primary", 5.0)
+    _sample("fallback-b", 0.5)
+
+    assert ordered_models() == ["fallback-b", "primary", "fallback-a"]
+
+
+def test_errors_push_model_down():
+    _sample("primary", 1.0, ok=False)
+    _sample("fallback-a", 2.0)
+
+    assert ordered_models()[0] == "fallback-a"
+
+
+# ======================================================
+# CIRCUIT BREAKER
+# ======================================================
+
+def _open_breaker() -> CircuitBreaker:
+    breaker = CircuitBreaker()
+    for _ in range(BREAKER_FAILURES):
+        breaker.record_failure()
+    return breaker
+
+
+def test_breaker_opens_after_failures():
+    breaker = _open_breaker()
+
+    assert breaker.state == BREAKER_OPEN
+    assert not breaker.allow()
+
+
+def test_half_open_lets_single_probe(monkeypatch):
+    breaker = _open_breaker()
+    now = breaker.opened_at + breaker.reset_after + 1
+    monkeypatch.setattr(model_chain, "monotonic", lambda: now)
+
+    assert breaker.allow()
+    assert breaker.state == BREAKER_HALF_OPEN
+    assert not breaker.allow()
+
+
+def test_half_open_success_closes():
+    breaker = _open_breaker()
+    breaker.reset_after = 0.0
+    assert breaker.allow()
+
+    breaker.record_success()
+
+    assert breaker.state == BREAKER_CLOSED
+    assert breaker.allow() and breaker.allow()
+
+
+def test_half_open_failure_reopens_with_longer_pause(monkeypatch):
+    breaker = _open_breaker()
+    pause = breaker.reset_after
+    now = breaker.opened_at + pause + 1
+    monkeypatch.setattr(model_chain, "monotonic", lambda: now)
+    assert breaker.allow()
+
+    breaker.record_failure()
+
+    assert breaker.state == BREAKER_OPEN
+    assert breaker.reset_after == min(pause * 2, model_chain.BREAKER_RESET_MAX)
+    assert not breaker.allow()
+
+
+def test_half_open_single_probe_across_threads():
+    breaker = _open_breaker()
+    breaker.reset_after = 0.0
+    start = threading.Barrier(16)
+    allowed = []
+
+    def worker():
+        start.wait()
+        allowed.append(breaker.allow())
+
+    threads = [threading.Thread(target=worker) for _ in range(16)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert allowed.count(True) == 1
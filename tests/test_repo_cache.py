@@ -0,0 +1,191 @@
+# tests/test_repo_cache.py
+"""
+Кеш поверх репозитория (services/repo_cache): запись сначала в БД,
+память — только после успеха; индекс текущего ключа при удалении;
+пересборка представлений панели по версиям разделов.
+
+Функции репозитория подменены — БД не нужна.
+
+Запуск из корня проекта:
+    python -m pytest -q tests
+"""
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services import repo_cache as rc  # noqa: E402
+from services.app_state import OwnerContext, state  # noqa: E402
+from services.repo_cache import RepoCache  # noqa: E402
+from services.stop_words import SCOPE_GLOBAL, StopWordIndex  # noqa: E402
+
+
+OWNER = 42
+KEYS = ["sk-a", "sk-b", "sk-c", "sk-d"]
+
+
+class FakeDB:
+    """Записи репозитория: ok=False — каждая запись «падает»."""
+
+    def __init__(self):
+        self.ok = True
+        self.calls = []
+
+    def writer(self, name):
+        def write(*args, **kwargs):
+            self.calls.append((name, args, kwargs))
+            return self.ok
+        return write
+
+
+@pytest.fixture
+def db(monkeypatch):
+    fake = FakeDB()
+    for name in ("delete_deepseek_key_from_db", "add_stop_word", "delete_stop_word",
+                 "set_current_channel_in_db"):
+        monkeypatch.setattr(rc, name, fake.writer(name))
+    monkeypatch.setattr(rc, "stop_word_index", StopWordIndex())
+    monkeypatch.setattr(state, "channels", {})
+    return fake
+
+
+@pytest.fixture
+def cache():
+    return RepoCache()
+
+
+def _ctx(current: int) -> OwnerContext:
+    ctx = OwnerContext(OWNER)
+    ctx.DEEPSEEK_KEYS = list(KEYS)
+    ctx.current_key_index = current
+    ctx.client = object()
+    return ctx
+
+
+# ======================================================
+# KEYS
+# ======================================================
+
+def test_delete_before_current_keeps_same_key(db, cache):
+    ctx = _ctx(current=2)
+    client = ctx.client
+
+    assert cache.delete_key(ctx, 0) == "sk-a"
+
+    assert ctx.DEEPSEEK_KEYS[ctx.current_key_index] == "sk-c"
+    assert ctx.client is client
+
+
+def test_delete_after_current_keeps_index(db, cache):
+    ctx = _ctx(current=1)
+
+    cache.delete_key(ctx, 3)
+
+    assert ctx.current_key_index == 1
+    assert ctx.DEEPSEEK_KEYS[1] == "sk-b"
+
+
+def test_delete_current_resets_client(db, cache):
+    ctx = _ctx(current=3)
+
+    cache.delete_key(ctx, 3)
+
+    assert ctx.client is None
+    assert ctx.current_key_index == 0
+
+
+def test_failed_key_delete_leaves_memory(db, cache):
+    db.ok = False
+    ctx = _ctx(current=2)
+
+    assert cache.delete_key(ctx, 0) is None
+
+    assert ctx.DEEPSEEK_KEYS == KEYS
+    assert ctx.current_key_index == 2
+
+
+# ======================================================
+# STOP WORDS
+# ======================================================
+
+def test_stop_word_written_to_db_before_index(db, cache):
+    version = cache.versions["stop_words"]
+
+    assert cache.add_stop_word(SCOPE_GLOBAL, "спам") is True
+    assert cache.add_stop_word(SCOPE_GLOBAL, "спам") is False
+
+    assert [c[0] for c in db.calls] == ["add_stop_word"]
+    assert rc.stop_word_index.match("это спам") == "спам"
+    assert cache.versions["stop_words"] == version + 1
+
+
+def test_failed_stop_word_write_leaves_index(db, cache):
+    db.ok = False
+    version = cache.versions["stop_words"]
+
+    assert cache.add_stop_word(SCOPE_GLOBAL, "спам") is None
+
+    assert rc.stop_word_index.match("это спам") is None
+    assert cache.versions["stop_words"] == version
+
+
+def test_failed_stop_word_delete_keeps_rule(db, cache):
+    cache.add_stop_word(SCOPE_GLOBAL, "спам")
+    db.ok = False
+
+    assert cache.remove_stop_word(SCOPE_GLOBAL, "спам") is None
+    assert rc.stop_word_index.match("это спам") == "спам"
+
+    db.ok = True
+    assert cache.remove_stop_word(SCOPE_GLOBAL, "спам") is True
+    assert cache.remove_stop_word(SCOPE_GLOBAL, "спам") is False
+    assert rc.stop_word_index.match("это спам") is None
+
+
+# ======================================================
+# CHANNEL
+# ======================================================
+
+def test_failed_channel_write_leaves_memory(db, cache):
+    db.ok = False
+    ctx = _ctx(current=0)
+    ctx.BOT_ENABLED = True
+
+    assert not cache.set_channel(ctx, "newchan")
+
+    assert ctx.CURRENT_CHANNEL is None
+    assert ctx.BOT_ENABLED
+    assert "newchan" not in state.channels
+
+
+def test_channel_write_binds_and_disables(db, cache):
+    ctx = _ctx(current=0)
+    ctx.BOT_ENABLED = True
+
+    assert cache.set_channel(ctx, "newchan")
+
+    assert ctx.CURRENT_CHANNEL == "newchan"
+    assert not ctx.BOT_ENABLED
+    assert state.channels["newchan"].owner_id == OWNER
+
+
+# ======================================================
+# VIEWS
+# ======================================================
+
+def test_view_rebuilt_only_after_section_change(db, cache):
+    builds = []
+
+    def view():
+        return cache.view("panel", OWNER, ("stop_words",), lambda: builds.append(1) or len(builds))
+
+    assert view() == 1
+    assert view() == 1
+    cache._bump("keys")
+    assert view() == 1
+
+    cache.add_stop_word(SCOPE_GLOBAL, "спам")
+    assert view() == 2
+    assert (cache.view_builds, cache.view_hits) == (2, 2)
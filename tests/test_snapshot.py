@@ -0,0 +1,137 @@
+# tests/test_snapshot.py
+"""
+Снимок runtime-состояния (services/snapshot): запись и чтение обратно.
+
+Запуск из корня проекта:
+    python -m pytest -q tests
+"""
+import os
+import pickle
+import sys
+import time
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services import snapshot  # noqa: E402
+from services.app_state import state  # noqa: E402
+from services.snapshot import (  # noqa: E402
+    capture,
+    restore_snapshot,
+    restored_key_index,
+    write_snapshot,
+)
+
+
+OWNER_ID = 42
+KEYS = ["sk-first", "sk-second", "sk-third"]
+
+
+@pytest.fixture(autouse=True)
+def clean_state(monkeypatch):
+    monkeypatch.setattr(state, "channels", {})
+    monkeypatch.setattr(state, "owners", {})
+    monkeypatch.setattr(snapshot, "_last_payload", None)
+    monkeypatch.setattr(snapshot, "_restored_key_ids", {})
+
+
+def _fill_state():
+    ch = state.get_channel("somechannel")
+    ch.add_line("viewer", "привет, как дела")
+    ch.add_line("other", "KEKW").count = 3
+    ch.triggers = 2
+    ch.threshold = 5
+    ctx = state.owner_ctx(OWNER_ID)
+    ctx.DEEPSEEK_KEYS = list(KEYS)
+    ctx.current_key_index = 1
+
+
+def _history(name):
+    return [(line.user, line.text, line.count) for line in state.get_channel(name).history]
+
+
+def test_round_trip(tmp_path, monkeypatch):
+    path = str(tmp_path / "state.snapshot")
+    _fill_state()
+    history = _history("somechannel")
+    assert write_snapshot(capture(), path)
+
+    # «рестарт»: пустое состояние
+    monkeypatch.setattr(state, "channels", {})
+    monkeypatch.setattr(state, "owners", {})
+    assert restore_snapshot(path)
+
+    ch = state.get_channel("somechannel")
+    assert _history("somechannel") == history
+    assert (ch.triggers, ch.threshold) == (2, 5)
+
+    ctx = state.owner_ctx(OWNER_ID)
+    ctx.DEEPSEEK_KEYS = list(KEYS)
+    assert restored_key_index(ctx) == 1
+    # индекс отдаётся один раз
+    assert restored_key_index(ctx) is None
+
+
+def test_keys_are_not_written(tmp_path):
+    path = tmp_path / "state.snapshot"
+    _fill_state()
+    write_snapshot(capture(), str(path))
+
+    text = path.read_text(encoding="utf-8")
+    assert not any(key in text for key in KEYS)
+
+
+def test_unchanged_state_only_touches_mtime(tmp_path):
+    path = tmp_path / "state.snapshot"
+    _fill_state()
+    assert write_snapshot(capture(), str(path))
+    content = path.read_bytes()
+    old = time.time() - 600
+    os.utime(path, (old, old))
+
+    assert not write_snapshot(capture(), str(path))
+
+    assert path.read_bytes() == content
+    assert path.stat().st_mtime > old + 300
+
+
+def test_stale_snapshot_is_ignored(tmp_path, monkeypatch):
+    path = tmp_path / "state.snapshot"
+    _fill_state()
+    write_snapshot(capture(), str(path))
+    old = time.time() - snapshot.SNAPSHOT_MAX_AGE - 60
+    os.utime(path, (old, old))
+    text = path.read_text(encoding="utf-8").split("\n", 1)[1]
+    path.write_text(f"{old!r}\n{text}", encoding="utf-8")
+    os.utime(path, (old, old))
+
+    monkeypatch.setattr(state, "channels", {})
+    assert not restore_snapshot(str(path))
+    assert "somechannel" not in state.channels
+
+
+class _Boom:
+    def __reduce__(self):
+        return (os.system, ("echo pwned",))
+
+
+def test_pickle_file_is_not_loaded(tmp_path):
+    path = tmp_path / "state.snapshot"
+    with open(path, "wb") as f:
+        pickle.dump(time.time(), f)
+        pickle.dump(_Boom(), f)
+
+    assert not restore_snapshot(str(path))
+
+
+def test_malformed_channels_are_rejected(tmp_path):
+    path = tmp_path / "state.snapshot"
+    path.write_text(
+        f"{time.time()!r}\n"
+        f'{{"version": {snapshot.SNAPSHOT_VERSION}, "channels": {{"x": {{"history": [1]}}}}}}',
+        encoding="utf-8",
+    )
+
+    assert not restore_snapshot(str(path))
+    assert "x" not in state.channels
@@ -0,0 +1,187 @@
+# tests/test_stop_words.py
+"""
+Стоп-слова (services/stop_words): типы правил в общем матчере
+и области каналов / владельцев в StopWordIndex.
+
+Запуск из корня проекта:
+    python -m pytest -q tests
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.stop_words import (  # noqa: E402
+    StopWordIndex,
+    StopWordMatcher,
+    channel_scope,
+    owner_scope,
+    SCOPE_GLOBAL,
+)
+
+
+def _matcher(*rules: str) -> StopWordMatcher:
+    return StopWordMatcher(list(rules), version=1)
+
+
+# ======================================================
+# MATCHER: типы правил
+# ======================================================
+
+def test_literal_matches_anywhere():
+    m = _matcher("спойлер")
+
+    assert m.match("без спойлеров пожалуйста") == "спойлер"
+    assert m.match("всё чисто") is None
+
+
+def test_word_rule_respects_boundaries():
+    m = _matcher("w:кот")
+
+    assert m.match("мой кот спит") == "w:кот"
+    assert m.match("кот") == "w:кот"
+    assert m.match("котик спит") is None
+    assert m.match("скот") is None
+
+
+def test_word_rule_with_non_letter_edges():
+    m = _matcher("w:c++", "w:@streamer")
+
+    assert m.match("пишу на c++ каждый день") == "w:c++"
+    assert m.match("c++") == "w:c++"
+    assert m.match("abc++") is None
+    assert m.match("c++x") is None
+    assert m.match("привет @streamer!") == "w:@streamer"
+    assert m.match("привет @streamers") is None
+
+
+def test_prefix_rule():
+    m = _matcher("p:стрим")
+
+    assert m.match("лучший стримлер") == "p:стрим"
+    assert m.match("астрим") is None
+
+
+def test_regex_rule_is_identified():
+    m = _matcher("re:\\d{3}-\\d{2}", "re:ставк[аи]", "w:кот")
+
+    assert m.match("звони 123-45") == "re:\\d{3}-\\d{2}"
+    assert m.match("делайте ставки") == "re:ставк[аи]"
+    assert m.match("кот") == "w:кот"
+
+
+def test_regex_groups_do_not_shift_tree_groups():
+    # группы внутри regex-правила не должны сбить сопоставление lastindex
+    m = _matcher("re:(x)(y)z", "w:кот", "p:стрим", "спам")
+
+    assert m.match("xyz") == "re:(x)(y)z"
+    assert m.match("кот") == "w:кот"
+    assert m.match("стримы") == "p:стрим"
+    assert m.match("это спам") == "спам"
+
+
+def test_backreference_rule_uses_fallback():
+    m = _matcher("re:(\\w)\\1{3}", "кот")
+
+    assert m.match("ааааа") == "re:(\\w)\\1{3}"
+    assert m.match("кот") == "кот"
+    assert m.match("абв") is None
+
+
+def test_combined_compile_error_falls_back_per_rule(capsys):
+    # одинаковые имена групп в двух правилах не собираются в один шаблон
+    m = _matcher("re:(?P<n>a1)", "re:(?P<n>b2)", "w:кот")
+
+    assert "не собрался" in capsys.readouterr().out
+    assert m.match("a1") == "re:(?P<n>a1)"
+    assert m.match("b2") == "re:(?P<n>b2)"
+    assert m.match("кот") == "w:кот"
+
+
+def test_invalid_rules_are_skipped():
+    m = _matcher("re:(", "w:", "кот")
+
+    assert m.match("кот") == "кот"
+    assert m.match("(") is None
+
+
+# ======================================================
+# INDEX: области
+# ======================================================
+
+OWNER = 7
+
+
+def _index() -> StopWordIndex:
+    index = StopWordIndex()
+    index.load(
+        [
+            {"word": "общее"},
+            {"word": "канала", "channel": "alpha"},
+            {"word": "w:владельца", "owner_telegram_id": OWNER},
+        ],
+        channel_owners={"beta": OWNER},
+    )
+    return index
+
+
+def test_global_rule_applies_everywhere():
+    index = _index()
+
+    assert index.match("тут общее", "alpha") == "общее"
+    assert index.match("тут общее", "beta") == "общее"
+    assert index.match("тут общее") == "общее"
+
+
+def test_channel_rule_does_not_leak():
+    index = _index()
+
+    assert index.match("слово канала", "alpha") == "канала"
+    assert index.match("слово канала", "beta") is None
+    assert index.match("слово канала") is None
+
+
+def test_owner_rule_applies_to_owner_channels_only():
+    index = _index()
+
+    assert index.match("слово владельца", "beta") == "w:владельца"
+    assert index.match("слово владельца", "alpha") is None
+
+    index.set_channel_owner("alpha", OWNER)
+    assert index.match("слово владельца", "alpha") == "w:владельца"
+
+
+def test_foreign_rule_does_not_hide_own_rule():
+    index = _index()
+
+    # правило alpha стоит раньше в тексте, но в beta действует только общее
+    assert index.match("канала и общее", "beta") == "общее"
+
+
+def test_add_and_remove_in_scope():
+    index = _index()
+
+    assert index.add(channel_scope("beta"), "канала")
+    assert not index.add(channel_scope("beta"), "канала")
+    assert index.match("слово канала", "beta") == "канала"
+
+    assert index.remove(channel_scope("alpha"), "канала")
+    assert index.match("слово канала", "alpha") is None
+    assert index.match("слово канала", "beta") == "канала"
+
+    assert index.remove(owner_scope(OWNER), "w:владельца")
+    assert index.match("слово владельца", "beta") is None
+    assert index.rules(SCOPE_GLOBAL) == ["общее"]
+
+
+def test_matcher_rebuilt_only_when_rule_set_changes():
+    index = _index()
+    first = index.matcher()
+
+    # правило уже есть в другой области — меняется только маска
+    index.add(channel_scope("beta"), "канала")
+    assert index.matcher() is first
+
+    index.add(SCOPE_GLOBAL, "новое")
+    assert index.matcher() is not first
+    assert index.match("совсем новое", "alpha") == "новое"
@@ -0,0 +1,72 @@
+# tests/test_telegram_bridge.py
+"""
+Мост в Telegram (services/telegram_bridge): очереди по получателям.
+
+Запуск из корня проекта:
+    python -m pytest -q tests
+"""
+import asyncio
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services import telegram_bridge as bridge  # noqa: E402
+from services.app_state import state  # noqa: E402
+from services.telegram_bridge import TelegramBridge  # noqa: E402
+
+
+class RecordingBot:
+    def __init__(self):
+        self.sent = []
+
+    async def send_message(self, chat_id, text, **kwargs):
+        self.sent.append((chat_id, text))
+
+
+@pytest.fixture
+def bot(monkeypatch):
+    bot = RecordingBot()
+    monkeypatch.setattr(state, "telegram_bot", bot)
+    monkeypatch.setattr(bridge, "BRIDGE_SEND_INTERVAL", 0.0)
+    return bot
+
+
+def test_flood_of_one_owner_does_not_evict_others(bot):
+    async def run():
+        b = TelegramBridge(maxsize=5)
+        b.start()
+        b.submit(2, "сводка владельца 2")
+        for i in range(50):
+            b.submit(1, f"рейд {i}")
+        await b.stop()
+        return b
+
+    b = asyncio.run(run())
+
+    assert (2, "сводка владельца 2") in bot.sent
+    assert b.dropped == 45
+    assert b.dropped_by == {1: 45}
+    # у владельца 1 остались самые свежие
+    assert [t for cid, t in bot.sent if cid == 1] == [f"рейд {i}" for i in range(45, 50)]
+
+
+def test_owners_are_served_round_robin(bot):
+    async def run():
+        b = TelegramBridge()
+        b.start()
+        for i in range(3):
+            b.submit(1, f"a{i}")
+        for i in range(3):
+            b.submit(2, f"b{i}")
+        await b.stop()
+
+    asyncio.run(run())
+
+    assert [cid for cid, _ in bot.sent] == [1, 2, 1, 2, 1, 2]
+
+
+def test_submit_before_start_is_refused(bot):
+    assert not TelegramBridge().submit(1, "рано")
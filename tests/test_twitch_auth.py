@@ -0,0 +1,262 @@
+# tests/test_twitch_auth.py
+"""
+authenticate_user против локального «сервера авторизации Twitch».
+
+Стенд на aiohttp отвечает на /validate и /token, как id.twitch.tv/oauth2,
+а Twitch указывает на него через auth_base_url. Проверяются три пути:
+сохранённый токен, обновление по refresh_token и вход через браузер,
+а также подъём бота после рестарта (resume_owner_bots) без /start.
+Хранилище токенов (twitch_tokens) подменено словарём, браузерный вход —
+заглушкой UserAuthenticator, чат Twitch — заглушкой.
+
+Запуск из корня проекта:
+    python -m pytest -q tests
+"""
+import asyncio
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+pytest.importorskip("aiohttp")
+pytest.importorskip("twitchAPI")
+
+from aiohttp import web  # noqa: E402
+from twitchAPI.twitch import Twitch  # noqa: E402
+
+from services import twitch_service  # noqa: E402
+from services.app_state import state  # noqa: E402
+from services.owner_bots import resume_owner_bots  # noqa: E402
+from services.repo_cache import repo_cache  # noqa: E402
+
+
+APP_ID = "test-app-id"
+APP_SECRET = "test-app-secret"
+OWNER_ID = 42
+
+
+class FakeTwitchAuth:
+    """id.twitch.tv/oauth2: валидные токены и пары refresh -> новые токены."""
+
+    def __init__(self):
+        self.valid_tokens = set()
+        self.refresh = {}                 # refresh_token -> (access, refresh)
+        self.validate_calls = 0
+        self.token_calls = 0
+
+    async def validate(self, request: web.Request) -> web.Response:
+        self.validate_calls += 1
+        token = request.headers.get("Authorization", "").replace("OAuth ", "", 1)
+        if token not in self.valid_tokens:
+            return web.json_response({"status": 401, "message": "invalid access token"}, status=401)
+        return web.json_response({
+            "client_id": APP_ID,
+            "login": "bot",
+            "user_id": "1",
+            "scopes": [s.value for s in twitch_service.TWITCH_SCOPES],
+            "expires_in": 14000,
+        })
+
+    async def token(self, request: web.Request) -> web.Response:
+        self.token_calls += 1
+        params = dict(request.query)
+        params.update(await request.post())
+        pair = self.refresh.pop(params.get("refresh_token"), None)
+        if params.get("grant_type") != "refresh_token" or pair is None:
+            return web.json_response({"status": 400, "message": "Invalid refresh token"}, status=400)
+        access, refresh = pair
+        self.valid_tokens.add(access)
+        return web.json_response({
+            "access_token": access,
+            "refresh_token": refresh,
+            "scope": [s.value for s in twitch_service.TWITCH_SCOPES],
+            "token_type": "bearer",
+        })
+
+
+class FakeBrowserAuth:
+    """Вместо UserAuthenticator: «пользователь вошёл в браузере»."""
+
+    calls = 0
+    server: FakeTwitchAuth = None
+
+    def __init__(self, twitch, scopes, **kwargs):
+        pass
+
+    async def authenticate(self, **kwargs):
+        FakeBrowserAuth.calls += 1
+        FakeBrowserAuth.server.valid_tokens.add("browser-access")
+        return "browser-access", "browser-refresh"
+
+
+@pytest.fixture
+def tokens(monkeypatch):
+    """twitch_tokens в памяти: owner -> (access, refresh)."""
+    store = {}
+    monkeypatch.setattr(twitch_service, "load_twitch_tokens", lambda owner: store.get(owner))
+    monkeypatch.setattr(
+        twitch_service, "save_twitch_tokens",
+        lambda owner, access, refresh: store.__setitem__(owner, (access, refresh)),
+    )
+    monkeypatch.setattr(state, "APP_ID", APP_ID)
+    monkeypatch.setattr(state, "APP_SECRET", APP_SECRET)
+    monkeypatch.setattr(twitch_service, "UserAuthenticator", FakeBrowserAuth)
+    FakeBrowserAuth.calls = 0
+    return store
+
+
+async def _start_server(server: FakeTwitchAuth) -> web.AppRunner:
+    FakeBrowserAuth.server = server
+    app = web.Application()
+    app.router.add_get("/validate", server.validate)
+    app.router.add_post("/token", server.token)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    return runner
+
+
+def _auth_url(runner: web.AppRunner) -> str:
+    host, port = runner.addresses[0][:2]
+    return f"http://{host}:{port}/"
+
+
+async def _run_auth(server: FakeTwitchAuth) -> bool:
+    """Поднимает стенд, авторизует Twitch через authenticate_user, гасит стенд."""
+    runner = await _start_server(server)
+    try:
+        twitch = await Twitch(
+            APP_ID, APP_SECRET,
+            authenticate_app=False,
+            auth_base_url=_auth_url(runner),
+        )
+        try:
+            return await twitch_service.authenticate_user(twitch, OWNER_ID)
+        finally:
+            await twitch.close()
+    finally:
+        await runner.cleanup()
+
+
+def test_cached_token_is_used_without_refresh_or_browser(tokens):
+    server = FakeTwitchAuth()
+    server.valid_tokens.add("cached-access")
+    tokens[OWNER_ID] = ("cached-access", "cached-refresh")
+
+    assert asyncio.run(_run_auth(server))
+
+    assert server.token_calls == 0
+    assert FakeBrowserAuth.calls == 0
+    assert tokens[OWNER_ID] == ("cached-access", "cached-refresh")
+
+
+def test_expired_token_is_refreshed_and_saved(tokens):
+    server = FakeTwitchAuth()
+    server.refresh["cached-refresh"] = ("fresh-access", "fresh-refresh")
+    tokens[OWNER_ID] = ("expired-access", "cached-refresh")
+
+    assert asyncio.run(_run_auth(server))
+
+    assert server.token_calls == 1
+    assert FakeBrowserAuth.calls == 0
+    assert tokens[OWNER_ID] == ("fresh-access", "fresh-refresh")
+
+
+def test_revoked_tokens_fall_back_to_browser(tokens):
+    server = FakeTwitchAuth()
+    tokens[OWNER_ID] = ("revoked-access", "revoked-refresh")
+
+    assert asyncio.run(_run_auth(server))
+
+    assert FakeBrowserAuth.calls == 1
+    assert tokens[OWNER_ID] == ("browser-access", "browser-refresh")
+
+
+def test_no_saved_tokens_go_straight_to_browser(tokens):
+    server = FakeTwitchAuth()
+
+    assert asyncio.run(_run_auth(server))
+
+    assert server.validate_calls >= 1
+    assert server.token_calls == 0
+    assert FakeBrowserAuth.calls == 1
+    assert tokens[OWNER_ID] == ("browser-access", "browser-refresh")
+
+
+# ======================================================
+# RESTART: бот поднимается без /start
+# ======================================================
+
+class FakeChat:
+    def stop(self):
+        pass
+
+
+class FakeSupervisor:
+    def __init__(self):
+        self.started = False
+
+    def start(self, connect):
+        self.started = True
+
+
+def test_restart_with_saved_tokens_connects_without_start(tokens, monkeypatch):
+    server = FakeTwitchAuth()
+    server.valid_tokens.add("cached-access")
+    tokens[OWNER_ID] = ("cached-access", "cached-refresh")
+
+    # чистое состояние процесса после рестарта: владелец — админ, /start не было
+    monkeypatch.setattr(state, "owners", {})
+    monkeypatch.setattr(state, "channels", {})
+    state.set_admins([{"telegram_id": OWNER_ID, "role": "owner"}])
+
+    def load_owner(ctx):
+        # то, что repo_cache поднял бы из deepseek_keys и bot_state
+        ctx.DEEPSEEK_KEYS = ["sk-test"]
+        state.bind_channel(ctx, "somechannel")
+
+    supervisor = FakeSupervisor()
+    monkeypatch.setattr(repo_cache, "load_owner", load_owner)
+    monkeypatch.setattr(twitch_service, "_prepare_ai", _async_value(True))
+    monkeypatch.setattr(twitch_service, "_open_chat", _async_value(FakeChat()))
+    monkeypatch.setattr(twitch_service, "supervisor_for", lambda ctx: supervisor)
+
+    async def run():
+        runner = await _start_server(server)
+        url = _auth_url(runner)
+        monkeypatch.setattr(
+            twitch_service, "Twitch",
+            lambda app_id, secret: Twitch(app_id, secret, authenticate_app=False, auth_base_url=url),
+        )
+        try:
+            assert resume_owner_bots([OWNER_ID, 777]) == 1
+            ctx = state.owners[OWNER_ID]
+            await ctx.init_task
+            try:
+                return ctx
+            finally:
+                ctx.token_refresher.cancel()
+                await ctx.twitch_app.close()
+        finally:
+            await runner.cleanup()
+
+    try:
+        ctx = asyncio.run(run())
+    finally:
+        state.set_admins([])
+
+    assert isinstance(ctx.chat, FakeChat)
+    assert supervisor.started
+    assert FakeBrowserAuth.calls == 0
+    assert server.token_calls == 0
+    # 777 — не админ, его бот не поднимается
+    assert 777 not in state.owners
+
+
+def _async_value(value):
+    async def fn(*args, **kwargs):
+        return value
+    return fn
@@ -0,0 +1,171 @@
+# tests/test_usage.py
+"""
+Расход токенов (services/usage): скользящие часовые окна, замедление
+у границы бюджета, восстановление окон из token_usage и запись пачкой.
+
+БД не нужна: load_token_usage / save_token_usage подменены.
+
+Запуск из корня проекта:
+    python -m pytest -q tests
+"""
+import os
+import sys
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services import usage  # noqa: E402
+from services.usage import (  # noqa: E402
+    HOUR_FORMAT,
+    PROBE_CHANNEL,
+    USAGE_BUCKET,
+    USAGE_WINDOW,
+    UsageTracker,
+    UsageWindow,
+)
+
+
+OWNER = 42
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [10_000.0]
+    monkeypatch.setattr(usage, "monotonic", lambda: now[0])
+    return now
+
+
+@pytest.fixture
+def budgets(monkeypatch):
+    monkeypatch.setattr(usage, "OWNER_HOUR_BUDGET", 1000)
+    monkeypatch.setattr(usage, "CHANNEL_HOUR_BUDGET", 0)
+
+
+# ======================================================
+# WINDOW
+# ======================================================
+
+def test_window_expires_after_an_hour():
+    w = UsageWindow()
+    w.add(100, 20, now=0.0)
+    w.add(30, 0, now=USAGE_WINDOW / 2)
+
+    assert w.hour_tokens(USAGE_WINDOW / 2) == 150
+    assert w.hour_tokens(USAGE_WINDOW + USAGE_BUCKET) == 30
+    assert w.hour_tokens(2 * USAGE_WINDOW) == 0
+    # итоги «с запуска» окно не теряет
+    assert w.total_requests == 2
+    assert w.total_prompt == 130
+
+
+def test_seed_spreads_tokens_over_buckets():
+    w = UsageWindow()
+    w.seed(601, 7, start=0.0, end=10 * USAGE_BUCKET, now=10 * USAGE_BUCKET)
+
+    assert w.hour_tokens(10 * USAGE_BUCKET) == 601
+    assert len(w.buckets) == 10
+    assert w.total_requests == 0
+    # через час от начала отрезка ушла только первая корзина
+    assert w.hour_tokens(USAGE_WINDOW + USAGE_BUCKET / 2) == 601 - 60
+
+
+# ======================================================
+# BUDGET SLOWDOWN
+# ======================================================
+
+def test_slowdown_grows_towards_budget(clock, budgets):
+    t = UsageTracker()
+    assert t.slowdown(OWNER, "chan") == 1.0
+
+    t.record(OWNER, "chan", 400, 0)
+    assert t.slowdown(OWNER, "chan") == 1.0
+
+    t.record(OWNER, "chan", 350, 0)
+    mid = t.slowdown(OWNER, "chan")
+    assert 1.0 < mid < usage.BUDGET_MAX_SLOWDOWN
+
+    t.record(OWNER, "other", 300, 0)
+    assert t.slowdown(OWNER, "chan") == float("inf")
+
+    # окно сдвинулось — бюджет снова свободен
+    clock[0] += USAGE_WINDOW + USAGE_BUCKET
+    assert t.slowdown(OWNER, "chan") == 1.0
+
+
+def test_no_budget_means_no_slowdown(clock, monkeypatch):
+    monkeypatch.setattr(usage, "OWNER_HOUR_BUDGET", 0)
+    monkeypatch.setattr(usage, "CHANNEL_HOUR_BUDGET", 0)
+    t = UsageTracker()
+    t.record(OWNER, "chan", 10 ** 9, 0)
+
+    assert t.slowdown(OWNER, "chan") == 1.0
+
+
+def test_probe_tokens_count_towards_owner_budget(clock, budgets):
+    t = UsageTracker()
+    t.record_probe(OWNER, 1000, 1)
+
+    assert t.slowdown(OWNER, "chan") == float("inf")
+    assert (OWNER, PROBE_CHANNEL) in t.channels
+
+
+# ======================================================
+# RESTORE / FLUSH
+# ======================================================
+
+# середина часа: текущий час целиком внутри окна, когда бы ни шёл тест
+WALL_NOW = datetime(2026, 1, 1, 12, 30, tzinfo=timezone.utc)
+
+
+class FrozenDatetime(datetime):
+    @classmethod
+    def now(cls, tz=None):
+        return WALL_NOW
+
+
+@pytest.fixture
+def wall_clock(monkeypatch):
+    monkeypatch.setattr(usage, "datetime", FrozenDatetime)
+    monkeypatch.setattr(usage.time, "time", WALL_NOW.timestamp)
+
+
+def _hour(delta_hours: int) -> str:
+    return (WALL_NOW + timedelta(hours=delta_hours)).strftime(HOUR_FORMAT)
+
+
+def test_restore_seeds_current_hour_and_drops_old(monkeypatch, budgets, wall_clock):
+    rows = [
+        (OWNER, "chan", _hour(0), 3, 500, 100),
+        (OWNER, "chan", _hour(-2), 9, 9000, 0),
+    ]
+    monkeypatch.setattr(usage, "load_token_usage", lambda since: rows)
+    t = UsageTracker()
+
+    assert t.restore() == 2
+
+    now = usage.monotonic()
+    assert t.owners[OWNER].hour_tokens(now) == 600
+    assert t.channels[(OWNER, "chan")].hour_tokens(now) == 600
+    # восстановленное не пишется в БД второй раз
+    assert not t.pending
+    # и учитывается в бюджете
+    assert t.slowdown(OWNER, "chan") > 1.0
+
+
+def test_failed_flush_keeps_pending(clock, monkeypatch):
+    t = UsageTracker()
+    t.record(OWNER, "chan", 100, 20)
+    saved = []
+
+    monkeypatch.setattr(usage, "save_token_usage", lambda rows: False)
+    assert t.flush() == 0
+    assert sum(r[1] for r in t.pending.values()) == 100
+
+    # между попытками пришёл ещё один ответ
+    t.record(OWNER, "chan", 5, 1)
+    monkeypatch.setattr(usage, "save_token_usage", lambda rows: saved.extend(rows) or True)
+    assert t.flush() == 1
+    assert not t.pending
+    assert saved[0][3:] == (2, 105, 21)
@@ -0,0 +1,263 @@
+# utils/metrics.py
+"""
+Лёгкие метрики: счётчики, gauge и гистограммы с метками,
+выдача в текстовом формате Prometheus через локальный HTTP-эндпоинт.
+
+Обновление метрики — словарь и lock без конкуренции, так что инструментировать
+можно и горячий путь (on_message). Всё агрегируется сразу при записи,
+поэтому /metrics и Telegram-статистика ничего не пересчитывают.
+"""
+import asyncio
+import threading
+from abc import ABC, abstractmethod
+from bisect import bisect_left
+from contextlib import contextmanager
+from functools import wraps
+from time import perf_counter
+from typing import Callable, Dict, List, Optional, Tuple
+
+LabelKey = Tuple[str, ...]
+
+# границы корзин гистограмм, секунды
+DEFAULT_BUCKETS: Tuple[float, ...] = (
+    0.00001, 0.00005, 0.0001, 0.0005, 0.001, 0.005,
+    0.01, 0.05, 0.1, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0,
+)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _fmt_labels(names: Tuple[str, ...], values: LabelKey, extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class _Metric(ABC):
+    kind = ""
+
+    def __init__(self, name: str, help_text: str, labels: Tuple[str, ...] = ()):
+        self.name = name
+        self.help = help_text
+        self.label_names = tuple(labels)
+        self._lock = threading.Lock()
+        REGISTRY[name] = self
+
+    def _key(self, labels: Dict[str, object]) -> LabelKey:
+        return tuple(str(labels.get(n, "")) for n in self.label_names)
+
+    @abstractmethod
+    def render(self) -> List[str]:
+        """Строки значений в формате Prometheus (без # HELP / # TYPE)."""
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name, help_text, labels=()):
+        super().__init__(name, help_text, labels)
+        self.values: Dict[LabelKey, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self.values[key] = self.values.get(key, 0.0) + amount
+
+    def get(self, **labels) -> float:
+        return self.values.get(self._key(labels), 0.0)
+
+    def total(self) -> float:
+        return sum(self.values.values())
+
+    def render(self) -> List[str]:
+        return [
+            f"{self.name}{_fmt_labels(self.label_names, k)} {v:g}"
+            for k, v in list(self.values.items())
+        ]
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def set(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self.values[key] = value
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help_text, labels=(), buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        super().__init__(name, help_text, labels)
+        self.buckets = tuple(buckets)
+        # метки -> [счётчики по корзинам (+Inf последней), сумма, количество]
+        self.values: Dict[LabelKey, list] = {}
+
+    def observe(self, seconds: float, **labels) -> None:
+        key = self._key(labels)
+        idx = bisect_left(self.buckets, seconds)
+        with self._lock:
+            data = self.values.get(key)
+            if data is None:
+                data = [[0] * (len(self.buckets) + 1), 0.0, 0]
+                self.values[key] = data
+            data[0][idx] += 1
+            data[1] += seconds
+            data[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        t0 = perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(perf_counter() - t0, **labels)
+
+    def quantile(self, q: float, **labels) -> Optional[float]:
+        """Оценка квантиля по корзинам (верхняя граница корзины)."""
+        data = self.values.get(self._key(labels))
+        if not data or not data[2]:
+            return None
+        target = q * data[2]
+        seen = 0
+        for i, n in enumerate(data[0]):
+            seen += n
+            if seen >= target:
+                return self.buckets[i] if i < len(self.buckets) else float("inf")
+        return float("inf")
+
+    def count(self, **labels) -> int:
+        data = self.values.get(self._key(labels))
+        return data[2] if data else 0
+
+    def mean(self, **labels) -> Optional[float]:
+        data = self.values.get(self._key(labels))
+        return data[1] / data[2] if data and data[2] else None
+
+    def render(self) -> List[str]:
+        lines: List[str] = []
+        for key, (counts, total, n) in list(self.values.items()):
+            cumulative = 0
+            for bound, c in zip(self.buckets, counts):
+                cumulative += c
+                le = 'le="%g"' % bound
+                lines.append(
+                    f"{self.name}_bucket{_fmt_labels(self.label_names, key, le)} {cumulative}"
+                )
+            le = 'le="+Inf"'
+            lines.append(f"{self.name}_bucket{_fmt_labels(self.label_names, key, le)} {n}")
+            lines.append(f"{self.name}_sum{_fmt_labels(self.label_names, key)} {total:.6f}")
+            lines.append(f"{self.name}_count{_fmt_labels(self.label_names, key)} {n}")
+        return lines
+
+
+REGISTRY: Dict[str, _Metric] = {}
+
+# функции, обновляющие gauge перед выдачей (состояние, которое дешевле прочитать, чем вести)
+_collectors: List[Callable[[], None]] = []
+
+
+def register_collector(fn: Callable[[], None]) -> None:
+    _collectors.append(fn)
+
+
+def render_prometheus() -> str:
+    for fn in _collectors:
+        try:
+            fn()
+        except Exception as e:
+            print("⚠ Ошибка сбора метрик:", e)
+
+    out: List[str] = []
+    for metric in list(REGISTRY.values()):
+        out.append(f"# HELP {metric.name} {metric.help}")
+        out.append(f"# TYPE {metric.name} {metric.kind}")
+        out.extend(metric.render())
+    return "\n".join(out) + "\n"
+
+
+def timed(hist: Histogram, **labels):
+    """Декоратор: время выполнения синхронной функции в гистограмму."""
+    def decorator(fn):
+        fn_labels = dict(labels)
+        if "func" in hist.label_names and "func" not in fn_labels:
+            fn_labels["func"] = fn.__name__
+
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            t0 = perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                hist.observe(perf_counter() - t0, **fn_labels)
+        return wrapper
+    return decorator
+
+
+# ======================================================
+# HTTP ENDPOINT
+# ======================================================
+
+async def _handle_http(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+    try:
+        request_line = await asyncio.wait_for(reader.readline(), 5.0)
+        # остаток заголовков не нужен, но дочитываем до пустой строки
+        while True:
+            line = await asyncio.wait_for(reader.readline(), 5.0)
+            if not line or line in (b"\r\n", b"\n"):
+                break
+
+        parts = request_line.decode("latin-1").split()
+        path = parts[1] if len(parts) > 1 else "/"
+        if path.split("?")[0] == "/metrics":
+            body = render_prometheus().encode("utf-8")
+            status = "200 OK"
+        else:
+            body = b"not found\n"
+            status = "404 Not Found"
+
+        writer.write(
+            f"HTTP/1.1 {status}\r\n"
+            "Content-Type: text/plain; version=0.0.4; charset=utf-8\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            "Connection: close\r\n\r\n".encode("latin-1") + body
+        )
+        await writer.drain()
+    except Exception:
+        pass
+    finally:
+        writer.close()
+
+
+METRICS_PORT: int = 9108
+
+
+def metrics_port_from_config(cfg: Dict[str, str]) -> int:
+    """Порт /metrics из config (metrics_port); 0 — выключено, мусор — порт по умолчанию."""
+    value = cfg.get("metrics_port")
+    if not value:
+        return METRICS_PORT
+    try:
+        port = int(value)
+    except ValueError:
+        print(f"⚠ Неверный metrics_port в config: {value!r}, использую {METRICS_PORT}")
+        return METRICS_PORT
+    if not 0 <= port <= 65535:
+        print(f"⚠ metrics_port вне диапазона: {port}, использую {METRICS_PORT}")
+        return METRICS_PORT
+    return port
+
+
+async def start_metrics_server(host: str = "127.0.0.1", port: int = METRICS_PORT):
+    """Поднимает /metrics на локальном порту. Возвращает asyncio.Server или None."""
+    try:
+        server = await asyncio.start_server(_handle_http, host, port)
+    except OSError as e:
+        print(f"⚠ Не удалось запустить /metrics на {host}:{port}:", e)
+        return None
+    print(f"📈 Метрики: http://{host}:{port}/metrics")
+    return server
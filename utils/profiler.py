@@ -0,0 +1,150 @@
+# utils/profiler.py
+"""
+Семплирующий профилировщик «по запросу» для работающего процесса.
+
+Отдельный поток раз в INTERVAL снимает стеки всех потоков
+через sys._current_frames(): event loop Telegram, поток twitchAPI,
+потоки asyncio.to_thread (генерация, БД). Корутины видны в стеке
+потока, который их сейчас выполняет.
+
+Результат:
+  • collapsed stacks («поток;f1;f2;f3 N») — вход для flamegraph.pl / speedscope;
+  • топ функций по собственному и полному времени.
+"""
+import sys
+import threading
+from collections import Counter
+from time import perf_counter, sleep
+from typing import Dict, List, Optional, Tuple
+
+PROFILE_INTERVAL: float = 0.005    # 200 Гц — заметной нагрузки не даёт
+PROFILE_MIN_SECONDS: int = 5
+PROFILE_MAX_SECONDS: int = 120
+PROFILE_MAX_DEPTH: int = 64
+
+# листовые функции «потока, который ждёт»: в топ горячих не попадают
+IDLE_LEAVES = frozenset({
+    "select", "poll", "wait", "_worker", "sleep", "get", "_wait_for_tstate_lock",
+})
+
+
+def _short_path(path: str) -> str:
+    parts = path.replace("\\", "/").split("/")
+    return "/".join(parts[-2:])
+
+
+class SamplingProfiler:
+    def __init__(self, interval: float = PROFILE_INTERVAL):
+        self.interval = interval
+        self.stacks: Counter = Counter()
+        self.samples: int = 0
+        self.idle_samples: int = 0
+        self.duration: float = 0.0
+        self._labels: Dict[object, str] = {}
+
+    def _label(self, code) -> str:
+        label = self._labels.get(code)
+        if label is None:
+            name = getattr(code, "co_qualname", code.co_name)
+            label = f"{name} ({_short_path(code.co_filename)}:{code.co_firstlineno})"
+            self._labels[code] = label
+        return label
+
+    def _sample(self, own_ident: int, names: Dict[int, str]) -> None:
+        for ident, frame in sys._current_frames().items():
+            if ident == own_ident:
+                continue
+
+            chain: List[str] = []
+            leaf = frame.f_code.co_name
+            while frame is not None and len(chain) < PROFILE_MAX_DEPTH:
+                chain.append(self._label(frame.f_code))
+                frame = frame.f_back
+            chain.append(names.get(ident, f"thread-{ident}"))
+            chain.reverse()
+
+            self.stacks[tuple(chain)] += 1
+            self.samples += 1
+            if leaf in IDLE_LEAVES:
+                self.idle_samples += 1
+
+    def run(self, seconds: float) -> "SamplingProfiler":
+        """Блокирующий прогон — вызывать в отдельном потоке (asyncio.to_thread)."""
+        own = threading.get_ident()
+        t0 = perf_counter()
+        deadline = t0 + seconds
+        names: Dict[int, str] = {}
+        refresh_at = 0.0
+
+        while True:
+            now = perf_counter()
+            if now >= deadline:
+                break
+            if now >= refresh_at:
+                # потоки пула появляются по ходу работы — имена обновляем раз в секунду
+                names = {t.ident: t.name for t in threading.enumerate() if t.ident}
+                refresh_at = now + 1.0
+            self._sample(own, names)
+            sleep(self.interval)
+
+        self.duration = perf_counter() - t0
+        return self
+
+    # ==================================================
+    # RESULTS
+    # ==================================================
+
+    def collapsed(self) -> str:
+        """Формат Brendan Gregg: 'root;caller;callee count' на строку."""
+        lines = [
+            ";".join(s.replace(";", ",") for s in stack) + f" {n}"
+            for stack, n in self.stacks.most_common()
+        ]
+        return "\n".join(lines) + "\n"
+
+    def top(self, limit: int = 15) -> List[Tuple[str, int, int]]:
+        """[(функция, собственные семплы, полные семплы)] без ожидающих потоков."""
+        own: Counter = Counter()
+        total: Counter = Counter()
+        for stack, n in self.stacks.items():
+            leaf = stack[-1]
+            if leaf.split(" (", 1)[0].rsplit(".", 1)[-1] in IDLE_LEAVES:
+                continue
+            own[leaf] += n
+            # рекурсия не должна считаться дважды
+            for label in set(stack[1:]):
+                total[label] += n
+        return [(label, n, total[label]) for label, n in own.most_common(limit)]
+
+    def report(self, limit: int = 15) -> str:
+        busy = self.samples - self.idle_samples
+        lines = [
+            f"⏱ Профиль: {self.duration:.0f} с, семплов {self.samples}, "
+            f"активных {busy} ({busy / self.samples:.0%})" if self.samples
+            else "⏱ Профиль: семплов нет",
+        ]
+        if busy:
+            lines.append("")
+            lines.append("собств. / полное — функция")
+            for label, own, total in self.top(limit):
+                lines.append(f"{own / busy:5.1%} / {total / busy:5.1%}  {label}")
+        return "\n".join(lines)
+
+
+# ======================================================
+# ONE AT A TIME
+# ======================================================
+
+_running_lock = threading.Lock()
+
+
+def run_profile(seconds: float, interval: float = PROFILE_INTERVAL) -> Optional[SamplingProfiler]:
+    """Один профиль за раз; None — если другой уже идёт."""
+    if not _running_lock.acquire(blocking=False):
+        return None
+    try:
+        seconds = max(PROFILE_MIN_SECONDS, min(PROFILE_MAX_SECONDS, seconds))
+        return SamplingProfiler(interval).run(seconds)
+    finally:
+        _running_lock.release()
+